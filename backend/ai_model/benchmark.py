@@ -0,0 +1,445 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Benchmark suite
+Measures CLI cold start, model loading, prediction latency and throughput, forecasts and training
+against a freshly generated model, writes the results as JSON and compares them with a baseline
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+from contextlib import redirect_stdout
+from datetime import datetime
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_FORMAT = 'earthslight-benchmark'
+RESULTS_SCHEMA_VERSION = 1
+SUITES = ['cold-start', 'load', 'predict', 'batch', 'forecast', 'training']
+COLD_START_COMMANDS = ['load', 'predict', 'predict-batch', 'score', 'update', 'forecast', 'forecast-batch', 'serve']
+DEFAULT_BATCH_SIZES = [1, 10, 100, 1000, 10000, 100000]
+# create_pretrained_model holds the whole dataset in memory; larger sizes are opt-in via --training-sizes
+DEFAULT_TRAINING_SIZES = [50000, 1000000]
+DEFAULT_THRESHOLD = 0.2
+
+
+def _percentile_us(samples, percentile):
+    return round(float(np.percentile(samples, percentile)) * 1e6, 1)
+
+
+def _properties(rows, seed=0, locations=None):
+    """Random property columns covering every market plus an unknown one"""
+    rng = np.random.default_rng(seed)
+    locations = np.array(locations or ['Los Angeles', 'New York', 'Chicago', 'Austin', 'Portland', 'Nowhere'],
+                         dtype=object)
+    return {
+        'floors': rng.integers(1, 4, rows),
+        'area': rng.integers(500, 5000, rows),
+        'bedrooms': rng.integers(1, 6, rows),
+        'bathrooms': rng.integers(1, 4, rows),
+        'age': rng.integers(0, 60, rows),
+        'location': locations[rng.integers(0, len(locations), rows)]
+    }
+
+
+def _peak_rss_mb():
+    """Peak RSS of this process in MB, without streaming_training's pandas import.
+
+    Probes run as fork+exec children, whose ru_maxrss starts from the benchmark's own peak on
+    Linux, so the kernel's VmHWM (reset on exec) is read first; ru_maxrss is only the fallback
+    where /proc is missing (macOS, where it is not inherited).
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+def _log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def _run_python(args, timeout=None):
+    """Run a Python snippet or script in a fresh interpreter; returns its parsed last stdout line"""
+    completed = subprocess.run([sys.executable] + args, cwd=HERE, capture_output=True, text=True,
+                               timeout=timeout, check=False)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{' '.join(args[:2])} failed: {completed.stderr.strip()[-500:]}")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+class Benchmark:
+    """One benchmark run in a scratch directory holding a generated model and input files.
+
+    Each measurement lands in metrics as name -> {'value', 'unit', 'better'}, where better is
+    'lower' or 'higher'; compare() uses that direction to tell regressions from improvements.
+    """
+
+    def __init__(self, workdir, repeats=5, model_samples=50000, batch_sizes=None, training_sizes=None):
+        self.workdir = workdir
+        self.repeats = max(1, int(repeats))
+        self.model_samples = model_samples
+        self.batch_sizes = batch_sizes or DEFAULT_BATCH_SIZES
+        self.training_sizes = training_sizes or DEFAULT_TRAINING_SIZES
+        self.model_path = os.path.join(workdir, 'model_artifact')
+        self.metrics = {}
+        self.errors = {}
+
+    def record(self, name, value, unit, better='lower'):
+        self.metrics[name] = {'value': value, 'unit': unit, 'better': better}
+
+    def prepare(self):
+        """Train the model the suite runs against and write the CLI input files"""
+        import pandas as pd
+        from create_model import create_pretrained_model
+
+        if not os.path.isdir(self.model_path):
+            _log(f"Generating a {self.model_samples:,}-row benchmark model in {self.workdir}...")
+            with redirect_stdout(sys.stderr):
+                create_pretrained_model(num_samples=self.model_samples, output_dir=self.model_path,
+                                        cache_dir=self.path('training_cache'))
+
+        frame = pd.DataFrame(_properties(1000, seed=1))
+        frame.iloc[:100].to_json(self.path('properties.json'), orient='records')
+        frame.to_csv(self.path('properties.csv'), index=False)
+        with open(self.path('portfolio.json'), 'w') as f:
+            json.dump([{'price': 500000, 'location': location} for location in frame['location'][:100]], f)
+        updates = frame.assign(price=(frame['area'] * 300).astype(int))
+        updates.to_csv(self.path('updates.csv'), index=False)
+
+    def path(self, name):
+        return os.path.join(self.workdir, name)
+
+    def cold_start_args(self, command):
+        model = ['--model', self.model_path]
+        return {
+            'load': ['load'] + model,
+            'predict': ['predict', '2', '1500', '3', '2', '5', 'Austin'] + model,
+            'predict-batch': ['predict-batch', self.path('properties.json')] + model,
+            'score': ['score', '--input', self.path('properties.csv'), '--output', self.path('scored.ndjson')] + model,
+            'update': ['update', '--data', self.path('updates.csv'), '--output', self.path('updated_artifact'),
+                       '--rounds', '10'] + model,
+            'forecast': ['forecast', '500000', 'Austin'],
+            'forecast-batch': ['forecast-batch', self.path('portfolio.json')]
+        }[command]
+
+    def _serve_until_ready(self):
+        """Seconds from launching the server to its ready event"""
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, 'predict.py', 'serve', '--model', self.model_path], cwd=HERE,
+                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                  text=True)
+        try:
+            line = server.stdout.readline()
+            elapsed = time.perf_counter() - started
+            if json.loads(line).get('event') != 'ready':
+                raise RuntimeError(f"Server did not start: {line.strip()}")
+            server.stdin.write(json.dumps({'op': 'shutdown'}) + '\n')
+            server.stdin.flush()
+            server.wait(timeout=30)
+        finally:
+            if server.poll() is None:
+                server.kill()
+        return elapsed
+
+    def run_cold_start(self):
+        """Wall time of a fresh `predict.py <command>` process, median of repeats"""
+        for command in COLD_START_COMMANDS:
+            timings = []
+            for _ in range(self.repeats):
+                if command == 'serve':
+                    timings.append(self._serve_until_ready())
+                    continue
+                started = time.perf_counter()
+                completed = subprocess.run([sys.executable, 'predict.py'] + self.cold_start_args(command), cwd=HERE,
+                                           stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+                timings.append(time.perf_counter() - started)
+                if completed.returncode != 0:
+                    raise RuntimeError(f"predict.py {command} exited with {completed.returncode}")
+            self.record(f'coldStart.{command}', round(float(np.median(timings)) * 1000, 1), 'ms')
+
+    def run_load(self):
+        """load_model + warm_up time and peak RSS per engine, each in a fresh process"""
+        for engine in self.engines():
+            results = [_run_python(['-c', f'import benchmark; benchmark.probe_load({self.model_path!r}, {engine!r})'])
+                       for _ in range(self.repeats)]
+            self.record(f'load.{engine}.ms', round(float(np.median([r['ms'] for r in results])), 1), 'ms')
+            self.record(f'load.{engine}.peakRssMb', max(r['peakRssMb'] or 0 for r in results), 'MB')
+
+    def engines(self):
+        try:
+            import xgboost  # noqa: F401
+            return ['numpy', 'xgboost']
+        except ImportError:
+            return ['numpy']
+
+    def predictor(self, engine):
+        from predict import RealEstatePredictor
+
+        predictor = RealEstatePredictor()
+        with redirect_stdout(sys.stderr):
+            if not (predictor.load_model(self.model_path, engine=engine) and predictor.warm_up()):
+                raise RuntimeError(f"Cannot load {self.model_path}")
+        return predictor
+
+    def run_predict(self, calls=2000):
+        """Single-row predict_price latency on a warm predictor (no cache), per engine"""
+        properties = _properties(calls, seed=2)
+        rows = list(zip(*(properties[column].tolist() for column in properties)))
+        for engine in self.engines():
+            predictor = self.predictor(engine)
+            for row in rows[:50]:
+                predictor.predict_price(*row)
+            timings = np.empty(len(rows))
+            for position, row in enumerate(rows):
+                started = time.perf_counter()
+                predictor.predict_price(*row)
+                timings[position] = time.perf_counter() - started
+            self.record(f'predictPrice.{engine}.p50Us', _percentile_us(timings, 50), 'us')
+            self.record(f'predictPrice.{engine}.p99Us', _percentile_us(timings, 99), 'us')
+
+    def run_batch(self, min_seconds=0.5):
+        """predict_batch rows per second at each batch size"""
+        import pandas as pd
+
+        predictor = self.predictor('auto')
+        frame = pd.DataFrame(_properties(max(self.batch_sizes), seed=3))
+        for size in self.batch_sizes:
+            batch = frame.iloc[:size]
+            predictor.predict_batch(batch)
+            runs, started = 0, time.perf_counter()
+            while runs < 3 or time.perf_counter() - started < min_seconds:
+                predictor.predict_batch(batch)
+                runs += 1
+            elapsed = time.perf_counter() - started
+            self.record(f'batch.{size}.rowsPerSecond', round(size * runs / elapsed, 1), 'rows/s', better='higher')
+
+    def run_forecast(self, calls=50):
+        """generate_forecast cost (default 2000 paths over 10 years)"""
+        predictor = self.predictor('auto')
+        predictor.generate_forecast(500000, 'Austin')
+        timings = np.empty(calls)
+        for position in range(calls):
+            started = time.perf_counter()
+            predictor.generate_forecast(500000, 'Austin')
+            timings[position] = time.perf_counter() - started
+        self.record('forecast.p50Ms', round(float(np.percentile(timings, 50)) * 1000, 3), 'ms')
+        self.record('forecast.p99Ms', round(float(np.percentile(timings, 99)) * 1000, 3), 'ms')
+
+    def run_training(self):
+        """create_pretrained_model data generation and training time per dataset size, in a fresh process"""
+        for samples in self.training_sizes:
+            _log(f"Training on {samples:,} rows...")
+            output_dir = self.path(f'training_{samples}')
+            result = _run_python(['-c', f'import benchmark; benchmark.probe_training({samples}, {output_dir!r})'])
+            shutil.rmtree(output_dir, ignore_errors=True)
+            self.record(f'training.{samples}.generateSeconds', result['generateSeconds'], 's')
+            self.record(f'training.{samples}.prepareSeconds', result['prepareSeconds'], 's')
+            self.record(f'training.{samples}.trainSeconds', result['trainSeconds'], 's')
+            self.record(f'training.{samples}.peakRssMb', result['peakRssMb'], 'MB')
+
+    def run(self, suites=None):
+        """Run the selected suites; a failing suite is reported in errors instead of aborting the run"""
+        self.prepare()
+        for suite in suites or SUITES:
+            _log(f"Running {suite}...")
+            started = time.perf_counter()
+            try:
+                getattr(self, 'run_' + suite.replace('-', '_'))()
+            except Exception as e:
+                self.errors[suite] = str(e)
+                _log(f"{suite} failed: {e}")
+            _log(f"{suite} took {time.perf_counter() - started:.1f}s")
+        return self.results()
+
+    def results(self):
+        return {
+            'format': RESULTS_FORMAT,
+            'schema_version': RESULTS_SCHEMA_VERSION,
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'environment': environment(),
+            'metrics': self.metrics,
+            'errors': self.errors
+        }
+
+
+def probe_load(model_path, engine):
+    """Fresh-process half of Benchmark.run_load: prints load time and peak RSS as JSON"""
+    from predict import RealEstatePredictor
+
+    started = time.perf_counter()
+    predictor = RealEstatePredictor()
+    with redirect_stdout(sys.stderr):
+        loaded = predictor.load_model(model_path, engine=engine) and predictor.warm_up()
+    if not loaded:
+        sys.exit(1)
+    print(json.dumps({'ms': (time.perf_counter() - started) * 1000, 'peakRssMb': _peak_rss_mb()}))
+
+
+def probe_training(samples, output_dir):
+    """Fresh-process half of Benchmark.run_training"""
+    from create_model import create_pretrained_model
+
+    timings = {}
+    with redirect_stdout(sys.stderr):
+        create_pretrained_model(num_samples=samples, output_dir=output_dir, timings=timings)
+    timings['peakRssMb'] = _peak_rss_mb()
+    print(json.dumps(timings))
+
+
+def environment():
+    """Where the numbers came from; comparisons across different machines are only indicative"""
+    versions = {}
+    for module in ('numpy', 'pandas', 'sklearn', 'xgboost'):
+        try:
+            versions[module] = __import__(module).__version__
+        except ImportError:
+            versions[module] = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'versions': versions
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, thresholds=None):
+    """Compare results with a baseline run; returns (report rows, whether anything regressed).
+
+    A metric regresses when it moved in its worse direction by more than its threshold (a
+    fraction of the baseline value). thresholds overrides the default per metric name and may
+    also come from the baseline file's own "thresholds" object.
+    """
+    limits = dict(baseline.get('thresholds', {}), **(thresholds or {}))
+    report, regressed = [], False
+    for name, current in sorted(results['metrics'].items()):
+        previous = baseline['metrics'].get(name)
+        limit = limits.get(name, threshold)
+        row = {'metric': name, 'unit': current['unit'], 'value': current['value'], 'threshold': limit}
+        if previous is None or not previous['value']:
+            row['status'] = 'new'
+        else:
+            change = (current['value'] - previous['value']) / previous['value']
+            worse = change if current['better'] == 'lower' else -change
+            row.update({'baseline': previous['value'], 'change': round(change, 4)})
+            row['status'] = 'regressed' if worse > limit else 'improved' if worse < -limit else 'ok'
+            regressed = regressed or row['status'] == 'regressed'
+        report.append(row)
+    for name in sorted(set(baseline['metrics']) - set(results['metrics'])):
+        report.append({'metric': name, 'status': 'missing', 'baseline': baseline['metrics'][name]['value']})
+    return report, regressed
+
+
+def _read_results(path):
+    with open(path) as f:
+        results = json.load(f)
+    if results.get('format') != RESULTS_FORMAT:
+        raise ValueError(f"{path} is not a benchmark results file")
+    return results
+
+
+def _parse_thresholds(values):
+    """['name=0.5', ...] -> {'name': 0.5}"""
+    thresholds = {}
+    for value in values or []:
+        name, _, limit = value.partition('=')
+        thresholds[name] = float(limit)
+    return thresholds
+
+
+def _sizes(value):
+    return [int(size) for size in value.split(',') if size]
+
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(prog='benchmark.py', description='EarthSlight AI model benchmarks')
+    commands = parser.add_subparsers(dest='command', metavar='<command>')
+
+    # Options shared by run and compare
+    checks = argparse.ArgumentParser(add_help=False)
+    checks.add_argument('--baseline', default=None, help='Baseline results JSON to compare against')
+    checks.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='Allowed slowdown as a fraction of the baseline (default 0.2 = 20%%)')
+    checks.add_argument('--metric-threshold', action='append', metavar='NAME=FRACTION',
+                        help='Threshold for one metric, e.g. coldStart.predict=0.5 (repeatable)')
+
+    run = commands.add_parser('run', parents=[checks], help='Run the benchmarks and write results JSON')
+    run.add_argument('--output', default='-', help='Results file (default: stdout)')
+    run.add_argument('--suites', default=','.join(SUITES), help=f"Comma-separated subset of {', '.join(SUITES)}")
+    run.add_argument('--repeats', type=int, default=5, help='Fresh processes per cold start / load measurement')
+    run.add_argument('--model-samples', type=int, default=50000, help='Rows the benchmark model is trained on')
+    run.add_argument('--batch-sizes', type=_sizes, default=DEFAULT_BATCH_SIZES, help='Comma-separated batch sizes')
+    run.add_argument('--training-sizes', type=_sizes, default=DEFAULT_TRAINING_SIZES,
+                     help='Comma-separated create_pretrained_model dataset sizes')
+    run.add_argument('--quick', action='store_true',
+                     help='2 repeats, batches up to 10k rows and only the 50k-row training run')
+    run.add_argument('--workdir', default=None, help='Scratch directory, kept for reuse (default: a temp dir)')
+
+    check = commands.add_parser('compare', parents=[checks], help='Compare a results file with a baseline')
+    check.add_argument('results', help='Results JSON written by run')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
+        return
+
+    if args.command == 'run':
+        suites = [suite for suite in args.suites.split(',') if suite]
+        unknown = sorted(set(suites) - set(SUITES))
+        if unknown:
+            parser.error(f"Unknown suites: {', '.join(unknown)}")
+        if args.quick:
+            args.repeats = min(args.repeats, 2)
+            args.batch_sizes = [size for size in args.batch_sizes if size <= 10000]
+            args.training_sizes = [50000]
+
+        workdir = args.workdir or tempfile.mkdtemp(prefix='earthslight-bench-')
+        os.makedirs(workdir, exist_ok=True)
+        try:
+            benchmark = Benchmark(workdir, repeats=args.repeats, model_samples=args.model_samples,
+                                  batch_sizes=args.batch_sizes, training_sizes=args.training_sizes)
+            results = benchmark.run(suites)
+        finally:
+            if args.workdir is None:
+                shutil.rmtree(workdir, ignore_errors=True)
+        if args.output == '-':
+            print(json.dumps(results, indent=2))
+        else:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2)
+            _log(f"Results written to {args.output}")
+    else:
+        results = _read_results(args.results)
+
+    if args.baseline:
+        report, regressed = compare(results, _read_results(args.baseline), threshold=args.threshold,
+                                    thresholds=_parse_thresholds(args.metric_threshold))
+        print(json.dumps({'comparison': report, 'regressed': regressed}, indent=2),
+              file=sys.stderr if args.command == 'run' and args.output == '-' else sys.stdout)
+        if regressed:
+            sys.exit(1)
+    elif args.command == 'compare':
+        parser.error('compare needs --baseline')
+    if args.command == 'run' and results['errors']:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
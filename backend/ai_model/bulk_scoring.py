@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Streaming bulk valuation
+Scores CSV / NDJSON / Parquet property files chunk by chunk with bounded memory
+"""
+
+import os
+import time
+import queue
+import threading
+import pandas as pd
+
+CSV_EXTENSIONS = ('.csv',)
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+# Marks the end of a pipeline queue
+_DONE = object()
+
+
+def _file_format(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension in CSV_EXTENSIONS:
+        return 'csv'
+    if extension in NDJSON_EXTENSIONS:
+        return 'ndjson'
+    if extension in PARQUET_EXTENSIONS:
+        return 'parquet'
+    raise ValueError(f"Unsupported file type: {path}")
+
+
+def _import_pyarrow():
+    """pyarrow is only needed for Parquet files"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet support requires pyarrow. Install it with: pip install pyarrow")
+    return pyarrow
+
+
+def iter_property_chunks(path, chunk_size=50000):
+    """Yield DataFrames of at most chunk_size rows from a CSV, NDJSON or Parquet file"""
+    file_format = _file_format(path)
+    if file_format == 'csv':
+        with pd.read_csv(path, chunksize=chunk_size) as reader:
+            yield from reader
+    elif file_format == 'ndjson':
+        with pd.read_json(path, lines=True, chunksize=chunk_size) as reader:
+            yield from reader
+    else:
+        pyarrow = _import_pyarrow()
+        parquet_file = pyarrow.parquet.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+
+
+class NdjsonResultWriter:
+    """Append scored chunks to a newline-delimited JSON file"""
+
+    def __init__(self, path):
+        self.file = open(path, 'w', encoding='utf-8')
+
+    def write(self, frame):
+        if len(frame):
+            self.file.write(frame.to_json(orient='records', lines=True).rstrip('\n') + '\n')
+
+    def close(self):
+        self.file.close()
+
+
+class ParquetResultWriter:
+    """Append scored chunks as row groups of a Parquet file"""
+
+    def __init__(self, path):
+        self.pyarrow = _import_pyarrow()
+        self.path = path
+        self.writer = None
+
+    def write(self, frame):
+        table = self.pyarrow.Table.from_pandas(frame, preserve_index=False)
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.path, table.schema)
+        else:
+            table = table.cast(self.writer.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def open_result_writer(path):
+    """Open a streaming writer for an .ndjson or .parquet output file"""
+    file_format = _file_format(path)
+    if file_format == 'ndjson':
+        return NdjsonResultWriter(path)
+    if file_format == 'parquet':
+        return ParquetResultWriter(path)
+    raise ValueError(f"Unsupported output type: {path} (use .ndjson or .parquet)")
+
+
+def _score_chunk(predictor, chunk, batch_size, scorer=None):
+    """Input columns followed by the prediction columns"""
+    if scorer is not None:
+        results, _ = scorer.score(chunk, chunk_size=batch_size)
+    else:
+        results = predictor.predict_batch(chunk, chunk_size=batch_size)
+    if results is None:
+        raise RuntimeError('Model not loaded')
+    return pd.concat([chunk.reset_index(drop=True), results], axis=1)
+
+
+def _producer(source, target, error):
+    """Move items from an iterable into a bounded queue, stopping early if another stage failed"""
+    try:
+        for item in source:
+            while True:
+                if error:
+                    return
+                try:
+                    target.put(item, timeout=0.1)
+                    break
+                except queue.Full:
+                    continue
+    except Exception as e:
+        error.append(e)
+    finally:
+        target.put(_DONE)
+
+
+def _drain(source):
+    """Iterate a pipeline queue until its end marker"""
+    while True:
+        item = source.get()
+        if item is _DONE:
+            return
+        yield item
+
+
+def score_file(predictor, input_path, output_path, chunk_size=50000, batch_size=None,
+               pipeline=False, queue_depth=2, workers=1):
+    """Stream input_path through predictor.predict_batch into output_path.
+
+    At most chunk_size rows are held per stage, so peak memory does not depend on the
+    file size. With pipeline=True reading, scoring and writing run on separate threads
+    connected by queues of queue_depth chunks. With workers > 1 each chunk is split into
+    batch_size pieces scored by a ParallelScorer process pool.
+    """
+    if workers > 1:
+        # Split every chunk so each worker gets a piece of it
+        batch_size = batch_size or -(-chunk_size // workers)
+    batch_size = batch_size or chunk_size
+    writer = open_result_writer(output_path)
+    stats = {'input': input_path, 'output': output_path, 'rows': 0, 'chunks': 0}
+    started = time.perf_counter()
+
+    scorer = None
+    try:
+        if workers > 1:
+            from parallel_scoring import ParallelScorer
+            scorer = ParallelScorer(predictor, workers=workers, chunk_size=batch_size)
+
+        if not pipeline:
+            for chunk in iter_property_chunks(input_path, chunk_size):
+                scored = _score_chunk(predictor, chunk, batch_size, scorer)
+                writer.write(scored)
+                stats['rows'] += len(scored)
+                stats['chunks'] += 1
+        else:
+            read_queue = queue.Queue(maxsize=queue_depth)
+            write_queue = queue.Queue(maxsize=queue_depth)
+            errors = []
+            reader = threading.Thread(
+                target=_producer, args=(iter_property_chunks(input_path, chunk_size), read_queue, errors),
+                name='score-reader', daemon=True
+            )
+
+            def write_chunks():
+                try:
+                    for scored in _drain(write_queue):
+                        if not errors:
+                            writer.write(scored)
+                except Exception as e:
+                    errors.append(e)
+                    # Keep consuming so the scoring stage never blocks on a full queue
+                    for _ in _drain(write_queue):
+                        pass
+
+            writer_thread = threading.Thread(target=write_chunks, name='score-writer', daemon=True)
+            reader.start()
+            writer_thread.start()
+
+            def scored_chunks():
+                for chunk in _drain(read_queue):
+                    if errors:
+                        continue
+                    scored = _score_chunk(predictor, chunk, batch_size, scorer)
+                    stats['rows'] += len(scored)
+                    stats['chunks'] += 1
+                    yield scored
+
+            _producer(scored_chunks(), write_queue, errors)
+            # If scoring stopped early the reader may still be waiting on a full queue
+            while reader.is_alive():
+                try:
+                    read_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            reader.join()
+            writer_thread.join()
+            if errors:
+                raise errors[0]
+    finally:
+        writer.close()
+        if scorer is not None:
+            scorer.close()
+
+    if scorer is not None:
+        stats['workers'] = scorer.summary()
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    stats['rowsPerSecond'] = round(stats['rows'] / stats['seconds'], 1) if stats['seconds'] else None
+    return stats
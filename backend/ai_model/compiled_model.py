@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Compiled tree evaluator
+Pure-numpy evaluator for the XGBoost model; needs neither pandas, scikit-learn nor xgboost at predict time
+"""
+
+import json
+import numpy as np
+
+def flatten_booster(booster, num_trees=None):
+    """Flatten an xgboost Booster (or XGBRegressor) into concatenated node arrays.
+
+    Node i of tree t lives at roots[t] + i; children indices are rewritten to point into the
+    concatenated arrays and leaves are marked with left == -1.
+    """
+    if hasattr(booster, 'get_booster'):
+        booster = booster.get_booster()
+    learner = json.loads(bytes(booster.save_raw(raw_format='json')))['learner']
+
+    objective = learner['objective']['name']
+    if objective not in ('reg:squarederror', 'reg:linear'):
+        raise ValueError(f"Unsupported objective for compiled inference: {objective}")
+    if learner['gradient_booster']['name'] != 'gbtree':
+        raise ValueError('Only gbtree boosters can be compiled')
+
+    trees = learner['gradient_booster']['model']['trees']
+    if num_trees is not None:
+        trees = trees[:num_trees]
+
+    left, right, features, conditions, default_left, roots = [], [], [], [], [], []
+    offset = 0
+    for tree in trees:
+        if any(tree['split_type']):
+            raise ValueError('Categorical splits are not supported by the compiled evaluator')
+        tree_left = np.asarray(tree['left_children'], dtype=np.int32)
+        tree_right = np.asarray(tree['right_children'], dtype=np.int32)
+        is_leaf = tree_left == -1
+        roots.append(offset)
+        left.append(np.where(is_leaf, -1, tree_left + offset))
+        right.append(np.where(is_leaf, -1, tree_right + offset))
+        features.append(np.asarray(tree['split_indices'], dtype=np.int32))
+        # Leaves keep their value in split_conditions
+        conditions.append(np.asarray(tree['split_conditions'], dtype=np.float32))
+        default_left.append(np.asarray(tree['default_left'], dtype=bool))
+        offset += len(tree_left)
+
+    return {
+        'left': np.concatenate(left).astype(np.int32),
+        'right': np.concatenate(right).astype(np.int32),
+        'feature': np.concatenate(features).astype(np.int32),
+        'threshold': np.concatenate(conditions).astype(np.float32),
+        'default_left': np.concatenate(default_left),
+        'roots': np.asarray(roots, dtype=np.int32),
+        'base_score': np.float32(float(learner['learner_model_param']['base_score']))
+    }
+
+
+class FeatureEncoder:
+    """Location table + StandardScaler statistics shared by the pandas-free inference paths.
+
+    Subclasses provide feature_columns, location_codes, scaler_mean and scaler_scale.
+    """
+
+    # Code given to locations missing from location_codes
+    UNKNOWN_LOCATION = 0
+
+    # Whether the features include the environmental risk features of risk_index.py
+    has_risk_features = False
+
+    def encode_location(self, location):
+        """Unknown locations fall back to code 0, like the LabelEncoder path"""
+        return self.location_codes.get(location, self.UNKNOWN_LOCATION)
+
+    def build_features(self, **columns):
+        """Stack named feature values/arrays (floors=..., location_encoded=...) in model column order"""
+        return np.column_stack([np.atleast_1d(columns[name]) for name in self.feature_columns])
+
+    def transform(self, features):
+        """Apply the StandardScaler statistics as an affine transform"""
+        return (np.asarray(features, dtype=np.float64) - self.scaler_mean) / self.scaler_scale
+
+
+class CompiledModel(FeatureEncoder):
+    """Scaler + location encoder + tree ensemble evaluated with numpy only"""
+
+    def __init__(self, trees, feature_columns, scaler_mean, scaler_scale, location_codes):
+        self.feature_columns = list(feature_columns)
+        self.scaler_mean = np.asarray(scaler_mean, dtype=np.float64)
+        self.scaler_scale = np.asarray(scaler_scale, dtype=np.float64)
+        self.location_codes = dict(location_codes)
+
+        self.left = np.asarray(trees['left'])
+        self.right = np.asarray(trees['right'])
+        self.feature = np.asarray(trees['feature'])
+        self.threshold = np.asarray(trees['threshold'])
+        self.default_left = np.asarray(trees['default_left'])
+        self.roots = np.asarray(trees['roots'])
+        self.base_score = np.float32(trees['base_score'])
+
+    def predict(self, features):
+        """Predict prices for a (rows, features) array of raw, unscaled features"""
+        # xgboost compares float32 feature values against float32 split thresholds
+        scaled = self.transform(np.atleast_2d(features)).astype(np.float32)
+        num_rows = scaled.shape[0]
+
+        nodes = np.broadcast_to(self.roots, (num_rows, len(self.roots))).copy()
+        while True:
+            internal = self.left[nodes] != -1
+            if not internal.any():
+                break
+            values = np.take_along_axis(scaled, self.feature[nodes], axis=1)
+            go_left = np.where(np.isnan(values), self.default_left[nodes], values < self.threshold[nodes])
+            children = np.where(go_left, self.left[nodes], self.right[nodes])
+            nodes = np.where(internal, children, nodes)
+
+        # Accumulate tree by tree in float32, the same order xgboost uses
+        leaves = self.threshold[nodes]
+        predictions = np.full(num_rows, self.base_score, dtype=np.float32)
+        for tree in range(leaves.shape[1]):
+            predictions += leaves[:, tree]
+        return predictions
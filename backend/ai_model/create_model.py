@@ -1,120 +1,175 @@
 #!/usr/bin/env python3
 """
 Script to create the pre-trained model for the Real Estate Price Prediction system
-This will generate model.pkl with all required components
+This will generate the model_artifact directory with all required components
 """
 
+import time
 import pickle
-import numpy as np
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-import xgboost as xgb
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import mean_absolute_error, r2_score
+import argparse
+from datetime import datetime
 import warnings
 warnings.filterwarnings('ignore')
 
-def create_pretrained_model():
-    """Create and save a pre-trained XGBoost model"""
-    
-    # Set random seed for reproducibility
-    np.random.seed(42)
-    
-    # Location multipliers (based on real estate market data)
-    location_multipliers = {
-        'Los Angeles': 2.5,
-        'New York': 3.0,
-        'San Francisco': 2.8,
-        'Chicago': 1.8,
-        'Miami': 1.9,
-        'Seattle': 2.2,
-        'Austin': 1.6,
-        'Denver': 1.7,
-        'Boston': 2.3,
-        'Portland': 1.9
-    }
-    
-    # Market growth rates by location
-    growth_rates = {
-        'Los Angeles': 0.04,
-        'New York': 0.035,
-        'San Francisco': 0.045,
-        'Chicago': 0.025,
-        'Miami': 0.03,
-        'Seattle': 0.035,
-        'Austin': 0.04,
-        'Denver': 0.03,
-        'Boston': 0.035,
-        'Portland': 0.03
-    }
+# numpy, pandas, scikit-learn and xgboost are imported inside the commands that use them, so
+# `generate` and `export` do not pay for the training stack
+
+DEFAULT_ARTIFACT_DIR = 'model_artifact'
+
+# Kept in sync with training_cache.py, which is only imported by the commands that train
+DEFAULT_CACHE_DIR = '.training_cache'
+DEFAULT_BUDGET_MB = 2048
+
+FEATURE_COLUMNS = ['floors', 'area', 'bedrooms', 'bathrooms', 'age', 'location_encoded']
+
+# Location multipliers (based on real estate market data)
+LOCATION_MULTIPLIERS = {
+    'Los Angeles': 2.5,
+    'New York': 3.0,
+    'San Francisco': 2.8,
+    'Chicago': 1.8,
+    'Miami': 1.9,
+    'Seattle': 2.2,
+    'Austin': 1.6,
+    'Denver': 1.7,
+    'Boston': 2.3,
+    'Portland': 1.9
+}
+
+# Market growth rates by location
+GROWTH_RATES = {
+    'Los Angeles': 0.04,
+    'New York': 0.035,
+    'San Francisco': 0.045,
+    'Chicago': 0.025,
+    'Miami': 0.03,
+    'Seattle': 0.035,
+    'Austin': 0.04,
+    'Denver': 0.03,
+    'Boston': 0.035,
+    'Portland': 0.03
+}
+
+def create_pretrained_model(num_samples=50000, seed=42, output_dir=DEFAULT_ARTIFACT_DIR, timings=None,
+                            risk_events=None, risk_radius_km=25.0, cache_dir=DEFAULT_CACHE_DIR,
+                            cache_budget_mb=DEFAULT_BUDGET_MB):
+    """Create and save a pre-trained XGBoost model.
+
+    timings, if given, is filled with generateSeconds, prepareSeconds (encoding, split and
+    DMatrix), trainSeconds (xgb.train alone), saveSeconds and the cache status of every stage.
+    risk_events (a GeoJSON or NDJSON file) adds the environmental risk features of risk_index.py.
+    The raw data, encoded matrix, train/test split and training DMatrix are reused from cache_dir
+    when their inputs are unchanged (cache_dir=None disables it).
+    """
+    import numpy as np
+    import pandas as pd
+    import sklearn
+    import xgboost as xgb
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+    from sklearn.model_selection import train_test_split
+    from sklearn.metrics import mean_absolute_error, r2_score
+    import synthetic_data
+    import risk_index as risk_module
+    from model_artifact import ModelArtifact, read_manifest
+    from risk_index import RISK_FEATURES, RiskIndex
+    from training_cache import StageCache, file_digest, source_digest
+    
+    location_multipliers = LOCATION_MULTIPLIERS
+    growth_rates = GROWTH_RATES
+    cache = StageCache(cache_dir, cache_budget_mb)
     
     print("Generating training data...")
-    
-    # Generate comprehensive training data
-    num_samples = 50000
-    locations = list(location_multipliers.keys())
-    
-    data = {
-        'floors': np.random.randint(1, 51, num_samples),
-        'area': np.random.randint(100, 10001, num_samples),
-        'bedrooms': np.random.randint(1, 11, num_samples),
-        'bathrooms': np.random.randint(1, 11, num_samples),
-        'age': np.random.randint(0, 101, num_samples),
-        'location': np.random.choice(locations, num_samples)
-    }
-    
-    df = pd.DataFrame(data)
-    
-    # Calculate realistic prices based on features
-    base_price = 150000
-    prices = []
-    
-    for _, row in df.iterrows():
-        location_mult = location_multipliers.get(row['location'], 1.5)
-        area_mult = row['area'] / 1000
-        bedroom_mult = 1 + (row['bedrooms'] - 2) * 0.15
-        bathroom_mult = 1 + (row['bathrooms'] - 1) * 0.1
-        floor_mult = 1 + (row['floors'] - 1) * 0.05
-        age_mult = max(0.7, 1 - (row['age'] * 0.01))
-        
-        price = base_price * location_mult * area_mult * bedroom_mult * bathroom_mult * floor_mult * age_mult
-        # Add realistic market noise
-        price *= np.random.uniform(0.85, 1.15)
-        prices.append(int(max(50000, price)))  # Minimum price floor
-    
-    df['price'] = prices
-    
+    timings = {} if timings is None else timings
+    started = time.perf_counter()
+    
+    # Generate comprehensive training data (realistic market noise and a minimum price floor)
+    def generate():
+        df = synthetic_data.generate_training_frame(num_samples, location_multipliers, seed=seed,
+                                                    noise_range=(0.85, 1.15), price_floor=50000)
+        arrays = {}
+        if risk_events:
+            df, index = add_risk_features(df, risk_events, risk_radius_km, seed=seed)
+            arrays = {f'index_{name}': values for name, values in index.to_arrays().items()}
+        # Fixed-width strings: object columns cannot be memory-mapped
+        arrays.update({column: df[column].to_numpy(dtype=str if df[column].dtype == object else None)
+                       for column in df.columns})
+        return arrays
+    
+    raw_key = cache.key('raw', {
+        'samples': num_samples, 'seed': seed, 'noiseRange': [0.85, 1.15], 'priceFloor': 50000,
+        'locationMultipliers': location_multipliers,
+        'risk': {'events': file_digest(risk_events), 'radiusKm': risk_radius_km} if risk_events else None,
+        'source': source_digest(synthetic_data, risk_module)
+    })
+    raw = cache.arrays(raw_key, generate)
+    df = pd.DataFrame({name: values for name, values in raw.items() if not name.startswith('index_')})
+    risk_index = None
+    if risk_events:
+        risk_index = RiskIndex.from_arrays({name[len('index_'):]: values for name, values in raw.items()
+                                            if name.startswith('index_')}, risk_radius_km)
+    
+    timings['generateSeconds'] = round(time.perf_counter() - started, 3)
+    started = time.perf_counter()
     print(f"Generated {len(df)} training samples")
     print(f"Price range: ${df['price'].min():,} - ${df['price'].max():,}")
     print(f"Average price: ${df['price'].mean():,.0f}")
     
     # Prepare features for training
     print("\nPreparing features...")
+    feature_columns = FEATURE_COLUMNS + (RISK_FEATURES if risk_index is not None else [])
+    
+    def encode():
+        # Encode location, then scale the feature matrix
+        label_encoder = LabelEncoder()
+        X = df.assign(location_encoded=label_encoder.fit_transform(df['location']))[feature_columns]
+        scaler = StandardScaler()
+        return {
+            'features': scaler.fit_transform(X),
+            'labels': df['price'].to_numpy(),
+            'location_classes': label_encoder.classes_.astype(str),
+            'scaler_mean': scaler.mean_,
+            'scaler_scale': scaler.scale_,
+            'scaler_var': scaler.var_
+        }
     
-    # Encode location
-    label_encoder = LabelEncoder()
-    df['location_encoded'] = label_encoder.fit_transform(df['location'])
-    
-    # Prepare feature matrix
-    feature_columns = ['floors', 'area', 'bedrooms', 'bathrooms', 'age', 'location_encoded']
-    X = df[feature_columns]
-    y = df['price']
+    encoded_key = cache.key('encoded', {'raw': raw_key, 'features': feature_columns, 'sklearn': sklearn.__version__})
+    encoded = cache.arrays(encoded_key, encode)
     
-    # Scale features
+    # Fitted encoder and scaler, whether this run fitted them or the cache did
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.array(encoded['location_classes'])
     scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
+    scaler.mean_ = np.array(encoded['scaler_mean'])
+    scaler.scale_ = np.array(encoded['scaler_scale'])
+    scaler.var_ = np.array(encoded['scaler_var'])
+    scaler.n_features_in_ = len(feature_columns)
+    scaler.n_samples_seen_ = len(df)
     
     # Split data
-    X_train, X_test, y_train, y_test = train_test_split(X_scaled, y, test_size=0.2, random_state=42)
+    def split():
+        X_train, X_test, y_train, y_test = train_test_split(encoded['features'], encoded['labels'],
+                                                            test_size=0.2, random_state=42)
+        return {'X_train': X_train, 'X_test': X_test, 'y_train': y_train, 'y_test': y_test}
+    
+    split_key = cache.key('split', {'encoded': encoded_key, 'testSize': 0.2, 'randomState': 42})
+    splits = cache.arrays(split_key, split)
+    X_train, X_test, y_train, y_test = (splits[name] for name in ('X_train', 'X_test', 'y_train', 'y_test'))
     
     print(f"Training set size: {len(X_train)}")
     print(f"Test set size: {len(X_test)}")
     
+    # A plain DMatrix, not a QuantileDMatrix: the default tree method here is 'exact', which needs the
+    # raw values (quantizing would mean 'hist' and a different model), and xgboost cannot save a
+    # QuantileDMatrix as a binary buffer anyway
+    dtrain = cache.dmatrix(cache.key('dmatrix', {'split': split_key, 'xgboost': xgb.__version__}),
+                           lambda: xgb.DMatrix(X_train, label=y_train, nthread=-1))
+    timings['prepareSeconds'] = round(time.perf_counter() - started, 3)
+    
     # Train XGBoost model
     print("\nTraining XGBoost model...")
     
-    model = xgb.XGBRegressor(
+    # Trained with xgb.train on the cached DMatrix; same booster as XGBRegressor.fit would build
+    params = xgb.XGBRegressor(
         n_estimators=200,
         max_depth=8,
         learning_rate=0.1,
@@ -124,11 +179,15 @@ def create_pretrained_model():
         n_jobs=-1
     )
     
-    model.fit(X_train, y_train)
+    started = time.perf_counter()
+    model = xgb.train(params.get_xgb_params(), dtrain, num_boost_round=params.n_estimators)
+    timings['trainSeconds'] = round(time.perf_counter() - started, 3)
+    timings['cache'] = cache.report
+    print("Cache: " + ', '.join(f"{stage} {entry['status']}" for stage, entry in cache.report.items()))
     
     # Evaluate model
-    train_pred = model.predict(X_train)
-    test_pred = model.predict(X_test)
+    train_pred = model.predict(dtrain)
+    test_pred = model.predict(xgb.DMatrix(X_test))
     
     train_mae = mean_absolute_error(y_train, train_pred)
     test_mae = mean_absolute_error(y_test, test_pred)
@@ -144,8 +203,9 @@ def create_pretrained_model():
     # Prepare label encoders dictionary
     label_encoders = {'location': label_encoder}
     
-    # Save complete model package
+    # Save complete model package as one versioned artifact directory
     print("\nSaving model...")
+    started = time.perf_counter()
     
     model_data = {
         'model': model,
@@ -159,56 +219,390 @@ def create_pretrained_model():
             'training_samples': num_samples,
             'test_mae': test_mae,
             'test_r2': test_r2,
-            'created_date': '2025-08-04'
+            'created_date': datetime.now().strftime('%Y-%m-%d')
         }
     }
+    if risk_index is not None:
+        model_data['risk_index'] = risk_index
+        model_data['model_info']['risk'] = dict(risk_index.describe(), source=risk_events)
     
-    # Save as model.pkl (main model file)
-    with open('model.pkl', 'wb') as f:
-        pickle.dump(model_data, f)
-    
-    print("✓ Model saved as 'model.pkl'")
-    
-    # Also save individual components for compatibility with existing files
-    with open('real_estate_price_model_package.pkl', 'wb') as f:
-        pickle.dump(model, f)
-    
-    with open('scaler.pkl', 'wb') as f:
-        pickle.dump(scaler, f)
-    
-    with open('location_encoding.pkl', 'wb') as f:
-        pickle.dump(label_encoder, f)
-    
-    print("✓ Individual components updated")
+    artifact_dir = save_model_artifact(model_data, output_dir)
+    timings['saveSeconds'] = round(time.perf_counter() - started, 3)
+    print(f"✓ Model saved to '{artifact_dir}' (version {read_manifest(artifact_dir)['checksum'][:12]})")
     
     # Test the saved model
     print("\nTesting saved model...")
     
     # Reload and test
-    with open('model.pkl', 'rb') as f:
-        loaded_data = pickle.load(f)
-    
-    loaded_model = loaded_data['model']
-    loaded_scaler = loaded_data['scaler']
-    loaded_encoders = loaded_data['label_encoders']
+    loaded = ModelArtifact(artifact_dir)
     
     # Test prediction
-    test_input = pd.DataFrame({
-        'floors': [2],
-        'area': [1500],
-        'bedrooms': [3],
-        'bathrooms': [2],
-        'age': [10],
-        'location_encoded': [loaded_encoders['location'].transform(['Los Angeles'])[0]]
-    })
-    
-    test_scaled = loaded_scaler.transform(test_input)
-    test_prediction = loaded_model.predict(test_scaled)[0]
+    risk = loaded.risk_index.point_features(34.0522, -118.2437) if loaded.has_risk_features else {}
+    test_input = loaded.build_features(
+        floors=2, area=1500, bedrooms=3, bathrooms=2, age=10,
+        location_encoded=loaded.encode_location('Los Angeles'), **risk
+    )
+    test_prediction = loaded.predict(test_input)[0]
     
     print(f"Test prediction: ${test_prediction:,.0f}")
     print("✓ Model loading and prediction test successful!")
     
     return True
 
+def add_risk_features(df, risk_events, radius_km=25.0, seed=42):
+    """Give synthetic properties coordinates around their market and append their risk features.
+
+    Prices get the synthetic risk discount, so the model has an effect to learn. Returns the
+    frame and the RiskIndex built from risk_events.
+    """
+    import numpy as np
+    from geo_index import GeoIndex
+    from risk_index import RiskIndex
+    from synthetic_data import synthetic_coordinates, risk_discount
+    
+    index = RiskIndex.from_file(risk_events, radius_km)
+    print(f"Loaded {len(index):,} environmental risk events from {risk_events}")
+    markets = GeoIndex.from_file()
+    positions = np.array([markets.codes[name] for name in df['location']])
+    lat, lng = synthetic_coordinates(df['location'], markets.lat[positions], markets.lng[positions],
+                                     markets.radius_km[positions], seed=seed)
+    df = df.assign(lat=lat, lng=lng, **index.features(lat, lng))
+    df['price'] = np.maximum(50000, df['price'] * risk_discount(df['risk_exposure'])).astype(np.int64)
+    print(f"Properties within {radius_km:g} km of a risk event: {(df['risk_events'] > 0).mean():.1%}")
+    return df, index
+
+def train_streaming_model(data_path=None, num_samples=50000, seed=42, output_dir=DEFAULT_ARTIFACT_DIR,
+                          chunk_size=1000000, nthread=None, num_rounds=200, max_bin=256, external_memory=False):
+    """Train out of core from a data file (or the synthetic generator) and save a model artifact"""
+    from streaming_training import ChunkSource, train_out_of_core
+    
+    source = ChunkSource(data_path, num_samples=num_samples, location_multipliers=LOCATION_MULTIPLIERS,
+                         seed=seed, chunk_size=chunk_size)
+    print(f"Training out of core from {data_path or f'{num_samples:,} synthetic rows'} "
+          f"({chunk_size:,} rows per chunk)...")
+    booster, preprocessor, stats = train_out_of_core(
+        source, nthread=nthread, num_rounds=num_rounds, max_bin=max_bin, external_memory=external_memory
+    )
+    
+    print("\nModel Performance:")
+    print(f"Testing MAE: ${stats['testMae']:,.0f}")
+    print(f"Testing R²: {stats['testR2']:.4f}")
+    print(f"\nWall time: {stats['seconds']:.1f}s ({stats['rowsPerSecond']:,.0f} rows/s), "
+          f"peak RSS: {stats['peakRssMb']} MB")
+    
+    save_preprocessed_artifact(output_dir, booster, preprocessor, {
+        'model_type': 'XGBoost',
+        'training_samples': stats['rows'],
+        'test_mae': stats['testMae'],
+        'test_r2': stats['testR2'],
+        'created_date': datetime.now().strftime('%Y-%m-%d'),
+        'training': stats
+    })
+    return stats
+
+def tune_model(data_path=None, num_samples=50000, seed=42, chunk_size=1000000, trials=20, workers=None,
+               threads_per_trial=None, rounds=1000, early_stopping_rounds=30, max_bin=256, latency_weight=0.1,
+               max_latency_ms=None, prune=True, leaderboard_path='tuning_leaderboard.json', export_dir=None):
+    """Search xgboost hyperparameters, write the leaderboard and optionally export the winner"""
+    import json
+    from streaming_training import ChunkSource
+    from hyperparameter_search import HyperparameterSearch
+    
+    source = ChunkSource(data_path, num_samples=num_samples, location_multipliers=LOCATION_MULTIPLIERS,
+                         seed=seed, chunk_size=chunk_size)
+    search = HyperparameterSearch(
+        source, trials=trials, workers=workers, threads_per_trial=threads_per_trial, rounds=rounds,
+        early_stopping_rounds=early_stopping_rounds, max_bin=max_bin, latency_weight=latency_weight,
+        max_latency_ms=max_latency_ms, prune=prune, seed=seed
+    )
+    leaderboard, booster = search.run()
+    
+    print(f"\n{'Trial':>5} {'Status':<9} {'MAE':>12} {'R²':>8} {'Rounds':>6} {'Train s':>8} {'p50 µs':>8} "
+          f"{'Objective':>12}")
+    for entry in leaderboard:
+        if entry['status'] == 'complete':
+            print(f"{entry['trial']:>5} {entry['status']:<9} {entry['mae']:>12,.0f} {entry['r2']:>8.4f} "
+                  f"{entry['rounds']:>6} {entry['trainSeconds']:>8.2f} {entry['latencyP50Us']:>8.0f} "
+                  f"{entry['objective']:>12,.0f}{'' if entry['withinLatencyBudget'] else '  over latency budget'}")
+        else:
+            print(f"{entry['trial']:>5} {entry['status']:<9} {entry.get('validationMae', float('nan')):>12,.0f}  validation")
+    
+    with open(leaderboard_path, 'w') as f:
+        json.dump({
+            'objective': f"mae * (1 + {latency_weight} * p50 latency ms)",
+            'maxLatencyMs': max_latency_ms,
+            'stats': search.stats,
+            'trials': leaderboard
+        }, f, indent=2)
+    print(f"\n✓ Leaderboard written to '{leaderboard_path}'")
+    
+    if booster is None:
+        print("No trial completed, nothing to export")
+        return leaderboard
+    winner = leaderboard[0]
+    print(f"Best trial: {winner['trial']} {winner['params']}")
+    if export_dir:
+        save_preprocessed_artifact(export_dir, booster, search.preprocessor, {
+            'model_type': 'XGBoost',
+            'training_samples': search.stats['rows'],
+            'test_mae': winner['mae'],
+            'test_r2': winner['r2'],
+            'created_date': datetime.now().strftime('%Y-%m-%d'),
+            'tuning': {key: winner[key] for key in ('trial', 'params', 'rounds', 'latencyP50Us', 'objective')}
+        })
+    return leaderboard
+
+def train_market_shards(data_path=None, num_samples=50000, seed=42, output_dir='model_shards', clusters_path=None,
+                        min_rows=1000, workers=None, num_rounds=200, chunk_size=1000000, route_all=False,
+                        shard_depth=6):
+    """Train one model per market (or market cluster) plus a global fallback into a sharded model directory"""
+    import json
+    from streaming_training import ChunkSource
+    from market_shards import train_shards
+    
+    clusters = None
+    if clusters_path:
+        with open(clusters_path) as f:
+            clusters = json.load(f)
+    
+    source = ChunkSource(data_path, num_samples=num_samples, location_multipliers=LOCATION_MULTIPLIERS,
+                         seed=seed, chunk_size=chunk_size)
+    index = train_shards(source, output_dir, FEATURE_COLUMNS, LOCATION_MULTIPLIERS, GROWTH_RATES,
+                         clusters=clusters, min_rows=min_rows, workers=workers, rounds=num_rounds, seed=seed,
+                         route_all=route_all, shard_depth=shard_depth)
+    print(f"✓ Sharded model saved to '{output_dir}' (version {index['checksum'][:12]}, "
+          f"{len(index['shards'])} shards, {index['training']['seconds']:.1f}s)")
+    return index
+
+def save_preprocessed_artifact(output_dir, booster, preprocessor, model_info):
+    """Save a booster trained on streaming_training.Preprocessor features as a model artifact"""
+    from model_artifact import save_artifact, read_manifest
+    
+    # Growth rates and multipliers of cities outside the built-in tables fall back at predict time
+    save_artifact(
+        output_dir,
+        booster,
+        scaler_mean=preprocessor.mean,
+        scaler_scale=preprocessor.scale,
+        location_classes=preprocessor.classes,
+        feature_columns=FEATURE_COLUMNS,
+        location_multipliers=LOCATION_MULTIPLIERS,
+        growth_rates=GROWTH_RATES,
+        model_info=model_info
+    )
+    print(f"✓ Model saved to '{output_dir}' (version {read_manifest(output_dir)['checksum'][:12]})")
+    return output_dir
+
+def save_model_artifact(model_data, directory=DEFAULT_ARTIFACT_DIR):
+    """Write a model.pkl-style dictionary as a versioned artifact directory"""
+    from model_artifact import save_artifact
+    
+    scaler = model_data['scaler']
+    save_artifact(
+        directory,
+        model_data['model'],
+        scaler_mean=scaler.mean_,
+        scaler_scale=scaler.scale_,
+        location_classes=model_data['label_encoders']['location'].classes_,
+        feature_columns=model_data.get('feature_columns', FEATURE_COLUMNS),
+        location_multipliers=model_data.get('location_multipliers', LOCATION_MULTIPLIERS),
+        growth_rates=model_data.get('growth_rates', GROWTH_RATES),
+        model_info=model_data.get('model_info'),
+        # Models with risk features carry the events they were trained with
+        extra_arrays=model_data['risk_index'].to_arrays() if model_data.get('risk_index') else None
+    )
+    return directory
+
+def write_training_data(output_path, num_samples, seed=42, chunk_size=1000000):
+    """Stream a synthetic dataset to an .ndjson or .parquet file one chunk at a time"""
+    from bulk_scoring import open_result_writer
+    from synthetic_data import iter_training_chunks
+    
+    writer = open_result_writer(output_path)
+    written = 0
+    try:
+        for chunk in iter_training_chunks(num_samples, LOCATION_MULTIPLIERS, seed=seed, chunk_size=chunk_size,
+                                          noise_range=(0.85, 1.15), price_floor=50000):
+            writer.write(chunk)
+            written += len(chunk)
+            print(f"Generated {written:,} / {num_samples:,} rows")
+    finally:
+        writer.close()
+    
+    print(f"✓ Training data written to '{output_path}'")
+    return written
+
+def export_model(model_path='model.pkl', output_dir=DEFAULT_ARTIFACT_DIR, check_samples=20000):
+    """Convert a legacy model.pkl into an artifact directory and check it against the pickled path"""
+    import numpy as np
+    from synthetic_data import generate_training_frame
+    from model_artifact import ModelArtifact
+    
+    with open(model_path, 'rb') as f:
+        model_data = pickle.load(f)
+    
+    save_model_artifact(model_data, output_dir)
+    print(f"✓ Model artifact saved to '{output_dir}'")
+    
+    # Compare both artifact engines against the pickled encoder + scaler + booster
+    sample = generate_training_frame(check_samples, model_data.get('location_multipliers', LOCATION_MULTIPLIERS), seed=7)
+    sample['location_encoded'] = model_data['label_encoders']['location'].transform(sample['location'])
+    feature_columns = model_data.get('feature_columns', FEATURE_COLUMNS)
+    expected = model_data['model'].predict(model_data['scaler'].transform(sample[feature_columns]))
+    
+    max_errors = {}
+    for engine in ('xgboost', 'numpy'):
+        actual = ModelArtifact(output_dir, engine=engine).predict(sample[feature_columns].to_numpy())
+        max_errors[engine] = float(np.max(np.abs(expected.astype(np.float64) - actual.astype(np.float64))))
+        print(f"Max absolute difference vs. pickled model ({engine}, {check_samples:,} rows): "
+              f"${max_errors[engine]:,.4f}")
+    return max_errors
+
+def precompute_table(model_dir=DEFAULT_ARTIFACT_DIR, output_dir=None, grid=None, error_samples=20000, seed=42):
+    """Evaluate a model artifact (or sharded model) over a grid into a valuation table directory.
+
+    output_dir defaults to the valuation_table directory inside the model, where
+    `predict.py --table` finds it. Returns the table manifest with its error report.
+    """
+    import os
+    from model_artifact import ModelArtifact
+    from market_shards import ShardedModel, is_sharded
+    from valuation_table import build_table, parse_grid, DEFAULT_TABLE_DIR, DEFAULT_MAX_REL_ERROR
+    
+    artifact = ShardedModel(model_dir) if is_sharded(model_dir) else ModelArtifact(model_dir)
+    output_dir = output_dir or os.path.join(model_dir, DEFAULT_TABLE_DIR)
+    manifest = build_table(artifact, output_dir, grid=parse_grid(grid), error_samples=error_samples, seed=seed)
+    print(f"✓ Valuation table saved to '{output_dir}' "
+          f"({manifest['bytes'] / 1e6:,.1f} MB in {manifest['seconds']:,.1f}s)")
+    
+    errors = manifest['errors']
+    print(f"Max absolute error vs. live model ({errors['samples']:,} random properties): "
+          f"${errors['maxAbsError']:,.2f} (mean ${errors['meanAbsError']:,.2f}, "
+          f"p99 ${errors['p99AbsError']:,.2f}, max relative {errors['maxRelError']:.4%})")
+    if errors['maxRelError'] > DEFAULT_MAX_REL_ERROR:
+        print(f"Interpolation error is above the {DEFAULT_MAX_REL_ERROR:.0%} tolerance: predict.py --table serves "
+              f"exact grid points only and asks the model in between (a finer --grid area step lowers the error)")
+    return manifest
+
+def main():
+    """Main function for command line usage"""
+    parser = argparse.ArgumentParser(prog='create_model.py', description='Create the pre-trained model')
+    parser.add_argument('--samples', type=int, default=50000, help='Synthetic training rows')
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the synthetic data')
+    commands = parser.add_subparsers(dest='command', metavar='<command>')
+    
+    create = commands.add_parser('create', help='Generate data, train and save the model (default)')
+    create.add_argument('--output', default=DEFAULT_ARTIFACT_DIR, help='Model artifact directory')
+    create.add_argument('--risk-events', default=None,
+                        help='GeoJSON or NDJSON environmental risk events; adds proximity risk features')
+    create.add_argument('--risk-radius-km', type=float, default=25.0,
+                        help='Radius within which risk events count for a property')
+    create.add_argument('--cache-dir', default=DEFAULT_CACHE_DIR,
+                        help='Directory of cached data, encoding, split and DMatrix stages')
+    create.add_argument('--cache-budget-mb', type=float, default=DEFAULT_BUDGET_MB,
+                        help='Disk budget of the stage cache; least recently used stages are evicted')
+    create.add_argument('--no-cache', action='store_true', help='Recompute every stage and store nothing')
+    
+    generate = commands.add_parser('generate', help='Write a synthetic training dataset to a file')
+    generate.add_argument('--output', required=True, help='Output .ndjson or .parquet file')
+    generate.add_argument('--chunk-size', type=int, default=1000000, help='Rows generated at a time')
+    
+    train = commands.add_parser('train', help='Train out of core from chunks, without loading all data into memory')
+    train.add_argument('--data', default=None,
+                       help='Training data (.csv, .ndjson/.jsonl or .parquet with a price column); '
+                            'default: --samples synthetic rows')
+    train.add_argument('--output', default=DEFAULT_ARTIFACT_DIR, help='Model artifact directory')
+    train.add_argument('--chunk-size', type=int, default=1000000, help='Rows read and preprocessed at a time')
+    train.add_argument('--nthread', type=int, default=None, help='xgboost threads (default: all cores)')
+    train.add_argument('--rounds', type=int, default=200, help='Boosting rounds')
+    train.add_argument('--max-bin', type=int, default=256, help='Histogram bins per feature')
+    train.add_argument('--external-memory', action='store_true',
+                       help='Page the quantized matrix to disk instead of keeping it in memory')
+    
+    tune = commands.add_parser('tune', help='Search hyperparameters on one cached training matrix and rank them')
+    tune.add_argument('--data', default=None,
+                      help='Training data (.csv, .ndjson/.jsonl or .parquet with a price column); '
+                           'default: --samples synthetic rows')
+    tune.add_argument('--trials', type=int, default=20,
+                      help='Parameter sets to try (the first is the current one)')
+    tune.add_argument('--workers', type=int, default=None, help='Trials run at once (default: half the cores)')
+    tune.add_argument('--threads', type=int, default=None,
+                      help='xgboost threads per trial (default: cores / workers)')
+    tune.add_argument('--rounds', type=int, default=1000, help='Maximum boosting rounds per trial')
+    tune.add_argument('--early-stopping', type=int, default=30,
+                      help='Stop a trial after this many rounds without validation improvement')
+    tune.add_argument('--max-bin', type=int, default=256, help='Histogram bins per feature')
+    tune.add_argument('--latency-weight', type=float, default=0.1,
+                      help='Objective penalty: MAE grows by this fraction per millisecond of predict latency')
+    tune.add_argument('--max-latency-ms', type=float, default=None,
+                      help='Rank trials slower than this (p50, single row) after all others')
+    tune.add_argument('--no-prune', action='store_true', help='Let every trial run to early stopping')
+    tune.add_argument('--chunk-size', type=int, default=1000000, help='Rows read and preprocessed at a time')
+    tune.add_argument('--leaderboard', default='tuning_leaderboard.json', help='Leaderboard JSON file')
+    tune.add_argument('--export', default=None, metavar='DIR', help='Save the winning model as an artifact here')
+    
+    shards = commands.add_parser('shards', help='Train one model per market plus a global fallback, in parallel')
+    shards.add_argument('--data', default=None,
+                        help='Training data (.csv, .ndjson/.jsonl or .parquet with a price column); '
+                             'default: --samples synthetic rows')
+    shards.add_argument('--output', default='model_shards', help='Sharded model directory')
+    shards.add_argument('--clusters', default=None,
+                        help='JSON file mapping a cluster name to its markets (default: one shard per market)')
+    shards.add_argument('--min-rows', type=int, default=1000,
+                        help='Markets with fewer training rows are served by the global model')
+    shards.add_argument('--workers', type=int, default=None, help='Shards trained at once (default: all cores)')
+    shards.add_argument('--rounds', type=int, default=200, help='Boosting rounds per shard')
+    shards.add_argument('--shard-depth', type=int, default=6, help='Maximum tree depth of the market shards')
+    shards.add_argument('--chunk-size', type=int, default=1000000, help='Rows read at a time')
+    shards.add_argument('--route-all', action='store_true',
+                        help='Route every market to its shard, even where the global model scores better')
+    
+    export = commands.add_parser('export', help='Convert a pickled model.pkl into a model artifact directory')
+    export.add_argument('--model', default='model.pkl', help='Pickled model to export')
+    export.add_argument('--output', default=DEFAULT_ARTIFACT_DIR, help='Model artifact directory')
+    
+    precompute = commands.add_parser('precompute',
+                                     help='Tabulate a model over a grid of inputs for constant-time lookups')
+    precompute.add_argument('--model', default=DEFAULT_ARTIFACT_DIR, help='Model artifact or sharded model directory')
+    precompute.add_argument('--output', default=None,
+                            help='Table directory (default: valuation_table inside the model directory)')
+    precompute.add_argument('--grid', default=None,
+                            help='Axis overrides as name=start:stop[:step], comma separated '
+                                 '(default: floors=1:10,area=500:10000:250,bedrooms=1:8,bathrooms=1:6,age=0:100)')
+    precompute.add_argument('--error-samples', type=int, default=20000,
+                            help='Random properties compared against the live model')
+    
+    args = parser.parse_args()
+    
+    if args.command == 'export':
+        export_model(args.model, args.output)
+    elif args.command == 'train':
+        train_streaming_model(args.data, num_samples=args.samples, seed=args.seed, output_dir=args.output,
+                              chunk_size=args.chunk_size, nthread=args.nthread, num_rounds=args.rounds,
+                              max_bin=args.max_bin, external_memory=args.external_memory)
+    elif args.command == 'tune':
+        tune_model(args.data, num_samples=args.samples, seed=args.seed, chunk_size=args.chunk_size,
+                   trials=args.trials, workers=args.workers, threads_per_trial=args.threads, rounds=args.rounds,
+                   early_stopping_rounds=args.early_stopping, max_bin=args.max_bin,
+                   latency_weight=args.latency_weight, max_latency_ms=args.max_latency_ms,
+                   prune=not args.no_prune, leaderboard_path=args.leaderboard, export_dir=args.export)
+    elif args.command == 'shards':
+        train_market_shards(args.data, num_samples=args.samples, seed=args.seed, output_dir=args.output,
+                            clusters_path=args.clusters, min_rows=args.min_rows, workers=args.workers,
+                            num_rounds=args.rounds, chunk_size=args.chunk_size, route_all=args.route_all,
+                            shard_depth=args.shard_depth)
+    elif args.command == 'precompute':
+        precompute_table(args.model, args.output, grid=args.grid, error_samples=args.error_samples, seed=args.seed)
+    elif args.command == 'generate':
+        write_training_data(args.output, args.samples, seed=args.seed, chunk_size=args.chunk_size)
+    else:
+        create_pretrained_model(num_samples=args.samples, seed=args.seed,
+                                output_dir=getattr(args, 'output', DEFAULT_ARTIFACT_DIR),
+                                risk_events=getattr(args, 'risk_events', None),
+                                risk_radius_km=getattr(args, 'risk_radius_km', 25.0),
+                                cache_dir=None if getattr(args, 'no_cache', False)
+                                else getattr(args, 'cache_dir', DEFAULT_CACHE_DIR),
+                                cache_budget_mb=getattr(args, 'cache_budget_mb', DEFAULT_BUDGET_MB))
+
 if __name__ == "__main__":
-    create_pretrained_model()
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Prediction explanations
+Turns the booster's per-feature contributions (pred_contribs) into per-factor impacts for a whole
+batch at once, in the multiplier-like form the factors of a prediction report
+"""
+
+import threading
+import numpy as np
+
+EXPLANATION_BASELINES = ('average', 'location')
+
+
+class ContributionExplainer:
+    """Factor impacts from per-feature contributions.
+
+    contributions(features) returns, for raw feature rows, a (rows, features + 1) array of
+    per-feature contributions with the bias (the expected price) in the last column, like
+    ModelArtifact.contributions. The contributions of a row add up to its predicted price, so
+    a factor's impact 1 + contribution / bias is the price relative to an average property
+    without that factor's effect: above 1 the factor raises the price, below 1 it lowers it.
+
+    With baseline='location' the comparison is against a typical property (reference, the
+    training means) in the same market: each factor's impact is 1 + (contribution - the
+    reference's contribution) / the reference's price, and the Location factor reports the
+    market's own premium. Reference contributions are computed once per location, for every
+    new location of a batch in one call, and cached.
+    """
+
+    def __init__(self, contributions, feature_columns, factor_features, reference, baseline='average',
+                 location_column='location_encoded', max_locations=4096):
+        if baseline not in EXPLANATION_BASELINES:
+            raise ValueError(f"Unknown explanation baseline: {baseline}")
+        self.contributions = contributions
+        self.baseline = baseline
+        self.reference = np.asarray(reference, dtype=np.float64)
+        self.max_locations = max_locations
+        feature_columns = list(feature_columns)
+        self._columns = np.array([feature_columns.index(feature) for feature in factor_features])
+        self._location_column = feature_columns.index(location_column)
+        self._location_factor = list(factor_features).index(location_column)
+        self._baselines = {}
+        self._lock = threading.Lock()
+        self.baseline_hits = 0
+        self.baseline_misses = 0
+
+    def location_baselines(self, codes):
+        """Reference contributions (rows, features + 1) for an array of location codes"""
+        codes = np.asarray(codes, dtype=np.int64)
+        distinct, inverse = np.unique(codes, return_inverse=True)
+        with self._lock:
+            missing = [code for code in distinct.tolist() if code not in self._baselines]
+            self.baseline_misses += len(missing)
+            self.baseline_hits += len(distinct) - len(missing)
+        if missing:
+            rows = np.tile(self.reference, (len(missing), 1))
+            rows[:, self._location_column] = missing
+            computed = np.asarray(self.contributions(rows), dtype=np.float64)
+            with self._lock:
+                if len(self._baselines) + len(missing) > self.max_locations:
+                    self._baselines.clear()
+                self._baselines.update(zip(missing, computed))
+        with self._lock:
+            table = np.stack([self._baselines.get(code) for code in distinct.tolist()])
+        return table[inverse]
+
+    def impacts(self, features):
+        """(rows, factors) impacts, rounded to 2 decimals, for raw feature rows"""
+        features = np.atleast_2d(features)
+        if len(features) == 1:
+            return self._impacts(features)
+        # Repeated properties (common in portfolios) are explained once
+        distinct, inverse = np.unique(features, axis=0, return_inverse=True)
+        return self._impacts(distinct)[inverse.reshape(-1)]
+
+    def _impacts(self, features):
+        contributions = np.asarray(self.contributions(features), dtype=np.float64)
+        bias = contributions[:, -1:]
+        if self.baseline == 'average':
+            impacts = 1 + contributions[:, self._columns] / bias
+        else:
+            reference = self.location_baselines(features[:, self._location_column])
+            reference_price = reference.sum(axis=1, keepdims=True)
+            impacts = 1 + (contributions[:, self._columns] - reference[:, self._columns]) / reference_price
+            impacts[:, self._location_factor] = (
+                1 + reference[:, self._columns[self._location_factor]] / reference[:, -1]
+            )
+        return np.round(np.maximum(impacts, 0.0), 2)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'baseline': self.baseline,
+                'locations': len(self._baselines),
+                'baselineHits': self.baseline_hits,
+                'baselineMisses': self.baseline_misses
+            }
+
+
+def top_factor_order(impacts, top_k=None):
+    """Column order per row, strongest factor (impact furthest from 1) first, cut to top_k"""
+    order = np.argsort(-np.abs(np.asarray(impacts, dtype=np.float64) - 1), axis=1, kind='stable')
+    return order[:, :top_k] if top_k else order
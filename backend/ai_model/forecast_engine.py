@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Monte Carlo forecast engine
+Simulates thousands of growth paths per property with numpy and reports percentile bands per year
+"""
+
+from datetime import datetime
+import numpy as np
+
+DEFAULT_PERCENTILES = (10, 50, 90)
+
+
+class ForecastEngine:
+    """Vectorized, seeded Monte Carlo price forecasts for whole portfolios.
+
+    Every simulated year multiplies the price by exp(r) with r ~ Normal(log(1 + growth), volatility),
+    so the median path follows the location's growth rate. All properties draw from one numpy
+    Generator in portfolio order, which makes results reproducible for a seed and independent of
+    how the portfolio is chunked. Each chunk holds at most max_cells simulated values.
+    """
+
+    def __init__(self, growth_rates, default_growth=0.03, volatility=0.03, paths=2000, seed=42,
+                 max_cells=5000000):
+        self.growth_rates = dict(growth_rates)
+        self.default_growth = default_growth
+        self.volatility = float(volatility)
+        self.paths = max(1, int(paths))
+        self.seed = seed
+        self.max_cells = max(1, int(max_cells))
+
+    def growth(self, locations):
+        """Annual growth rate per location, unknown locations get default_growth"""
+        return np.array([self.growth_rates.get(location, self.default_growth) for location in locations],
+                        dtype=np.float64)
+
+    def iter_bands(self, prices, locations, years=10, percentiles=DEFAULT_PERCENTILES):
+        """Yield (start, stop, bands) per chunk; bands maps 'p10' etc. to (rows, years) price arrays"""
+        prices = np.asarray(prices, dtype=np.float64)
+        locations = list(locations)
+        if len(prices) != len(locations):
+            raise ValueError('prices and locations must have the same length')
+        years = max(0, int(years))
+        if not years:
+            # Nothing to simulate: every property gets empty bands, and generate_forecast an empty list
+            if len(prices):
+                yield 0, len(prices), {f'p{p:g}': np.empty((len(prices), 0)) for p in percentiles}
+            return
+
+        rng = np.random.default_rng(self.seed)
+        chunk_rows = max(1, self.max_cells // (self.paths * years))
+        for start in range(0, len(prices), chunk_rows):
+            stop = min(start + chunk_rows, len(prices))
+            drift = np.log1p(self.growth(locations[start:stop]))
+
+            # (rows, years, paths) yearly log returns in float32, accumulated along the years axis;
+            # paths stay the contiguous axis so the percentile selection reads memory in order
+            returns = rng.standard_normal((stop - start, years, self.paths), dtype=np.float32)
+            returns *= np.float32(self.volatility)
+            returns += drift[:, None, None].astype(np.float32)
+            np.cumsum(returns, axis=1, out=returns)
+
+            # exp is monotonic, so percentiles of log growth map straight to price percentiles
+            quantiles = np.percentile(returns, percentiles, axis=2)
+            current = prices[start:stop, None]
+            bands = {
+                f'p{p:g}': current * np.exp(quantile.astype(np.float64)) for p, quantile in zip(percentiles, quantiles)
+            }
+            yield start, stop, bands
+
+    def simulate(self, prices, locations, years=10, percentiles=DEFAULT_PERCENTILES):
+        """Percentile bands for a whole portfolio as (properties, years) arrays"""
+        chunks = list(self.iter_bands(prices, locations, years, percentiles))
+        years = max(0, int(years))
+        if not chunks:
+            return {f'p{p:g}': np.empty((0, years)) for p in percentiles}
+        return {name: np.concatenate([bands[name] for _, _, bands in chunks]) for name in chunks[0][2]}
+
+    @staticmethod
+    def to_records(current_price, bands, row=0):
+        """One property's bands in the generate_forecast shape: year, price (p50), growth, confidence, low/high"""
+        this_year = datetime.now().year
+        records = []
+        for year, median in enumerate(bands['p50'][row], start=1):
+            records.append({
+                'year': this_year + year,
+                'price': int(median),
+                'growth': round((median / current_price - 1) * 100, 1) if current_price else 0.0,
+                # Decreasing confidence over time
+                'confidence': max(60, 100 - year * 3),
+                'low': int(bands['p10'][row][year - 1]),
+                'high': int(bands['p90'][row][year - 1])
+            })
+        return records
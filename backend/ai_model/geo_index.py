@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Spatial market lookup
+Resolves latitude/longitude to the nearest market (centroid radius or polygon) with a KD-tree over
+unit-sphere coordinates, vectorized for batches
+"""
+
+import os
+import json
+import math
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_MARKETS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'markets.json')
+
+
+def unit_vectors(lat, lng):
+    """(n, 3) points on the unit sphere for latitude/longitude arrays in degrees"""
+    lat = np.radians(np.asarray(lat, dtype=np.float64))
+    lng = np.radians(np.asarray(lng, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.column_stack([cos_lat * np.cos(lng), cos_lat * np.sin(lng), np.sin(lat)])
+
+
+def chord_length(distance_km):
+    """Straight-line distance through the unit sphere for a great-circle distance"""
+    return 2 * np.sin(np.minimum(np.asarray(distance_km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi) / 2)
+
+
+def great_circle_km(chord):
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord, dtype=np.float64) / 2, 0, 1))
+
+
+def points_in_polygon(lat, lng, polygon):
+    """Even-odd rule over a (vertices, 2) array of [lat, lng]; fine for city-sized polygons"""
+    inside = np.zeros(len(lat), dtype=bool)
+    vertex_lat, vertex_lng = polygon[:, 0], polygon[:, 1]
+    previous = len(polygon) - 1
+    for current in range(len(polygon)):
+        lat_a, lng_a = vertex_lat[current], vertex_lng[current]
+        lat_b, lng_b = vertex_lat[previous], vertex_lng[previous]
+        crosses = (lat_a > lat) != (lat_b > lat)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            edge_lng = lng_a + (lat - lat_a) * (lng_b - lng_a) / (lat_b - lat_a)
+        inside ^= crosses & (lng < edge_lng)
+        previous = current
+    return inside
+
+
+class GeoIndex:
+    """Nearest-market lookup over market centroids.
+
+    A market without a polygon claims points within its radius_km of the centroid; a market
+    with a polygon claims the points inside it. The candidates nearest centroids are checked in
+    order of distance, so overlapping markets resolve to the closest one that claims the point.
+    Points no market claims resolve to -1 / None.
+    """
+
+    def __init__(self, markets, default_radius_km=80.0, candidates=4):
+        from scipy.spatial import cKDTree
+
+        if not markets:
+            raise ValueError('GeoIndex needs at least one market')
+        self.names = np.array([str(market['name']) for market in markets], dtype=object)
+        self.lat = lat = np.array([market['lat'] for market in markets], dtype=np.float64)
+        self.lng = lng = np.array([market['lng'] for market in markets], dtype=np.float64)
+        self.multipliers = np.array([market.get('multiplier', np.nan) for market in markets], dtype=np.float64)
+        self.growth_rates = np.array([market.get('growth_rate', np.nan) for market in markets], dtype=np.float64)
+        self.radius_km = np.array([market.get('radius_km', default_radius_km) for market in markets],
+                                  dtype=np.float64)
+
+        self.polygons = {}
+        for position, market in enumerate(markets):
+            if market.get('polygon'):
+                polygon = np.asarray(market['polygon'], dtype=np.float64)
+                self.polygons[position] = polygon
+                # The search radius has to reach the polygon's farthest vertex
+                vertex_chord = np.linalg.norm(unit_vectors(polygon[:, 0], polygon[:, 1]) -
+                                              unit_vectors(lat[position], lng[position]), axis=1)
+                self.radius_km[position] = max(self.radius_km[position], great_circle_km(vertex_chord.max()))
+        self.has_polygon = np.zeros(len(markets), dtype=bool)
+        self.has_polygon[list(self.polygons)] = True
+
+        self.codes = {name: position for position, name in enumerate(self.names)}
+        self.candidates = max(1, min(int(candidates), len(markets)))
+        self._max_chord = float(chord_length(self.radius_km.max()))
+        self._tree = cKDTree(unit_vectors(lat, lng))
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_MARKETS_FILE, candidates=4):
+        """Load markets from a JSON file: {"default_radius_km": 80, "markets": [{"name", "lat", "lng", ...}]}"""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(data['markets'], default_radius_km=data.get('default_radius_km', 80.0), candidates=candidates)
+
+    def __len__(self):
+        return len(self.names)
+
+    def resolve(self, lat, lng):
+        """Market index (-1 when unclaimed) and great-circle distance in km for every point"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        markets = np.full(len(lat), -1, dtype=np.int64)
+        distances = np.full(len(lat), np.nan)
+        valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lng) & (np.abs(lat) <= 90))
+        if not len(valid):
+            return markets, distances
+
+        chords, neighbours = self._tree.query(unit_vectors(lat[valid], lng[valid]), k=self.candidates,
+                                              distance_upper_bound=self._max_chord)
+        chords, neighbours = chords.reshape(len(valid), -1), neighbours.reshape(len(valid), -1)
+        unresolved = np.ones(len(valid), dtype=bool)
+        for rank in range(neighbours.shape[1]):
+            # Missing neighbours come back as index len(self) with an infinite distance
+            found = unresolved & (neighbours[:, rank] < len(self))
+            if not found.any():
+                break
+            candidate = np.where(found, neighbours[:, rank], 0)
+            distance = great_circle_km(np.where(found, chords[:, rank], 0))
+            claimed = found & ~self.has_polygon[candidate] & (distance <= self.radius_km[candidate])
+            for position in np.unique(candidate[found & self.has_polygon[candidate]]):
+                rows = np.flatnonzero(found & (candidate == position))
+                claimed[rows] = points_in_polygon(lat[valid[rows]], lng[valid[rows]], self.polygons[position])
+            markets[valid[claimed]] = candidate[claimed]
+            distances[valid[claimed]] = distance[claimed]
+            unresolved &= ~claimed
+        return markets, distances
+
+    def resolve_point(self, lat, lng):
+        """resolve() for one point without the array overhead; returns (market index or -1, km)"""
+        lat, lng = float(lat), float(lng)
+        if not (math.isfinite(lat) and math.isfinite(lng) and abs(lat) <= 90):
+            return -1, math.nan
+        phi, lam = math.radians(lat), math.radians(lng)
+        point = (math.cos(phi) * math.cos(lam), math.cos(phi) * math.sin(lam), math.sin(phi))
+        chords, neighbours = self._tree.query(point, k=self.candidates, distance_upper_bound=self._max_chord)
+        for chord, position in zip(np.atleast_1d(chords).tolist(), np.atleast_1d(neighbours).tolist()):
+            if position >= len(self):
+                break
+            distance = 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+            if self.has_polygon[position]:
+                claimed = points_in_polygon(np.array([lat]), np.array([lng]), self.polygons[position])[0]
+            else:
+                claimed = distance <= self.radius_km[position]
+            if claimed:
+                return position, distance
+        return -1, math.nan
+
+    def locations(self, lat, lng):
+        """Market name per point, None where no market claims it"""
+        markets, _ = self.resolve(lat, lng)
+        names = self.names[np.maximum(markets, 0)]
+        names[markets < 0] = None
+        return names
+
+    def lookup(self, lat, lng):
+        """One point's market, multiplier, growth rate and distance, or None"""
+        position, distance = self.resolve_point(lat, lng)
+        if position < 0:
+            return None
+        return {
+            'location': self.names[position],
+            'distanceKm': round(distance, 3),
+            'multiplier': None if np.isnan(self.multipliers[position]) else float(self.multipliers[position]),
+            'growthRate': None if np.isnan(self.growth_rates[position]) else float(self.growth_rates[position])
+        }
+
+    def centroids(self, names):
+        """(lat, lng) arrays of the named markets' centroids, NaN for names not in the index"""
+        positions = np.array([self.codes.get(name, -1) for name in names], dtype=np.int64)
+        known = positions >= 0
+        lat = np.where(known, self.lat[np.maximum(positions, 0)], np.nan)
+        lng = np.where(known, self.lng[np.maximum(positions, 0)], np.nan)
+        return lat, lng
+
+    def market_tables(self):
+        """(multipliers, growth rates) dicts for the markets that define them"""
+        multipliers = {name: float(value) for name, value in zip(self.names, self.multipliers) if not np.isnan(value)}
+        growth = {name: float(value) for name, value in zip(self.names, self.growth_rates) if not np.isnan(value)}
+        return multipliers, growth
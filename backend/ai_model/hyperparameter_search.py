@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Hyperparameter search
+Runs xgboost training trials concurrently against one cached quantized training matrix, with early
+stopping, median pruning and a leaderboard that ranks held-out accuracy together with online predict latency
+"""
+
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from streaming_training import TRAINING_PARAMS, Preprocessor, training_iter
+
+# ('choice', values), ('uniform', low, high) or ('log', low, high) per xgboost parameter
+SEARCH_SPACE = {
+    'max_depth': ('choice', [4, 6, 8, 10]),
+    'eta': ('log', 0.03, 0.3),
+    'subsample': ('uniform', 0.6, 1.0),
+    'colsample_bytree': ('uniform', 0.6, 1.0),
+    'min_child_weight': ('log', 1, 20),
+    'lambda': ('log', 0.1, 10)
+}
+
+
+def sample_params(rng, space=SEARCH_SPACE):
+    """Draw one parameter set from the search space"""
+    params = {}
+    for name, (kind, *spec) in space.items():
+        if kind == 'choice':
+            params[name] = spec[0][int(rng.integers(len(spec[0])))]
+        elif kind == 'log':
+            params[name] = round(float(np.exp(rng.uniform(np.log(spec[0]), np.log(spec[1])))), 4)
+        elif kind == 'uniform':
+            params[name] = round(float(rng.uniform(spec[0], spec[1])), 4)
+        else:
+            raise ValueError(f"Unknown search space kind for {name}: {kind}")
+    return params
+
+
+class MedianPruner:
+    """Stops a trial whose validation MAE at a checkpoint round is worse than the median of the
+    completed trials at that round.
+
+    Checkpoints are every interval rounds from warmup_rounds on; nothing is pruned until
+    min_trials trials have reported at the checkpoint. A trial's values only count once
+    complete() is called for it, so concurrently running trials never see each other and the
+    decisions do not depend on which thread happens to finish first.
+    """
+
+    def __init__(self, warmup_rounds=50, interval=25, min_trials=3):
+        self.warmup_rounds = warmup_rounds
+        self.interval = max(1, interval)
+        self.min_trials = min_trials
+        self._history = {}
+        self._pending = {}
+        self._lock = threading.Lock()
+
+    def should_prune(self, trial, rounds, value):
+        if rounds < self.warmup_rounds or (rounds - self.warmup_rounds) % self.interval:
+            return False
+        with self._lock:
+            seen = self._history.get(rounds, [])
+            prune = len(seen) >= self.min_trials and value > float(np.median(seen))
+            self._pending.setdefault(trial, []).append((rounds, value))
+        return prune
+
+    def complete(self, trials):
+        """Add the checkpoint values of finished trials to the history, in trial order"""
+        with self._lock:
+            for trial in sorted(trials):
+                for rounds, value in self._pending.pop(trial, []):
+                    self._history.setdefault(rounds, []).append(value)
+
+
+def _pruning_callback(xgb, pruner, trial):
+    """xgboost callback that reports the validation MAE to the pruner after every round"""
+
+    class Pruning(xgb.callback.TrainingCallback):
+        def __init__(self):
+            self.pruned = False
+            self.last_mae = None
+            super().__init__()
+
+        def after_iteration(self, model, epoch, evals_log):
+            self.last_mae = evals_log['validation']['mae'][-1]
+            if pruner is not None and pruner.should_prune(trial, epoch + 1, self.last_mae):
+                self.pruned = True
+            return self.pruned
+
+    return Pruning()
+
+
+def predict_latency(booster, rows, repeats=200):
+    """Median and 99th percentile single-row inplace_predict latency in microseconds (one thread)"""
+    booster.set_param({'nthread': 1})
+    for row in range(min(10, len(rows))):
+        booster.inplace_predict(rows[row:row + 1])
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        row = i % len(rows)
+        started = time.perf_counter()
+        booster.inplace_predict(rows[row:row + 1])
+        timings[i] = time.perf_counter() - started
+    return round(float(np.percentile(timings, 50)) * 1e6, 1), round(float(np.percentile(timings, 99)) * 1e6, 1)
+
+
+def _metrics(actual, predicted):
+    actual = actual.astype(np.float64)
+    predicted = predicted.astype(np.float64)
+    total = np.square(actual - actual.mean()).sum()
+    r2 = float(1 - np.square(actual - predicted).sum() / total) if total else None
+    return float(np.abs(actual - predicted).mean()), r2
+
+
+class HyperparameterSearch:
+    """Random search over SEARCH_SPACE on a ChunkSource.
+
+    The training rows are quantized into one QuantileDMatrix up front and every trial trains on
+    it, so the data is read and binned once. Trials run on a thread pool (xgboost releases the GIL
+    while training, and threads can share the matrix) with threads_per_trial xgboost threads each,
+    in waves of workers trials; the pruner only compares against trials of earlier waves, so the
+    same seed prunes the same trials. Trial 0 is always the current TRAINING_PARAMS, so the
+    leaderboard shows whether tuning helps.
+
+    The source's test rows are split in two: a validation set for early stopping and pruning,
+    and a holdout_share part the trials never see, which scores the leaderboard. Completed trials
+    are ranked by objective = holdout MAE * (1 + latency_weight * p50 latency in ms); trials slower
+    than max_latency_ms rank after every trial within the budget.
+    """
+
+    def __init__(self, source, trials=20, workers=None, threads_per_trial=None, rounds=1000,
+                 early_stopping_rounds=30, max_bin=256, latency_weight=0.1, max_latency_ms=None,
+                 prune=True, seed=42, space=SEARCH_SPACE, holdout_share=0.5):
+        cores = os.cpu_count() or 1
+        self.source = source
+        self.trials = max(1, int(trials))
+        self.workers = max(1, min(self.trials, workers or max(1, cores // 2)))
+        self.threads_per_trial = threads_per_trial or max(1, cores // self.workers)
+        self.rounds = rounds
+        self.early_stopping_rounds = early_stopping_rounds
+        self.max_bin = max_bin
+        self.latency_weight = latency_weight
+        self.max_latency_ms = max_latency_ms
+        self.pruner = MedianPruner() if prune else None
+        self.seed = seed
+        self.space = space
+        self.holdout_share = holdout_share
+        self.preprocessor = None
+        self.stats = {}
+        self._train = None
+        self._validation = None
+        self._holdout_features = None
+        self._holdout_labels = None
+
+    def prepare(self):
+        """Fit the scaler and build the cached training and validation matrices plus the holdout"""
+        import xgboost as xgb
+
+        started = time.perf_counter()
+        self.preprocessor = Preprocessor()
+        held_out = []
+        for chunk, test in self.source.chunks():
+            self.preprocessor.partial_fit(chunk)
+            held_out.append(chunk[test])
+        self.preprocessor.finish()
+
+        features = np.concatenate([self.preprocessor.features(chunk) for chunk in held_out])
+        labels = np.concatenate([chunk['price'].to_numpy(dtype=np.float32) for chunk in held_out])
+        holdout = np.random.default_rng(self.seed + 2).random(len(labels)) < self.holdout_share
+        if holdout.all() or not holdout.any():
+            raise ValueError('Need both validation and holdout rows, increase the validation share')
+        self._holdout_features, self._holdout_labels = features[holdout], labels[holdout]
+
+        self._train = xgb.QuantileDMatrix(training_iter(xgb, self.source, self.preprocessor), max_bin=self.max_bin)
+        self._validation = xgb.QuantileDMatrix(features[~holdout], label=labels[~holdout],
+                                               ref=self._train, max_bin=self.max_bin)
+        self.stats.update({
+            'rows': self.preprocessor.rows,
+            'trainRows': self._train.num_row(),
+            'validationRows': int((~holdout).sum()),
+            'holdoutRows': int(holdout.sum()),
+            'matrixSeconds': round(time.perf_counter() - started, 3)
+        })
+        print(f"Built training matrix once: {self._train.num_row():,} training / "
+              f"{self.stats['validationRows']:,} validation / {self.stats['holdoutRows']:,} holdout rows")
+
+    def candidates(self):
+        rng = np.random.default_rng(self.seed)
+        baseline = {name: TRAINING_PARAMS[name] for name in self.space if name in TRAINING_PARAMS}
+        return [baseline] + [sample_params(rng, self.space) for _ in range(self.trials - 1)]
+
+    def run_trial(self, trial, params):
+        """Train one trial; returns (leaderboard entry, booster cut at its best iteration or None)"""
+        import xgboost as xgb
+
+        train_params = dict(TRAINING_PARAMS, **params)
+        train_params.update({'max_bin': self.max_bin, 'nthread': self.threads_per_trial, 'eval_metric': 'mae',
+                             'seed': self.seed + trial})
+        pruning = _pruning_callback(xgb, self.pruner, trial)
+        entry = {'trial': trial, 'params': params}
+
+        started = time.perf_counter()
+        try:
+            booster = xgb.train(train_params, self._train, num_boost_round=self.rounds,
+                                evals=[(self._validation, 'validation')],
+                                early_stopping_rounds=self.early_stopping_rounds,
+                                verbose_eval=False, callbacks=[pruning])
+        except xgb.core.XGBoostError as e:
+            entry.update({'status': 'failed', 'error': str(e)})
+            return entry, None
+        entry['trainSeconds'] = round(time.perf_counter() - started, 3)
+
+        if pruning.pruned:
+            entry.update({'status': 'pruned', 'rounds': booster.num_boosted_rounds(),
+                          'validationMae': round(pruning.last_mae, 2)})
+            return entry, None
+
+        # Keep only the trees up to the best round, so the export and its flattened arrays match the score
+        validation_mae = float(booster.best_score)
+        booster = booster[:booster.best_iteration + 1]
+        # Ranked on the holdout, which neither early stopping nor pruning has looked at
+        mae, r2 = _metrics(self._holdout_labels, booster.inplace_predict(self._holdout_features))
+        entry.update({'status': 'complete', 'rounds': booster.num_boosted_rounds(), 'mae': round(mae, 2),
+                      'r2': round(r2, 6) if r2 is not None else None, 'validationMae': round(validation_mae, 2)})
+        return entry, booster
+
+    def objective(self, entry):
+        return entry['mae'] * (1 + self.latency_weight * entry['latencyP50Us'] / 1000)
+
+    def run(self):
+        """Run every trial; returns (leaderboard sorted best first, winning booster or None)"""
+        if self._train is None:
+            self.prepare()
+        candidates = self.candidates()
+        print(f"Running {len(candidates)} trials on {self.workers} workers x {self.threads_per_trial} threads...")
+
+        started = time.perf_counter()
+        entries, boosters = [], {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for first in range(0, len(candidates), self.workers):
+                wave = range(first, min(first + self.workers, len(candidates)))
+                futures = [pool.submit(self.run_trial, trial, candidates[trial]) for trial in wave]
+                for future in futures:
+                    entry, booster = future.result()
+                    entries.append(entry)
+                    if booster is not None:
+                        boosters[entry['trial']] = booster
+                    if 'mae' in entry:
+                        detail = f"holdout MAE ${entry['mae']:,.0f} after {entry['rounds']} rounds"
+                    elif 'validationMae' in entry:
+                        detail = f"validation MAE ${entry['validationMae']:,.0f} after {entry['rounds']} rounds"
+                    else:
+                        detail = entry['error']
+                    print(f"Trial {entry['trial']:>3}: {entry['status']:<8} {detail}")
+                if self.pruner is not None:
+                    self.pruner.complete(wave)
+        self.stats['searchSeconds'] = round(time.perf_counter() - started, 3)
+
+        # Latency is timed after the pool is idle, one trial at a time, so trials do not slow each other down
+        for entry in entries:
+            if entry['trial'] in boosters:
+                entry['latencyP50Us'], entry['latencyP99Us'] = predict_latency(
+                    boosters[entry['trial']], self._holdout_features
+                )
+                entry['objective'] = round(self.objective(entry), 2)
+                entry['withinLatencyBudget'] = (self.max_latency_ms is None or
+                                                entry['latencyP50Us'] <= self.max_latency_ms * 1000)
+
+        def rank(entry):
+            if entry['status'] != 'complete':
+                return (2, entry.get('validationMae') or float('inf'))
+            return (0 if entry['withinLatencyBudget'] else 1, entry['objective'])
+
+        leaderboard = sorted(entries, key=rank)
+        winner = leaderboard[0] if leaderboard[0]['status'] == 'complete' else None
+        self.stats.update({
+            'trials': len(entries),
+            'completed': len(boosters),
+            'pruned': sum(entry['status'] == 'pruned' for entry in entries),
+            'failed': sum(entry['status'] == 'failed' for entry in entries),
+            'workers': self.workers,
+            'threadsPerTrial': self.threads_per_trial,
+            'winner': winner['trial'] if winner else None
+        })
+        return leaderboard, boosters.get(winner['trial']) if winner else None
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Per-market model shards
+Trains one small model per market (or market cluster) plus a global fallback in parallel, and
+routes inference rows to their shard with lazily loaded, memory-capped shard models
+"""
+
+import os
+import re
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import numpy as np
+
+from compiled_model import FeatureEncoder
+from model_artifact import ModelArtifact, ArtifactError, save_artifact, read_manifest
+
+SHARD_FORMAT = 'earthslight-shards'
+SHARD_SCHEMA_VERSION = 1
+SHARD_INDEX = 'shards.json'
+GLOBAL_SHARD = 'global'
+# Test-set flag stored alongside the rows of a shard partition
+TEST_COLUMN = '__test__'
+
+
+def is_sharded(path):
+    return os.path.isfile(os.path.join(path, SHARD_INDEX))
+
+
+def shard_name(market):
+    """Directory name of a market or cluster shard"""
+    return 'shard-' + (re.sub(r'[^a-z0-9]+', '-', str(market).lower()).strip('-') or 'unnamed')
+
+
+class _ShardSource:
+    """Re-iterable (chunk, test mask) pairs of one shard: its partition files, or the whole
+    ChunkSource for the global model"""
+
+    def __init__(self, job):
+        self.job = job
+
+    def chunks(self):
+        import pandas as pd
+        if self.job['partition'] is None:
+            yield from self.job['source'].chunks()
+            return
+        for name in sorted(os.listdir(self.job['partition'])):
+            chunk = pd.read_pickle(os.path.join(self.job['partition'], name))
+            yield chunk.drop(columns=TEST_COLUMN), chunk[TEST_COLUMN].to_numpy()
+
+
+def _evaluate_markets(booster, source, preprocessor):
+    """Streaming held-out MAE, R² and per-market MAE; returns (mae, r2, {market: mae})"""
+    count, abs_error, squared_error, total, total_squared = 0, 0.0, 0.0, 0.0, 0.0
+    market_errors, market_counts = {}, {}
+    for chunk, test in source.chunks():
+        held_out = chunk[test]
+        if not len(held_out):
+            continue
+        actual = held_out['price'].to_numpy(dtype=np.float64)
+        errors = actual - booster.inplace_predict(preprocessor.features(held_out)).astype(np.float64)
+        count += len(actual)
+        abs_error += np.abs(errors).sum()
+        squared_error += np.square(errors).sum()
+        total += actual.sum()
+        total_squared += np.square(actual).sum()
+        locations = held_out['location'].astype(str).to_numpy()
+        for market, positions in held_out.groupby(locations).indices.items():
+            market_errors[market] = market_errors.get(market, 0.0) + np.abs(errors[positions]).sum()
+            market_counts[market] = market_counts.get(market, 0) + len(positions)
+    if not count:
+        return None, None, {}
+    variance = total_squared - total * total / count
+    return (abs_error / count, (1 - squared_error / variance) if variance else None,
+            {market: market_errors[market] / market_counts[market] for market in sorted(market_errors)})
+
+
+def _train_shard(job):
+    """Train and save one shard in a worker process; returns its stats.
+
+    Shards are streamed like create_model.py train: the scaler is fitted in one pass, xgboost
+    quantizes the chunks into a QuantileDMatrix and the held-out rows are scored chunk by chunk,
+    so a worker never holds its shard (or, for the global model, the dataset) as a float matrix.
+    """
+    import xgboost as xgb
+    from streaming_training import TRAINING_PARAMS, Preprocessor, training_iter
+
+    started = time.perf_counter()
+    source = _ShardSource(job)
+    preprocessor = Preprocessor()
+    for chunk, test in source.chunks():
+        preprocessor.partial_fit(chunk[~test])
+    preprocessor.finish()
+
+    def unknown_locations(train, number):
+        # Rows with a missing location teach the fallback model a market-agnostic path for unseen
+        # cities; drawn per chunk number, so every pass xgboost makes masks the same rows
+        values = preprocessor.features(train)
+        unknown = np.random.default_rng([job['seed'], number]).random(len(values)) < job['unknown_share']
+        values[unknown, -1] = np.nan
+        return values
+
+    features = unknown_locations if job['unknown_share'] else None
+    matrix = xgb.QuantileDMatrix(training_iter(xgb, source, preprocessor, features=features),
+                                 nthread=job['nthread'])
+    params = dict(TRAINING_PARAMS, seed=job['seed'], nthread=job['nthread'], **job['params'])
+    booster = xgb.train(params, matrix, num_boost_round=job['rounds'])
+    del matrix
+
+    mae, r2, market_mae = _evaluate_markets(booster, source, preprocessor)
+    stats = {
+        'markets': [str(name) for name in preprocessor.classes],
+        'rows': int(preprocessor.rows),
+        'testMae': round(float(mae), 2) if mae is not None else None,
+        'testR2': round(float(r2), 6) if r2 is not None else None,
+        'marketMae': {str(market): round(float(value), 2) for market, value in market_mae.items()},
+        'trainSeconds': round(time.perf_counter() - started, 3)
+    }
+    save_artifact(
+        job['output'], booster, scaler_mean=preprocessor.mean, scaler_scale=preprocessor.scale,
+        location_classes=preprocessor.classes, feature_columns=job['feature_columns'],
+        location_multipliers=job['location_multipliers'], growth_rates=job['growth_rates'],
+        model_info={'model_type': 'XGBoost', 'shard': job['name'], 'training_samples': stats['rows'],
+                    'test_mae': stats['testMae'], 'test_r2': stats['testR2'],
+                    'created_date': datetime.now().strftime('%Y-%m-%d')}
+    )
+    manifest = read_manifest(job['output'], verify=False)
+    stats['version'] = manifest['checksum'][:12]
+    stats['bytes'] = sum(entry['bytes'] for entry in manifest['files'].values())
+    return job['name'], stats
+
+
+def train_shards(source, output_dir, feature_columns, location_multipliers, growth_rates, clusters=None,
+                 min_rows=1000, workers=None, rounds=200, seed=42, unknown_share=0.1, route_all=False,
+                 shard_depth=6):
+    """Train a sharded model directory from a ChunkSource; returns the shard index.
+
+    clusters maps a cluster name to its markets; markets outside every cluster get their own
+    shard. Markets with fewer than min_rows training rows are left to the global model, which
+    is trained on every row. Shards are trained in a process pool, each with cores / workers
+    xgboost threads; market shards grow trees of at most shard_depth levels, since they see far
+    fewer rows than the global model. Market rows are first partitioned into files under
+    output_dir, which each worker streams back; the global worker streams the source itself into a
+    QuantileDMatrix, so no process materializes the dataset (see _train_shard). A market
+    is only routed to its shard when the shard's held-out MAE on that market beats the global
+    model's (or always, with route_all).
+    """
+    cluster_of = {str(market): name for name, markets in (clusters or {}).items() for market in markets}
+    os.makedirs(output_dir, exist_ok=True)
+    # Market rows are partitioned to disk in one pass, so only a chunk at a time is held here and the
+    # pool receives paths instead of pickled frames; the global model re-reads the source itself
+    partitions = tempfile.mkdtemp(prefix='.partitions-', dir=output_dir)
+    try:
+        sizes, counts, total = {}, {}, 0
+        for number, (chunk, test) in enumerate(source.chunks()):
+            total += len(chunk)
+            locations = chunk['location'].astype(str)
+            for market_number, (market, positions) in enumerate(sorted(locations.groupby(locations).indices.items())):
+                group = cluster_of.get(market, market)
+                part = chunk.iloc[positions].assign(**{TEST_COLUMN: test[positions]})
+                directory = os.path.join(partitions, shard_name(group))
+                os.makedirs(directory, exist_ok=True)
+                # Parts are named in source order, so a shard sees its rows in the same order as the source
+                part.to_pickle(os.path.join(directory, f'part-{number:06d}-{market_number:06d}.pkl'))
+                sizes[group] = sizes.get(group, 0) + len(part)
+                counts[group] = counts.get(group, 0) + int((~test[positions]).sum())
+
+        groups = [GLOBAL_SHARD] + sorted(group for group, count in counts.items() if count >= min_rows)
+        cores = os.cpu_count() or 1
+        workers = max(1, min(len(groups), workers or cores))
+        jobs = [{
+            'name': group,
+            'output': os.path.join(output_dir, GLOBAL_SHARD if group == GLOBAL_SHARD else shard_name(group)),
+            'source': source if group == GLOBAL_SHARD else None,
+            'partition': None if group == GLOBAL_SHARD else os.path.join(partitions, shard_name(group)),
+            'size': total if group == GLOBAL_SHARD else sizes[group],
+            'rounds': rounds,
+            'seed': seed,
+            'nthread': max(1, cores // workers),
+            'unknown_share': unknown_share if group == GLOBAL_SHARD else 0.0,
+            'params': {} if group == GLOBAL_SHARD else {'max_depth': shard_depth},
+            'feature_columns': list(feature_columns),
+            'location_multipliers': dict(location_multipliers),
+            'growth_rates': dict(growth_rates)
+        } for group in groups]
+        # Largest shards first so the pool does not finish on one big straggler
+        jobs.sort(key=lambda job: -job['size'])
+        print(f"Training {len(jobs)} shards ({len(jobs) - 1} markets/clusters + global) on {workers} processes...")
+
+        started = time.perf_counter()
+        shards = {}
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for name, stats in pool.map(_train_shard, jobs):
+                stats['directory'] = GLOBAL_SHARD if name == GLOBAL_SHARD else shard_name(name)
+                shards[name] = stats
+                print(f"✓ {name}: {stats['rows']:,} rows, test MAE ${stats['testMae'] or 0:,.0f}, "
+                      f"{stats['trainSeconds']:.1f}s")
+    finally:
+        shutil.rmtree(partitions, ignore_errors=True)
+
+    # Route every market to its shard and its code inside that shard (sorted classes, like LabelEncoder)
+    fallback = shards[GLOBAL_SHARD]
+    locations = {}
+    for market in fallback['markets']:
+        group = cluster_of.get(market, market)
+        shard = shards.get(group) if group != GLOBAL_SHARD else None
+        shard_mae = shard['marketMae'].get(market) if shard else None
+        global_mae = fallback['marketMae'].get(market)
+        use_shard = shard is not None and (route_all or None in (shard_mae, global_mae) or shard_mae <= global_mae)
+        target = shard if use_shard else fallback
+        locations[market] = {'shard': target['directory'], 'code': target['markets'].index(market),
+                             'shardMae': shard_mae, 'globalMae': global_mae}
+    routed = sum(route['shard'] != GLOBAL_SHARD for route in locations.values())
+    print(f"{routed} of {len(locations)} markets routed to their shard, the rest to the global model")
+
+    index = {
+        'format': SHARD_FORMAT,
+        'schema_version': SHARD_SCHEMA_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'feature_columns': list(feature_columns),
+        'location_multipliers': dict(location_multipliers),
+        'growth_rates': dict(growth_rates),
+        'global': GLOBAL_SHARD,
+        'locations': locations,
+        'shards': {stats['directory']: dict(stats, name=name) for name, stats in shards.items()},
+        'training': {'workers': workers, 'rounds': rounds, 'minRows': min_rows, 'shardDepth': shard_depth,
+                     'seconds': round(time.perf_counter() - started, 3)}
+    }
+    # The set's version is derived from every shard's checksum
+    versions = ''.join(f"{name}:{stats['version']}\n" for name, stats in sorted(index['shards'].items()))
+    index['checksum'] = hashlib.sha256(versions.encode('utf-8')).hexdigest()
+    with open(os.path.join(output_dir, SHARD_INDEX), 'w') as f:
+        json.dump(index, f, indent=2)
+    return index
+
+
+class ShardedModel(FeatureEncoder):
+    """Drop-in replacement for ModelArtifact that routes rows to per-market shards.
+
+    Locations are encoded against the union of all markets; predict() groups rows by shard,
+    rewrites the location column to each shard's own code and runs one call per shard. Unknown
+    locations go to the global model with the location feature missing instead of borrowing
+    another city's code. Shards load on first use and the least recently used ones are evicted
+    once the loaded shards' on-disk size exceeds max_memory_mb; the global model stays loaded.
+    """
+
+    UNKNOWN_LOCATION = -1
+
+    def __init__(self, directory, engine='auto', verify=True, max_memory_mb=512):
+        index_path = os.path.join(directory, SHARD_INDEX)
+        try:
+            with open(index_path) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ArtifactError(f"Cannot read shard index {index_path}: {e}")
+        if self.index.get('format') != SHARD_FORMAT or self.index.get('schema_version') != SHARD_SCHEMA_VERSION:
+            raise ArtifactError(f"{index_path} is not a supported shard index")
+
+        self.directory = directory
+        self.path = os.path.realpath(directory)
+        self.engine = engine
+        self.verify = verify
+        self.version = self.index['checksum'][:12]
+        self.feature_columns = list(self.index['feature_columns'])
+        self.location_multipliers = dict(self.index['location_multipliers'])
+        self.growth_rates = dict(self.index['growth_rates'])
+        self.model_info = {'model_type': 'XGBoost shards', 'shards': len(self.index['shards'])}
+        self.max_bytes = int(max_memory_mb * 1024 * 1024)
+        self._location_column = self.feature_columns.index('location_encoded')
+
+        markets = sorted(self.index['locations'])
+        self.location_codes = {market: code for code, market in enumerate(markets)}
+        self.shard_names = sorted(self.index['shards'])
+        shard_position = {name: position for position, name in enumerate(self.shard_names)}
+        # Lookup tables indexed by code + 1, so UNKNOWN_LOCATION (-1) lands on slot 0
+        routes = [self.index['locations'][market] for market in markets]
+        self._route_shard = np.array([shard_position[self.index['global']]] +
+                                     [shard_position[route['shard']] for route in routes], dtype=np.int64)
+        self._route_code = np.array([np.nan] + [route['code'] for route in routes], dtype=np.float64)
+
+        self._loaded = OrderedDict()
+        self._loaded_bytes = 0
+        self._nthread = None
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.evictions = 0
+        self.shard(self.index['global'])
+
+    def encode_location(self, location):
+        """Unknown locations get UNKNOWN_LOCATION and are routed to the global model"""
+        return self.location_codes.get(location, self.UNKNOWN_LOCATION)
+
+    def shard(self, name):
+        """The ModelArtifact of one shard, loading it (and evicting others) if needed"""
+        with self._lock:
+            artifact = self._loaded.get(name)
+            if artifact is not None:
+                self._loaded.move_to_end(name)
+                return artifact
+
+        artifact = ModelArtifact(os.path.join(self.path, name), verify=self.verify, engine=self.engine)
+        if self._nthread is not None:
+            artifact.set_nthread(self._nthread)
+        size = self.index['shards'][name]['bytes']
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name]
+            self._loaded[name] = artifact
+            self._loaded_bytes += size
+            self.loads += 1
+            while self._loaded_bytes > self.max_bytes:
+                victim = next((key for key in self._loaded if key != self.index['global'] and key != name), None)
+                if victim is None:
+                    break
+                # Threads still predicting with an evicted shard keep their reference until they finish
+                self._loaded.pop(victim)
+                self._loaded_bytes -= self.index['shards'][victim]['bytes']
+                self.evictions += 1
+        return artifact
+
+    def predict(self, features):
+        """Predict prices for a (rows, features) array whose location column uses location_codes"""
+        features = np.array(np.atleast_2d(features), dtype=np.float64)
+        codes = features[:, self._location_column].astype(np.int64) + 1
+        shard_of = self._route_shard[codes]
+        features[:, self._location_column] = self._route_code[codes]
+
+        predicted = np.empty(len(features), dtype=np.float32)
+        for position in np.unique(shard_of):
+            rows = np.flatnonzero(shard_of == position)
+            predicted[rows] = self.shard(self.shard_names[position]).predict(features[rows])
+        return predicted
+
+    def contributions(self, features, approximate=True):
+        """Contributions routed like predict(); each row's bias is its shard's expected price"""
+        features = np.array(np.atleast_2d(features), dtype=np.float64)
+        codes = features[:, self._location_column].astype(np.int64) + 1
+        shard_of = self._route_shard[codes]
+        features[:, self._location_column] = self._route_code[codes]
+
+        contributions = np.empty((len(features), len(self.feature_columns) + 1), dtype=np.float32)
+        for position in np.unique(shard_of):
+            rows = np.flatnonzero(shard_of == position)
+            contributions[rows] = self.shard(self.shard_names[position]).contributions(features[rows], approximate)
+        return contributions
+
+    @property
+    def feature_means(self):
+        """The global model's training means of the raw features"""
+        return self.shard(self.index['global']).feature_means
+
+    def resolve_engine(self):
+        self.engine = self.shard(self.index['global']).resolve_engine()
+        return self.engine
+
+    def set_nthread(self, nthread):
+        self._nthread = int(nthread)
+        with self._lock:
+            for artifact in self._loaded.values():
+                artifact.set_nthread(self._nthread)
+
+    def warm_up(self):
+        """Load the global model's evaluator; market shards still load on first use"""
+        return self.shard(self.index['global']).warm_up()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'shards': len(self.shard_names),
+                'loaded': list(self._loaded),
+                'loadedMb': round(self._loaded_bytes / (1024 * 1024), 2),
+                'maxMemoryMb': round(self.max_bytes / (1024 * 1024), 2),
+                'loads': self.loads,
+                'evictions': self.evictions
+            }
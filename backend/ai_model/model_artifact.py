@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Versioned model artifact
+One directory per model: booster in xgboost's UBJSON format, preprocessing and tree arrays as
+memory-mappable .npy files, and a JSON manifest with a schema version and checksums
+"""
+
+import os
+import json
+import hashlib
+import threading
+from datetime import datetime
+import numpy as np
+
+from compiled_model import CompiledModel, FeatureEncoder, flatten_booster
+from risk_index import RISK_FEATURES, RiskIndex
+
+ARTIFACT_FORMAT = 'earthslight-model'
+ARTIFACT_SCHEMA_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+BOOSTER_FILE = 'booster.ubj'
+TREE_ARRAYS = ('left', 'right', 'feature', 'threshold', 'default_left', 'roots')
+
+
+class ArtifactError(Exception):
+    """Raised when a model artifact is missing, corrupt or from an unsupported schema"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _combined_checksum(files):
+    lines = ''.join(f"{name}:{files[name]['sha256']}\n" for name in sorted(files))
+    return hashlib.sha256(lines.encode('utf-8')).hexdigest()
+
+
+def is_artifact(path):
+    return os.path.isfile(os.path.join(path, MANIFEST_FILE))
+
+
+def save_artifact(directory, booster, scaler_mean, scaler_scale, location_classes, feature_columns,
+                  location_multipliers, growth_rates, model_info=None, extra_arrays=None):
+    """Write a model artifact directory and return its manifest"""
+    if hasattr(booster, 'get_booster'):
+        booster = booster.get_booster()
+    os.makedirs(directory, exist_ok=True)
+
+    arrays = {
+        'scaler_mean': np.asarray(scaler_mean, dtype=np.float64),
+        'scaler_scale': np.asarray(scaler_scale, dtype=np.float64),
+        'location_classes': np.asarray([str(name) for name in location_classes], dtype=str),
+    }
+    # Flattened trees let the numpy evaluator run without xgboost installed
+    trees = flatten_booster(booster)
+    base_score = float(trees.pop('base_score'))
+    arrays.update(trees)
+    arrays.update(extra_arrays or {})
+
+    files = {}
+    booster.save_model(os.path.join(directory, BOOSTER_FILE))
+    for name, array in arrays.items():
+        np.save(os.path.join(directory, f'{name}.npy'), array, allow_pickle=False)
+    for name in [BOOSTER_FILE] + [f'{name}.npy' for name in arrays]:
+        path = os.path.join(directory, name)
+        files[name] = {'sha256': _sha256(path), 'bytes': os.path.getsize(path)}
+
+    manifest = {
+        'format': ARTIFACT_FORMAT,
+        'schema_version': ARTIFACT_SCHEMA_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'feature_columns': list(feature_columns),
+        'location_multipliers': dict(location_multipliers),
+        'growth_rates': dict(growth_rates),
+        'base_score': base_score,
+        'model_info': model_info or {},
+        'files': files,
+        'checksum': _combined_checksum(files)
+    }
+    with open(os.path.join(directory, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2, default=float)
+    return manifest
+
+
+def read_manifest(directory, verify=True):
+    """Read and validate a manifest; with verify=True every file's sha256 is checked"""
+    manifest_path = os.path.join(directory, MANIFEST_FILE)
+    if not os.path.isfile(manifest_path):
+        raise ArtifactError(f"No {MANIFEST_FILE} in {directory}")
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+
+    if manifest.get('format') != ARTIFACT_FORMAT:
+        raise ArtifactError(f"{directory} is not an {ARTIFACT_FORMAT} artifact")
+    if manifest.get('schema_version') != ARTIFACT_SCHEMA_VERSION:
+        raise ArtifactError(
+            f"Unsupported artifact schema version {manifest.get('schema_version')} "
+            f"(expected {ARTIFACT_SCHEMA_VERSION})"
+        )
+    if _combined_checksum(manifest['files']) != manifest['checksum']:
+        raise ArtifactError(f"Manifest checksum mismatch in {directory}")
+
+    for name, entry in manifest['files'].items():
+        path = os.path.join(directory, name)
+        if not os.path.isfile(path) or os.path.getsize(path) != entry['bytes']:
+            raise ArtifactError(f"Artifact file {name} is missing or has the wrong size")
+        if verify and _sha256(path) != entry['sha256']:
+            raise ArtifactError(f"Checksum mismatch for artifact file {name}")
+    return manifest
+
+
+class ModelArtifact(FeatureEncoder):
+    """Read-only view of a model artifact directory.
+
+    Arrays are memory-mapped, so worker processes loading the same artifact share their pages;
+    the xgboost booster is only read on the first prediction. engine is 'xgboost', 'numpy'
+    (flattened trees, no xgboost needed) or 'auto' (xgboost when it is installed).
+    """
+
+    def __init__(self, directory, verify=True, engine='auto'):
+        if engine not in ('auto', 'xgboost', 'numpy'):
+            raise ValueError(f"Unknown engine: {engine}")
+        self.directory = directory
+        # Files are read through the resolved path, so a later swap of a versioned artifact's symlink
+        # cannot mix the files of two versions (the booster and tree arrays load lazily)
+        self.path = os.path.realpath(directory)
+        self.engine = engine
+        self.manifest = read_manifest(self.path, verify=verify)
+        self.version = self.manifest['checksum'][:12]
+        self.feature_columns = list(self.manifest['feature_columns'])
+        self.location_multipliers = dict(self.manifest['location_multipliers'])
+        self.growth_rates = dict(self.manifest['growth_rates'])
+        self.model_info = self.manifest.get('model_info', {})
+
+        self.scaler_mean = self.array('scaler_mean')
+        self.scaler_scale = self.array('scaler_scale')
+        if len(self.scaler_mean) != len(self.feature_columns):
+            raise ArtifactError('Scaler does not match the feature columns in the manifest')
+        self.location_codes = {str(name): code for code, name in enumerate(self.array('location_classes'))}
+        self.has_risk_features = set(RISK_FEATURES) <= set(self.feature_columns)
+
+        self._booster = None
+        self._compiled = None
+        self._risk_index = None
+        self._nthread = None
+        self._lock = threading.Lock()
+
+    @property
+    def feature_means(self):
+        """Training means of the raw features: a typical property"""
+        return self.scaler_mean
+
+    @property
+    def risk_index(self):
+        """RiskIndex over the environmental events the model was trained with, or None when the
+        model has no risk features; built on first use and extended with insert()"""
+        if self._risk_index is None and self.has_risk_features:
+            with self._lock:
+                if self._risk_index is None:
+                    arrays = {name: self.array(name) for name in ('risk_lat', 'risk_lng', 'risk_severity', 'risk_area')}
+                    self._risk_index = RiskIndex.from_arrays(arrays, self.model_info['risk']['radiusKm'])
+        return self._risk_index
+
+    def array(self, name):
+        return np.load(os.path.join(self.path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+
+    @property
+    def booster(self):
+        """The xgboost Booster, loaded on first use"""
+        if self._booster is None:
+            with self._lock:
+                if self._booster is None:
+                    import xgboost as xgb
+                    booster = xgb.Booster()
+                    booster.load_model(os.path.join(self.path, BOOSTER_FILE))
+                    if self._nthread is not None:
+                        booster.set_param({'nthread': self._nthread})
+                    self._booster = booster
+        return self._booster
+
+    @property
+    def compiled(self):
+        """Pure-numpy evaluator over the memory-mapped tree arrays"""
+        if self._compiled is None:
+            trees = {name: self.array(name) for name in TREE_ARRAYS}
+            trees['base_score'] = self.manifest['base_score']
+            self._compiled = CompiledModel(
+                trees, self.feature_columns, self.scaler_mean, self.scaler_scale, self.location_codes
+            )
+        return self._compiled
+
+    def resolve_engine(self):
+        """The engine predictions run on, deciding 'auto' on first use"""
+        if self.engine == 'auto':
+            try:
+                import xgboost  # noqa: F401
+                self.engine = 'xgboost'
+            except ImportError:
+                self.engine = 'numpy'
+        return self.engine
+
+    def set_nthread(self, nthread):
+        """Limit the threads xgboost uses per prediction (the numpy engine is single-threaded)"""
+        self._nthread = int(nthread)
+        if self._booster is not None:
+            self._booster.set_param({'nthread': self._nthread})
+
+    def warm_up(self):
+        """Load the evaluator (and the risk index) now instead of on the first prediction"""
+        self.risk_index
+        if self.resolve_engine() == 'numpy':
+            return self.compiled
+        return self.booster
+
+    def predict(self, features):
+        """Predict prices for a (rows, features) array of raw, unscaled features"""
+        if self.resolve_engine() == 'numpy':
+            return self.compiled.predict(features)
+        return self.booster.inplace_predict(self.transform(np.atleast_2d(features)))
+
+    def contributions(self, features, approximate=True):
+        """Per-feature contributions for raw, unscaled feature rows: (rows, features + 1), bias last.
+
+        Always evaluated by xgboost (pred_contribs), whatever the prediction engine. approximate
+        attributes each split's gain along the decision path (approx_contribs), which is a few
+        hundred times faster than exact TreeSHAP on deep trees; both add up to the prediction.
+        """
+        import xgboost as xgb
+
+        matrix = xgb.DMatrix(self.transform(np.atleast_2d(features)), nthread=self._nthread)
+        return self.booster.predict(matrix, pred_contribs=True, approx_contribs=approximate)
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Multi-version model registry
+Holds several loaded model versions, loads new ones in the background and routes traffic between them
+"""
+
+import os
+import random
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+def model_label(predictor, path=None):
+    """Version label of a loaded predictor: the artifact checksum, or a hash of a legacy pickle file"""
+    if predictor.model_version is not None:
+        return predictor.model_version
+    if path and os.path.isfile(path):
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        return f"pkl-{digest.hexdigest()[:12]}"
+    return 'legacy'
+
+
+class ModelVersion:
+    """One loaded model: its predictor, routing state and in-flight request count.
+
+    state is 'ready' while it can receive traffic, 'draining' once traffic moved elsewhere and
+    'retired' after its last in-flight request finished and the predictor was released.
+    """
+
+    def __init__(self, version, predictor, source=None):
+        self.version = version
+        self.predictor = predictor
+        self.source = source
+        self.state = 'ready'
+        self.in_flight = 0
+        self.served = 0
+        self.loaded_at = time.time()
+
+    def describe(self):
+        return {
+            'version': self.version,
+            'state': self.state,
+            'source': self.source,
+            'inFlight': self.in_flight,
+            'served': self.served,
+            'loadedAt': round(self.loaded_at, 3)
+        }
+
+
+class ModelRegistry:
+    """Thread-safe set of loaded model versions with a primary, an optional canary and draining.
+
+    Requests call acquire() to pick a version (the canary for canary_percent of requests, the
+    primary otherwise) and release() when they are done. load() reads and warms up a new model
+    on a background thread while the current versions keep serving; once it is ready, traffic is
+    switched atomically under the registry lock. A version that loses all traffic drains: it is
+    released (and on_retire is called) as soon as its last in-flight request finishes.
+
+    factory() must return a fresh, unloaded RealEstatePredictor-like object; load_options are
+    passed on to its load_model().
+    """
+
+    def __init__(self, factory, on_retire=None, seed=None, load_options=None):
+        self.factory = factory
+        self.load_options = dict(load_options or {})
+        self.on_retire = on_retire
+        self._versions = {}
+        self._primary = None
+        self._canary = None
+        self._canary_share = 0.0
+        self._loading = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._loader = ThreadPoolExecutor(max_workers=1, thread_name_prefix='model-loader')
+
+    @property
+    def primary(self):
+        return self._primary
+
+    def add(self, predictor, source=None, version=None):
+        """Register an already loaded predictor; the first one added becomes the primary"""
+        version = version or model_label(predictor, source)
+        with self._lock:
+            entry = self._versions.get(version)
+            if entry is None:
+                entry = self._versions[version] = ModelVersion(version, predictor, source)
+            if self._primary is None:
+                self._primary = entry
+        return entry
+
+    def load(self, path, engine='auto', canary_percent=None):
+        """Load path on the background thread; returns a Future of the loaded version label.
+
+        When the model is ready it becomes the primary, or with canary_percent the canary.
+        """
+        return self._loader.submit(self._load, path, engine, canary_percent)
+
+    def _load(self, path, engine, canary_percent):
+        with self._lock:
+            self._loading[path] = time.time()
+        try:
+            predictor = self.factory()
+            if not (predictor.load_model(path, engine=engine, **self.load_options) and predictor.warm_up()):
+                raise RuntimeError(f"Failed to load model from {path}")
+            entry = self.add(predictor, path)
+            if entry.predictor is not predictor and predictor.cache is not None:
+                # Same version already loaded: keep serving the existing copy
+                predictor.cache.close()
+        finally:
+            with self._lock:
+                self._loading.pop(path, None)
+        if canary_percent:
+            self.set_canary(entry.version, canary_percent)
+        else:
+            self.activate(entry.version)
+        return entry.version
+
+    def _get(self, version):
+        entry = self._versions.get(version)
+        if entry is None:
+            raise KeyError(f"Model version {version} is not loaded")
+        return entry
+
+    def activate(self, version):
+        """Send all traffic to version; the previous primary (and canary) drain"""
+        with self._lock:
+            entry = self._get(version)
+            entry.state = 'ready'
+            previous = [self._primary, self._canary]
+            self._primary, self._canary, self._canary_share = entry, None, 0.0
+            retired = [self._drain(old) for old in previous if old is not None and old is not entry]
+        self._notify(retired)
+
+    def set_canary(self, version, percent):
+        """Route percent of requests to version (0 or None removes the canary, which then drains)"""
+        with self._lock:
+            previous = self._canary
+            if version is None or not percent:
+                self._canary, self._canary_share = None, 0.0
+            else:
+                entry = self._get(version)
+                if entry is self._primary:
+                    raise ValueError(f"Model version {version} is already the primary")
+                entry.state = 'ready'
+                self._canary, self._canary_share = entry, min(100.0, max(0.0, float(percent))) / 100
+            retired = [self._drain(previous)] if previous is not None and previous is not self._canary else []
+        self._notify(retired)
+
+    def promote(self):
+        """Make the canary the primary"""
+        with self._lock:
+            if self._canary is None:
+                raise ValueError('There is no canary to promote')
+            version = self._canary.version
+        self.activate(version)
+
+    def _drain(self, entry):
+        """Stop routing to entry (lock held); returns it if it can be retired right away"""
+        entry.state = 'draining'
+        return self._retire(entry) if entry.in_flight == 0 else None
+
+    def _retire(self, entry):
+        entry.state = 'retired'
+        self._versions.pop(entry.version, None)
+        return entry
+
+    def _notify(self, retired):
+        for entry in retired:
+            if entry is None:
+                continue
+            if self.on_retire is not None:
+                self.on_retire(entry)
+            if entry.predictor.cache is not None:
+                entry.predictor.cache.close()
+            entry.predictor = None
+
+    def acquire(self, version=None):
+        """Pick the version for one request and count it as in flight; pair with release()"""
+        with self._lock:
+            if version is not None:
+                entry = self._get(version)
+                if entry.state != 'ready':
+                    raise KeyError(f"Model version {version} is {entry.state}")
+            elif self._canary is not None and self._random.random() < self._canary_share:
+                entry = self._canary
+            else:
+                entry = self._primary
+            if entry is None:
+                raise RuntimeError('No model loaded')
+            entry.in_flight += 1
+        return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.in_flight -= 1
+            entry.served += 1
+            retired = [self._retire(entry)] if entry.state == 'draining' and entry.in_flight == 0 else []
+        self._notify(retired)
+
+    def entries(self):
+        """The versions currently loaded (ready or draining)"""
+        with self._lock:
+            return list(self._versions.values())
+
+    def status(self):
+        with self._lock:
+            return {
+                'primary': self._primary.version if self._primary else None,
+                'canary': {'version': self._canary.version, 'percent': round(self._canary_share * 100, 3)}
+                if self._canary else None,
+                'loading': sorted(self._loading),
+                'versions': [entry.describe() for entry in self._versions.values()]
+            }
+
+    def close(self):
+        """Stop the loader thread; a load still queued is cancelled"""
+        self._loader.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Incremental model refresh
+Continues boosting an existing model artifact on a batch of new transactions and writes a new artifact version
+"""
+
+import os
+import json
+import time
+import shutil
+import numpy as np
+import pandas as pd
+
+from model_artifact import ModelArtifact, save_artifact, read_manifest
+from streaming_training import NUMERIC_COLUMNS, TRAINING_PARAMS, ChunkSource
+
+
+def extend_classes(classes, locations):
+    """Append unseen locations after the existing classes, so existing codes keep their meaning"""
+    known = set(classes)
+    new = sorted({str(location) for location in locations} - known)
+    return list(classes) + new, new
+
+
+def refresh_scaler(mean, scale, samples_seen, features):
+    """Fold new rows into StandardScaler statistics with partial_fit; returns (mean, scale, samples)"""
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler()
+    scaler.mean_ = np.array(mean, dtype=np.float64)
+    scaler.scale_ = np.array(scale, dtype=np.float64)
+    scaler.var_ = np.square(scaler.scale_)
+    scaler.n_samples_seen_ = int(samples_seen)
+    scaler.n_features_in_ = len(scaler.mean_)
+    scaler.partial_fit(features)
+    return scaler.mean_, scaler.scale_, int(scaler.n_samples_seen_)
+
+
+def _scaled(raw, mean, scale):
+    """Feature values exactly as the inference path scales them (float64 affine, then float32)"""
+    return ((raw - mean) / scale).astype(np.float32)
+
+
+def rescale_thresholds(booster, old_mean, old_scale, new_mean, new_scale):
+    """Copy of booster whose split thresholds are moved from the old scaled space into the new one.
+
+    Trees only compare feature values against thresholds, so mapping every threshold back to raw
+    units and forward through the new scaler leaves predictions unchanged. Thresholds sitting on
+    an integer raw value keep that integer on the same side of the split.
+    """
+    import xgboost as xgb
+
+    old_mean, old_scale = np.asarray(old_mean, np.float64), np.asarray(old_scale, np.float64)
+    new_mean, new_scale = np.asarray(new_mean, np.float64), np.asarray(new_scale, np.float64)
+    model = json.loads(bytes(booster.save_raw(raw_format='json')))
+
+    for tree in model['learner']['gradient_booster']['model']['trees']:
+        internal = np.asarray(tree['left_children']) != -1
+        if not internal.any():
+            continue
+        conditions = np.asarray(tree['split_conditions'], dtype=np.float32)
+        feature = np.asarray(tree['split_indices'])[internal]
+        threshold = conditions[internal]
+
+        raw = threshold.astype(np.float64) * old_scale[feature] + old_mean[feature]
+        moved = _scaled(raw, new_mean[feature], new_scale[feature])
+
+        nearest = np.round(raw)
+        on_integer = np.abs(raw - nearest) <= 1e-4 * np.maximum(1, np.abs(nearest))
+        integer_left = _scaled(nearest, old_mean[feature], old_scale[feature]) < threshold
+        integer_moved = _scaled(nearest, new_mean[feature], new_scale[feature])
+        # x < threshold goes left: keep the integer right at, or left just above, its new scaled value
+        integer_moved = np.where(integer_left, np.nextafter(integer_moved, np.float32(np.inf)), integer_moved)
+
+        conditions[internal] = np.where(on_integer, integer_moved, moved)
+        tree['split_conditions'] = [float(value) for value in conditions]
+
+    rescaled = xgb.Booster()
+    rescaled.load_model(bytearray(json.dumps(model).encode('utf-8')))
+    return rescaled
+
+
+def _metrics(actual, predicted):
+    if not len(actual):
+        return {'mae': None, 'r2': None}
+    actual = np.asarray(actual, dtype=np.float64)
+    predicted = np.asarray(predicted, dtype=np.float64)
+    total = np.square(actual - actual.mean()).sum()
+    return {
+        'mae': round(float(np.abs(actual - predicted).mean()), 2),
+        'r2': round(float(1 - np.square(actual - predicted).sum() / total), 6) if total else None
+    }
+
+
+def _read_batch(data_path, chunk_size, validation_size, seed):
+    """Training and validation frames of the new batch (a seeded split, like create_model)"""
+    source = ChunkSource(data_path, seed=seed, chunk_size=chunk_size, test_size=validation_size)
+    train, validation = [], []
+    for chunk, test in source.chunks():
+        train.append(chunk[~test])
+        validation.append(chunk[test])
+    if not train:
+        raise ValueError(f"No rows in {data_path}")
+    return pd.concat(train, ignore_index=True), pd.concat(validation, ignore_index=True)
+
+
+def _raw_features(frame, codes):
+    locations = pd.Index(list(codes)).get_indexer(frame['location'].astype(str))
+    return np.column_stack([frame[NUMERIC_COLUMNS].to_numpy(dtype=np.float64), locations])
+
+
+def publish_version(artifact_dir, staged, version, current_version):
+    """Move a staged artifact to '<artifact_dir>.<version>' and point artifact_dir at it; returns
+    the directory of the version it replaced.
+
+    artifact_dir is a symlink to the current version directory and is swapped with a single
+    os.replace, so a reader resolving it always finds one complete version. Old versions stay
+    on disk for processes still serving them. A plain artifact directory moves to
+    '<artifact_dir>.<current_version>' on its first update, the only step that takes two renames.
+    """
+    base = artifact_dir.rstrip(os.sep)
+    versioned = f"{base}.{version}"
+    if os.path.exists(versioned):
+        # Same checksum, same files: the version is already published
+        shutil.rmtree(staged)
+    else:
+        os.rename(staged, versioned)
+
+    if os.path.islink(base):
+        previous = os.path.join(os.path.dirname(base), os.readlink(base))
+    else:
+        previous = f"{base}.{current_version}"
+        if os.path.exists(previous):
+            shutil.rmtree(previous)
+        os.rename(base, previous)
+    link = f"{base}.link-{os.getpid()}"
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(versioned), link)
+    os.replace(link, base)
+    return previous
+
+
+def update_artifact(artifact_dir, data_path, output_dir=None, rounds=100, learning_rate=0.1,
+                    validation_size=0.2, seed=42, nthread=None, chunk_size=1000000):
+    """Continue training the artifact in artifact_dir on data_path and write a new artifact.
+
+    Without output_dir the new artifact is published as <artifact_dir>.<version> and artifact_dir
+    repointed to it (see publish_version); earlier versions stay next to it. Returns a report with validation MAE/R² before and after.
+    """
+    import xgboost as xgb
+
+    started = time.perf_counter()
+    artifact = ModelArtifact(artifact_dir, engine='xgboost')
+    info = artifact.model_info
+    samples_seen = info.get('scaler_samples', info.get('training_samples'))
+    if not samples_seen:
+        raise ValueError('The artifact does not record how many rows its scaler was fitted on')
+    if artifact.feature_columns != NUMERIC_COLUMNS + ['location_encoded']:
+        raise ValueError(f"Unsupported feature columns: {artifact.feature_columns}")
+
+    train, validation = _read_batch(data_path, chunk_size, validation_size, seed)
+    old_classes = [str(name) for name in artifact.array('location_classes')]
+    classes, new_locations = extend_classes(old_classes, pd.concat([train['location'], validation['location']]))
+    codes = {name: code for code, name in enumerate(classes)}
+
+    train_raw = _raw_features(train, codes)
+    validation_raw = _raw_features(validation, codes)
+    mean, scale, samples = refresh_scaler(
+        artifact.scaler_mean, artifact.scaler_scale, samples_seen, np.vstack([train_raw, validation_raw])
+    )
+
+    # Validation rows from new cities get code 0 in the old model, like any unknown location
+    validation_old = validation_raw.copy()
+    validation_old[validation_old[:, -1] >= len(old_classes), -1] = 0
+    before = _metrics(validation['price'], artifact.predict(validation_old))
+
+    booster = rescale_thresholds(artifact.booster, artifact.scaler_mean, artifact.scaler_scale, mean, scale)
+    remap_error = float(np.max(np.abs(
+        booster.inplace_predict(_scaled(validation_old, mean, scale)).astype(np.float64) -
+        artifact.predict(validation_old).astype(np.float64)
+    ))) if len(validation_old) else 0.0
+
+    params = dict(TRAINING_PARAMS, eta=learning_rate, seed=seed)
+    if nthread:
+        params['nthread'] = nthread
+    train_matrix = xgb.DMatrix(_scaled(train_raw, mean, scale), label=train['price'].to_numpy(dtype=np.float32))
+    booster = xgb.train(params, train_matrix, num_boost_round=rounds, xgb_model=booster)
+    after = _metrics(validation['price'], booster.inplace_predict(_scaled(validation_raw, mean, scale)))
+
+    replace = output_dir is None
+    target = output_dir or f"{artifact_dir.rstrip(os.sep)}.tmp-{os.getpid()}"
+    model_info = dict(info)
+    model_info.update({
+        'training_samples': int(info.get('training_samples', 0)) + len(train),
+        'scaler_samples': samples,
+        'test_mae': after['mae'],
+        'test_r2': after['r2'],
+        'created_date': time.strftime('%Y-%m-%d'),
+        'parent_version': artifact.version,
+        'update': {'data': data_path, 'rows': len(train) + len(validation), 'rounds': rounds,
+                   'learning_rate': learning_rate, 'new_locations': new_locations}
+    })
+    save_artifact(
+        target, booster, scaler_mean=mean, scaler_scale=scale, location_classes=classes,
+        feature_columns=artifact.feature_columns, location_multipliers=artifact.location_multipliers,
+        growth_rates=artifact.growth_rates, model_info=model_info
+    )
+    version = read_manifest(target, verify=False)['checksum'][:12]
+
+    previous = None
+    if replace:
+        previous = publish_version(artifact_dir, target, version, artifact.version)
+        target = artifact_dir
+
+    return {
+        'output': target,
+        'previous': previous,
+        'parentVersion': artifact.version,
+        'version': version,
+        'trainRows': len(train),
+        'validationRows': len(validation),
+        'newLocations': new_locations,
+        'rounds': rounds,
+        'remapMaxError': remap_error,
+        'before': before,
+        'after': after,
+        'seconds': round(time.perf_counter() - started, 3)
+    }
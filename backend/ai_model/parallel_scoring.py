@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Multi-process bulk scoring
+Fans predict_batch out over a pool of worker processes that share one loaded model
+"""
+
+import os
+import time
+import multiprocessing
+from multiprocessing import resource_tracker, shared_memory
+import numpy as np
+import pandas as pd
+
+from predict import FACTOR_COLUMNS, PROPERTY_COLUMNS
+
+NUMERIC_COLUMNS = ['floors', 'area', 'bedrooms', 'bathrooms', 'age']
+RESULT_DTYPE = np.dtype(
+    [('currentPrice', np.int64), ('confidence', np.int64), ('marketTrend', 'U10'), ('locationScore', np.int64)] +
+    [(column, np.float64) for _, column, _ in FACTOR_COLUMNS]
+)
+
+# Per-process worker state, filled in by _init_worker
+_WORKER = {}
+
+
+class SharedTable:
+    """A structured numpy array backed by a named shared memory block"""
+
+    def __init__(self, block, dtype, rows):
+        self.block = block
+        self.dtype = np.dtype(dtype)
+        self.rows = rows
+        self.array = np.ndarray((rows,), dtype=self.dtype, buffer=block.buf)
+
+    @classmethod
+    def create(cls, dtype, rows):
+        # Zero-sized blocks are not allowed
+        size = max(1, np.dtype(dtype).itemsize * rows)
+        return cls(shared_memory.SharedMemory(create=True, size=size), dtype, rows)
+
+    @classmethod
+    def attach(cls, spec):
+        name, dtype, rows = spec
+        return cls(shared_memory.SharedMemory(name=name), dtype, rows)
+
+    @property
+    def spec(self):
+        """Picklable (name, dtype, rows) a worker can attach with"""
+        return self.block.name, self.dtype.descr, self.rows
+
+    def close(self):
+        self.array = None
+        self.block.close()
+
+    def unlink(self):
+        self.close()
+        self.block.unlink()
+
+
+def _input_table(frame):
+    """Copy the property columns of a frame into shared memory"""
+    locations = frame['location'].to_numpy(dtype=object).astype(str)
+    width = max(1, max((len(name) for name in locations), default=1))
+    dtype = np.dtype([(column, np.float64) for column in NUMERIC_COLUMNS] + [('location', f'U{width}')])
+    # Coordinates travel along for models with environmental risk features
+    coordinates = [column for column in ('lat', 'lng') if column in frame.columns]
+    dtype = np.dtype(dtype.descr + [(column, np.float64) for column in coordinates])
+    table = SharedTable.create(dtype, len(frame))
+    # float64 like the serial path, so fractional inputs and missing values score identically
+    for column in NUMERIC_COLUMNS + coordinates:
+        table.array[column] = frame[column].to_numpy(dtype=np.float64, na_value=np.nan)
+    table.array['location'] = locations
+    return table
+
+
+def _limit_threads(predictor, threads):
+    """Keep each worker's booster from spawning a thread per core on top of the process pool"""
+    if predictor.artifact is not None:
+        predictor.artifact.set_nthread(threads)
+    elif hasattr(predictor.model, 'set_params'):
+        predictor.model.set_params(n_jobs=threads)
+
+
+def _init_worker(predictor, model_path, engine, threads, explanations, table_settings=None):
+    _WORKER['tables'] = {}
+    if predictor is None:
+        # Without fork every worker maps the artifact (and valuation table) itself; the .npy arrays share page cache
+        from predict import RealEstatePredictor
+        predictor = RealEstatePredictor()
+        predictor.configure_explanations(**explanations)
+        predictor.table_settings = table_settings
+        if not predictor.load_model(model_path, engine=engine):
+            # Raising here would make the pool respawn the worker forever; fail its tasks instead
+            _WORKER['predictor'] = None
+            return
+    _limit_threads(predictor, threads)
+    _WORKER['predictor'] = predictor
+
+
+def _table(spec):
+    """Attach a shared table once per worker, dropping tables of earlier batches"""
+    tables = _WORKER['tables']
+    if spec[0] not in tables:
+        if len(tables) >= 2:
+            for table in tables.values():
+                table.close()
+            tables.clear()
+        tables[spec[0]] = SharedTable.attach(spec)
+    return tables[spec[0]]
+
+
+def _score_range(task):
+    """Score rows [start, stop) of the shared input straight into the shared output"""
+    index, start, stop, input_spec, output_spec = task
+    if _WORKER['predictor'] is None:
+        raise RuntimeError(f"Worker {os.getpid()} could not load the model")
+    started = time.perf_counter()
+    rows = _table(input_spec).array[start:stop]
+    chunk = pd.DataFrame({column: rows[column] for column in NUMERIC_COLUMNS})
+    chunk['location'] = rows['location'].astype(object)
+    for column in ('lat', 'lng'):
+        if column in rows.dtype.names:
+            chunk[column] = rows[column]
+
+    results = _WORKER['predictor'].predict_batch(chunk, chunk_size=max(1, stop - start))
+    if results is None:
+        raise RuntimeError('Model not loaded')
+    output = _table(output_spec).array
+    for column in RESULT_DTYPE.names:
+        output[column][start:stop] = results[column].to_numpy()
+
+    return {
+        'chunk': index,
+        'worker': os.getpid(),
+        'rows': stop - start,
+        'seconds': round(time.perf_counter() - started, 6)
+    }
+
+
+class ParallelScorer:
+    """Score DataFrames across a pool of worker processes sharing one loaded model.
+
+    With the fork start method (the Linux default) workers inherit the parent's loaded predictor
+    copy-on-write, so the model is never pickled; elsewhere each worker memory-maps the same
+    model artifact. Inputs and outputs travel through shared memory, so only per-chunk stats
+    are pickled, and results come back in input order.
+    """
+
+    def __init__(self, predictor, workers=None, chunk_size=50000, threads_per_worker=1, start_method=None):
+        if not predictor.is_trained:
+            raise RuntimeError('Model not loaded')
+        self.predictor = predictor
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.chunk_size = max(1, int(chunk_size))
+        self.threads_per_worker = max(1, int(threads_per_worker))
+
+        start_method = start_method or ('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+        if start_method == 'fork':
+            initargs = (predictor, None, None, self.threads_per_worker, predictor.explanations)
+        elif predictor.artifact is not None:
+            initargs = (None, predictor.artifact.path, predictor.artifact.engine, self.threads_per_worker,
+                        predictor.explanations, predictor.table_settings)
+        else:
+            raise RuntimeError('Parallel scoring of a legacy pickle needs the fork start method; export a model artifact')
+
+        # Forked workers must share the parent's tracker, or each one "cleans up" the blocks it attached
+        resource_tracker.ensure_running()
+        self.worker_stats = {}
+        self._pool = multiprocessing.get_context(start_method).Pool(
+            self.workers, initializer=_init_worker, initargs=initargs
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool.join()
+            self._pool = None
+
+    def score(self, data, chunk_size=None):
+        """Score a DataFrame or dict of columns; returns (results, stats) like predict_batch + timings"""
+        frame = self.predictor.resolve_coordinates(data if isinstance(data, pd.DataFrame) else pd.DataFrame(data))
+        missing = [column for column in PROPERTY_COLUMNS if column not in frame.columns]
+        if missing:
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        chunk_size = max(1, int(chunk_size or self.chunk_size))
+
+        started = time.perf_counter()
+        inputs = _input_table(frame)
+        outputs = SharedTable.create(RESULT_DTYPE, len(frame))
+        try:
+            tasks = [
+                (index, start, min(start + chunk_size, len(frame)), inputs.spec, outputs.spec)
+                for index, start in enumerate(range(0, len(frame), chunk_size))
+            ]
+            chunks = sorted(self._pool.imap_unordered(_score_range, tasks), key=lambda chunk: chunk['chunk'])
+            results = pd.DataFrame({column: outputs.array[column].copy() for column in RESULT_DTYPE.names})
+            results['marketTrend'] = results['marketTrend'].astype(object)
+        finally:
+            inputs.unlink()
+            outputs.unlink()
+
+        seconds = time.perf_counter() - started
+        return results, self._stats(chunks, seconds)
+
+    def _stats(self, chunks, seconds):
+        workers = {}
+        for chunk in chunks:
+            worker = workers.setdefault(chunk['worker'], {'worker': chunk['worker'], 'chunks': 0, 'rows': 0, 'seconds': 0.0})
+            worker['chunks'] += 1
+            worker['rows'] += chunk['rows']
+            worker['seconds'] += chunk['seconds']
+            total = self.worker_stats.setdefault(chunk['worker'], {'worker': chunk['worker'], 'chunks': 0, 'rows': 0, 'seconds': 0.0})
+            total['chunks'] += 1
+            total['rows'] += chunk['rows']
+            total['seconds'] += chunk['seconds']
+
+        rows = sum(chunk['rows'] for chunk in chunks)
+        busy = sum(worker['seconds'] for worker in workers.values())
+        return {
+            'rows': rows,
+            'chunks': len(chunks),
+            'workers': self.workers,
+            'seconds': round(seconds, 3),
+            'rowsPerSecond': round(rows / seconds, 1) if seconds else None,
+            # Share of the pool's wall-clock capacity spent scoring; near 1.0 means near-linear scaling
+            'utilization': round(busy / (seconds * self.workers), 3) if seconds else None,
+            'perWorker': [_worker_summary(worker) for worker in workers.values()],
+            'perChunk': chunks
+        }
+
+    def summary(self):
+        """Per-worker totals over every score() call so far"""
+        return [_worker_summary(worker) for worker in self.worker_stats.values()]
+
+
+def _worker_summary(worker):
+    return {
+        'worker': worker['worker'],
+        'chunks': worker['chunks'],
+        'rows': worker['rows'],
+        'seconds': round(worker['seconds'], 3),
+        'rowsPerSecond': round(worker['rows'] / worker['seconds'], 1) if worker['seconds'] else None
+    }
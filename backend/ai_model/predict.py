@@ -4,24 +4,118 @@ EarthSlight AI Model - Real Estate Price Prediction
 XGBoost-based machine learning model for property valuation
 """
 
+import time
+
+# Recorded before anything else so --timing can report the cost of importing this module
+_MODULE_START = time.perf_counter()
+
+import os
 import sys
 import json
+import argparse
+import importlib
 import pickle
-import numpy as np
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder, StandardScaler
-from sklearn.ensemble import RandomForestRegressor
-import xgboost as xgb
-from datetime import datetime
+from contextlib import contextmanager
 import warnings
 warnings.filterwarnings('ignore')
 
+from prediction_metrics import NO_STAGES
+
+# numpy, pandas, scikit-learn and xgboost are imported where they are first needed, so commands
+# like `forecast` pay only for numpy
+
+DEFAULT_ARTIFACT_DIR = 'model_artifact'
+LEGACY_MODEL_FILE = 'model.pkl'
+
+# Input columns accepted by predict_batch (location may instead come from lat/lng columns)
+PROPERTY_COLUMNS = ['floors', 'area', 'bedrooms', 'bathrooms', 'age', 'location']
+
+# Location of coordinates that no market in the geo index claims
+UNKNOWN_LOCATION_NAME = 'Unknown'
+
+# (factor name, predict_batch column, description) in the order predict_price reports them
+FACTOR_COLUMNS = [
+    ('Location', 'locationImpact', 'Location premium'),
+    ('Area', 'areaImpact', 'Square footage'),
+    ('Bedrooms', 'bedroomsImpact', 'Number of bedrooms'),
+    ('Bathrooms', 'bathroomsImpact', 'Number of bathrooms'),
+    ('Age', 'ageImpact', 'Property age'),
+    ('Floors', 'floorsImpact', 'Number of floors')
+]
+
+# Model feature behind each factor, for contribution explanations (same order as FACTOR_COLUMNS)
+FACTOR_FEATURES = ['location_encoded', 'area', 'bedrooms', 'bathrooms', 'age', 'floors']
+
+# How factors are explained: the fixed heuristic multipliers (the default for every command,
+# whatever the engine) or the booster's per-feature contributions (opt-in, they cost a booster call)
+EXPLANATION_MODES = ('heuristic', 'contributions')
+
+
+def default_model_path():
+    """Prefer the artifact directory written by create_model.py, fall back to the legacy pickle"""
+    if os.path.isdir(DEFAULT_ARTIFACT_DIR):
+        return DEFAULT_ARTIFACT_DIR
+    return LEGACY_MODEL_FILE
+
+
+def log(message):
+    """Diagnostics go to stderr so stdout only carries the JSON a command returns"""
+    print(message, file=sys.stderr)
+
+
+def parse_point(location=None, lat=None, lng=None):
+    """(location, lat, lng) with a "lat,lng" location string split into coordinates"""
+    if isinstance(location, str) and ',' in location and lat is None:
+        try:
+            lat, lng = (float(part) for part in location.split(','))
+        except ValueError:
+            # A name such as "Portland, OR"
+            return location, None, None
+        return None, lat, lng
+    return location, lat, lng
+
+
+def _location_lookup(locations, table, default):
+    """Map an array of location names through a {location: value} table in one vectorized lookup"""
+    import numpy as np
+    import pandas as pd
+
+    positions = pd.Index(list(table.keys())).get_indexer(locations)
+    # get_indexer returns -1 for unknown names, which picks the trailing default
+    values = np.append(np.asarray(list(table.values()), dtype=float), default)
+    return values[positions]
+
+
+def _top_factors(factors, top_k):
+    """The top_k factors whose impact is furthest from 1, strongest first (all, in order, without top_k)"""
+    if not top_k:
+        return factors
+    return sorted(factors, key=lambda factor: -abs(factor['impact'] - 1))[:top_k]
+
+
+def _round_impacts(values):
+    """Round to 2 decimals exactly like round() does, evaluated once per distinct value"""
+    import numpy as np
+
+    uniques, inverse = np.unique(values, return_inverse=True)
+    rounded = np.array([round(float(value), 2) for value in uniques], dtype=float)
+    return rounded[inverse]
+
 class RealEstatePredictor:
     def __init__(self):
         self.model = None
         self.label_encoders = {}
         self.scaler = None
+        self.artifact = None
+        self.model_version = None
         self.is_trained = False
+        self.cache = None
+        self.metrics = None
+        self.geo_index = None
+        self.table = None
+        self.table_settings = None
+        self.explanations = {'mode': 'heuristic', 'top_k': None, 'baseline': 'average', 'exact': False}
+        self._explainer = None
         
         # Location multipliers (for your trained model - adjust these based on your model's training data)
         self.location_multipliers = {
@@ -51,132 +145,438 @@ class RealEstatePredictor:
             'Portland': 0.03
         }
     
-    def generate_training_data(self, num_samples=10000):
+    def generate_training_data(self, num_samples=10000, seed=42):
         """Generate synthetic training data for the model"""
-        np.random.seed(42)
-        
-        locations = list(self.location_multipliers.keys())
-        
-        data = {
-            'floors': np.random.randint(1, 51, num_samples),
-            'area': np.random.randint(100, 10001, num_samples),
-            'bedrooms': np.random.randint(1, 11, num_samples),
-            'bathrooms': np.random.randint(1, 11, num_samples),
-            'age': np.random.randint(0, 101, num_samples),
-            'location': np.random.choice(locations, num_samples)
-        }
-        
-        df = pd.DataFrame(data)
-        
-        # Calculate synthetic prices based on features
-        base_price = 150000
-        prices = []
-        
-        for _, row in df.iterrows():
-            location_mult = self.location_multipliers.get(row['location'], 1.5)
-            area_mult = row['area'] / 1000
-            bedroom_mult = 1 + (row['bedrooms'] - 2) * 0.15
-            bathroom_mult = 1 + (row['bathrooms'] - 1) * 0.1
-            floor_mult = 1 + (row['floors'] - 1) * 0.05
-            age_mult = max(0.7, 1 - (row['age'] * 0.01))
-            
-            price = base_price * location_mult * area_mult * bedroom_mult * bathroom_mult * floor_mult * age_mult
-            # Add some randomness
-            price *= np.random.uniform(0.8, 1.2)
-            prices.append(int(price))
-        
-        df['price'] = prices
-        return df
+        from synthetic_data import generate_training_frame
+        return generate_training_frame(
+            num_samples, self.location_multipliers, seed=seed, noise_range=(0.8, 1.2), price_floor=None
+        )
     
     def train_model(self):
         """This method is kept for compatibility but will not be used with pre-trained model"""
-        print("Using pre-trained model. Training is not required.")
+        log("Using pre-trained model. Training is not required.")
         return True
     
-    def predict_price(self, floors, area, bedrooms, bathrooms, age, location):
-        """Predict property price using the trained model"""
+    def update_model(self, data_path, output_dir=None, **options):
+        """Continue training the loaded artifact on new transactions, then load the new version.
+
+        options go to model_update.update_artifact (rounds, learning_rate, validation_size, ...).
+        Returns its report with validation MAE/R² before and after the update.
+        """
+        from model_update import update_artifact
+
+        if self.artifact is None:
+            raise RuntimeError('Incremental updates need a model artifact; run create_model.py export first')
+        report = update_artifact(self.artifact.directory, data_path, output_dir=output_dir, **options)
+        self.load_model(report['output'], engine=self.artifact.engine)
+        return report
+    
+    def predict_price(self, floors, area, bedrooms, bathrooms, age, location=None, lat=None, lng=None):
+        """Predict property price using the trained model.
+
+        The location is a market name; without one, lat/lng (or a "lat,lng" location string)
+        are resolved to the nearest market through the geo index.
+        """
         if not self.is_trained:
-            print("Model not loaded. Please ensure your trained model is available.")
+            log("Model not loaded. Please ensure your trained model is available.")
             return None
+        stages = self._stages('predict')
+        point = self.risk_point(location, lat, lng)
+        location = self.resolve_location(location, lat, lng)
+        if location not in self.location_multipliers:
+            stages.note('unknownLocations')
+        stages.mark('resolve')
+
+        key = None
+        if self.cache is not None:
+            key = self.cache.key(floors, area, bedrooms, bathrooms, age, location, point)
+            cached = self.cache.get(key)
+            stages.mark('cache')
+            if cached is not None:
+                stages.note('cacheHits')
+                stages.finish()
+                return cached
+            stages.note('cacheMisses')
         
         try:
-            # Prepare input data according to your model's expected format
-            input_data = pd.DataFrame({
-                'floors': [floors],
-                'area': [area],
-                'bedrooms': [bedrooms],
-                'bathrooms': [bathrooms],
-                'age': [age]
-            })
-            
-            # Handle location encoding based on your model's requirements
-            if self.label_encoders and 'location' in self.label_encoders:
-                if location in self.label_encoders['location'].classes_:
-                    location_encoded = self.label_encoders['location'].transform([location])[0]
-                else:
-                    # If location not in training data, use default
-                    location_encoded = 0
-                input_data['location_encoded'] = location_encoded
-            else:
-                # If no label encoder, use location as string or handle differently
-                input_data['location'] = location
-            
-            # Scale features if scaler is available
-            if self.scaler:
-                input_scaled = self.scaler.transform(input_data)
-            else:
-                input_scaled = input_data.values
-            
-            # Make prediction using your trained model
-            predicted_price = self.model.predict(input_scaled)[0]
+            features = None
+            predicted_price = None
+            if self.table is not None:
+                # Precomputed table: constant-time lookup, None off the grid
+                predicted_price = self.table.lookup(floors, area, bedrooms, bathrooms, age, location)
+                stages.note('tableHits' if predicted_price is not None else 'tableMisses')
+                stages.mark('table')
+            if predicted_price is None and self.artifact is not None:
+                # Model artifact: plain dict lookup + numpy affine transform + booster
+                features = self._artifact_features(floors, area, bedrooms, bathrooms, age, location, point)
+                stages.mark('encode')
+                predicted_price = self.artifact.predict(features)[0]
+                stages.mark('model')
+            elif self.artifact is None:
+                predicted_price = self._predict_single(floors, area, bedrooms, bathrooms, age, location, stages)
             
             # Calculate confidence based on feature values
             confidence = self._calculate_confidence(floors, area, bedrooms, bathrooms, age, location)
+            stages.mark('confidence')
             
             # Calculate market trend
             market_trend = self._get_market_trend(location)
             
             # Calculate location score
             location_score = self._calculate_location_score(location)
+            stages.mark('market')
             
             # Generate factors analysis
-            factors = self._analyze_factors(floors, area, bedrooms, bathrooms, age, location)
+            if self.explanation_mode() == 'contributions':
+                if features is None:
+                    features = self._artifact_features(floors, area, bedrooms, bathrooms, age, location, point)
+                impacts = self.explainer().impacts(features)[0]
+                factors = [
+                    {'name': name, 'impact': float(impact), 'description': description}
+                    for (name, _, description), impact in zip(FACTOR_COLUMNS, impacts)
+                ]
+            else:
+                factors = self._analyze_factors(floors, area, bedrooms, bathrooms, age, location)
+            factors = _top_factors(factors, self.explanations['top_k'])
+            stages.mark('factors')
             
-            return {
+            result = {
                 'currentPrice': int(predicted_price),
                 'confidence': confidence,
                 'marketTrend': market_trend,
                 'locationScore': location_score,
                 'factors': factors
             }
+            if key is not None:
+                self.cache.put(key, result)
+            stages.finish()
+            return result
         except Exception as e:
-            print(f"Error making prediction: {e}")
+            stages.finish(error=True)
+            log(f"Error making prediction: {e}")
             return None
-    
-    def generate_forecast(self, current_price, location, years=10):
-        """Generate price forecast for the next N years"""
-        growth_rate = self.growth_rates.get(location, 0.03)
-        forecast = []
+
+    def _artifact_features(self, floors, area, bedrooms, bathrooms, age, location, point=None):
+        """Feature row of one property for the loaded artifact"""
+        risk = self.artifact.risk_index.point_features(*point) if point is not None else {}
+        return self.artifact.build_features(
+            floors=floors, area=area, bedrooms=bedrooms, bathrooms=bathrooms, age=age,
+            location_encoded=self.artifact.encode_location(location), **risk
+        )
+
+    def _predict_single(self, floors, area, bedrooms, bathrooms, age, location, stages=NO_STAGES):
+        """Run one property through the pickled encoder, scaler and model"""
+        import pandas as pd
+
+        # Prepare input data according to your model's expected format
+        input_data = pd.DataFrame({
+            'floors': [floors],
+            'area': [area],
+            'bedrooms': [bedrooms],
+            'bathrooms': [bathrooms],
+            'age': [age]
+        })
+        stages.mark('frame')
         
-        for year in range(1, years + 1):
-            # Add volatility to the forecast
-            volatility = np.random.uniform(0.95, 1.05)
-            growth_factor = (1 + growth_rate) ** year * volatility
-            
-            forecast_price = int(current_price * growth_factor)
-            growth_percentage = ((growth_factor - 1) * 100)
-            
-            # Decreasing confidence over time
-            confidence = max(60, 100 - year * 3)
-            
-            forecast.append({
-                'year': datetime.now().year + year,
-                'price': forecast_price,
-                'growth': round(growth_percentage, 1),
-                'confidence': confidence
-            })
+        # Handle location encoding based on your model's requirements
+        if self.label_encoders and 'location' in self.label_encoders:
+            if location in self.label_encoders['location'].classes_:
+                location_encoded = self.label_encoders['location'].transform([location])[0]
+            else:
+                # If location not in training data, use default
+                location_encoded = 0
+            input_data['location_encoded'] = location_encoded
+        else:
+            # If no label encoder, use location as string or handle differently
+            input_data['location'] = location
+        stages.mark('encode')
+        
+        # Scale features if scaler is available
+        if self.scaler:
+            input_scaled = self.scaler.transform(input_data)
+        else:
+            input_scaled = input_data.values
+        stages.mark('scale')
         
-        return forecast
+        # Make prediction using your trained model
+        predicted_price = self.model.predict(input_scaled)[0]
+        stages.mark('model')
+        return predicted_price
+
+    def predict_batch(self, data, chunk_size=100000):
+        """Predict prices for many properties at once.
+
+        Takes a DataFrame or a dict of columns (floors, area, bedrooms, bathrooms, age,
+        location) and returns a DataFrame with currentPrice, confidence, marketTrend,
+        locationScore and one impact column per factor, matching predict_price row for row.
+        """
+        import pandas as pd
+
+        if not self.is_trained:
+            log("Model not loaded. Please ensure your trained model is available.")
+            return None
+
+        stages = self._stages('batch')
+        frame = self.resolve_coordinates(data if isinstance(data, pd.DataFrame) else pd.DataFrame(data))
+        missing = [column for column in PROPERTY_COLUMNS if column not in frame.columns]
+        if missing:
+            stages.finish(error=True)
+            raise ValueError(f"Missing columns: {', '.join(missing)}")
+        stages.note('batchRows', len(frame))
+        stages.mark('resolve')
+
+        chunk_size = max(1, int(chunk_size))
+        try:
+            results = [
+                self._predict_chunk(frame.iloc[start:start + chunk_size], stages)
+                for start in range(0, len(frame), chunk_size)
+            ]
+        except Exception:
+            stages.finish(error=True)
+            raise
+        stages.finish()
+        if not results:
+            return pd.DataFrame(columns=['currentPrice', 'confidence', 'marketTrend', 'locationScore'] +
+                                [column for _, column, _ in FACTOR_COLUMNS])
+        return pd.concat(results, ignore_index=True)
+
+    def resolve_location(self, location=None, lat=None, lng=None):
+        """Market name for a property given by name, by lat/lng or by a "lat,lng" string.
+
+        A location the model knows wins over coordinates; an unknown one is kept only when the
+        coordinates do not fall in any market either.
+        """
+        location, lat, lng = parse_point(location, lat, lng)
+        if lat is None or lng is None or location in self.location_multipliers:
+            return location
+        geo_index = self.geo_index or self.enable_geo()
+        market, _ = geo_index.resolve_point(lat, lng)
+        if market >= 0:
+            return geo_index.names[market]
+        return location or UNKNOWN_LOCATION_NAME
+
+    def risk_point(self, location=None, lat=None, lng=None):
+        """Coordinates the environmental risk features of a property are computed at, or None when
+        the model has no risk features: its own lat/lng, else its market's centroid, else NaN"""
+        if self.artifact is None or not self.artifact.has_risk_features:
+            return None
+        location, lat, lng = parse_point(location, lat, lng)
+        if lat is not None and lng is not None:
+            return float(lat), float(lng)
+        geo_index = self.geo_index or self.enable_geo()
+        market = geo_index.codes.get(location)
+        if market is None:
+            return float('nan'), float('nan')
+        return float(geo_index.lat[market]), float(geo_index.lng[market])
+
+    def risk_columns(self, lat, lng, locations):
+        """Risk feature arrays for build_features; missing coordinates fall back to market centroids"""
+        import numpy as np
+
+        lat, lng = np.array(lat, dtype=np.float64), np.array(lng, dtype=np.float64)
+        missing = ~(np.isfinite(lat) & np.isfinite(lng))
+        if missing.any():
+            geo_index = self.geo_index or self.enable_geo()
+            lat[missing], lng[missing] = geo_index.centroids(np.asarray(locations, dtype=object)[missing])
+        return self.artifact.risk_index.features(lat, lng)
+
+    def add_risk_events(self, events):
+        """Add environmental risk events to the model's risk index; returns how many were added.
+
+        events is a GeoJSON or NDJSON file path, a FeatureCollection or a list of features /
+        {lat, lng, severity, area} records. Cached predictions are invalidated.
+        """
+        from risk_index import parse_risk_events, read_risk_events
+
+        if self.artifact is None or not self.artifact.has_risk_features:
+            raise RuntimeError('The loaded model has no environmental risk features')
+        arrays = read_risk_events(events) if isinstance(events, str) else parse_risk_events(events)
+        added = self.artifact.risk_index.insert(**arrays)
+        if self.cache is not None:
+            self.cache.set_version(self._cache_version())
+        return added
+
+    def resolve_coordinates(self, frame):
+        """Fill the location column of a property DataFrame from its lat/lng columns where it is missing"""
+        import numpy as np
+
+        if 'lat' not in frame.columns or 'lng' not in frame.columns:
+            return frame
+        if 'location' in frame.columns:
+            locations = frame['location'].to_numpy(dtype=object).copy()
+            missing = frame['location'].isna().to_numpy()
+            if not missing.any():
+                return frame
+        else:
+            locations = np.full(len(frame), UNKNOWN_LOCATION_NAME, dtype=object)
+            missing = np.ones(len(frame), dtype=bool)
+
+        geo_index = self.geo_index or self.enable_geo()
+        names = geo_index.locations(frame['lat'].to_numpy(dtype=np.float64)[missing],
+                                    frame['lng'].to_numpy(dtype=np.float64)[missing])
+        names[names == None] = UNKNOWN_LOCATION_NAME  # noqa: E711 (elementwise comparison)
+        locations[missing] = names
+        return frame.assign(location=locations)
+
+    def predict_batch_parallel(self, data, workers=None, chunk_size=50000):
+        """predict_batch spread over a pool of worker processes sharing this loaded model.
+
+        Returns (results, stats); stats has throughput plus per-worker and per-chunk timings.
+        """
+        from parallel_scoring import ParallelScorer
+
+        if not self.is_trained:
+            log("Model not loaded. Please ensure your trained model is available.")
+            return None, None
+
+        with ParallelScorer(self, workers=workers, chunk_size=chunk_size) as scorer:
+            return scorer.score(data)
+
+    def _predict_chunk(self, chunk, stages=NO_STAGES):
+        """Score one chunk with a single scaler and booster call"""
+        import numpy as np
+        import pandas as pd
+
+        locations = chunk['location'].to_numpy(dtype=object)
+        input_data = chunk[['floors', 'area', 'bedrooms', 'bathrooms', 'age']].reset_index(drop=True)
+        stages.mark('frame')
+
+        # Same encoding rules as predict_price, unknown locations fall back to code 0
+        if self.artifact is not None:
+            codes = pd.Index(list(self.artifact.location_codes)).get_indexer(locations)
+            codes[codes < 0] = self.artifact.UNKNOWN_LOCATION
+            columns = {column: input_data[column].to_numpy() for column in input_data.columns}
+            if self.artifact.has_risk_features:
+                columns.update(self.risk_columns(
+                    *(chunk[column].to_numpy(dtype=np.float64, na_value=np.nan) if column in chunk.columns
+                      else np.full(len(chunk), np.nan) for column in ('lat', 'lng')),
+                    locations
+                ))
+            features = self.artifact.build_features(location_encoded=codes, **columns)
+            stages.mark('encode')
+            if self.table is not None:
+                # Rows on the table's grid skip the booster; the rest fall back to it
+                predicted, hits = self.table.lookup_batch(columns, locations)
+                stages.note('tableHits', int(hits.sum()))
+                stages.note('tableMisses', int(len(hits) - hits.sum()))
+                stages.mark('table')
+                if not hits.all():
+                    predicted[~hits] = self.artifact.predict(features[~hits])
+                    stages.mark('model')
+            else:
+                predicted = self.artifact.predict(features)
+                stages.mark('model')
+        else:
+            if self.label_encoders and 'location' in self.label_encoders:
+                codes = pd.Index(self.label_encoders['location'].classes_).get_indexer(locations)
+                codes[codes < 0] = 0
+                input_data['location_encoded'] = codes
+            else:
+                input_data['location'] = locations
+            stages.mark('encode')
+
+            if self.scaler:
+                input_scaled = self.scaler.transform(input_data)
+            else:
+                input_scaled = input_data.values
+            stages.mark('scale')
+
+            predicted = self.model.predict(input_scaled)
+            stages.mark('model')
+
+        floors = input_data['floors'].to_numpy()
+        area = input_data['area'].to_numpy()
+        bedrooms = input_data['bedrooms'].to_numpy()
+        bathrooms = input_data['bathrooms'].to_numpy()
+        age = input_data['age'].to_numpy()
+        known = pd.Index(list(self.location_multipliers.keys())).get_indexer(locations) >= 0
+        stages.note('unknownLocations', int(len(known) - known.sum()))
+        multipliers = _location_lookup(locations, self.location_multipliers, 1.5)
+        growth = _location_lookup(locations, self.growth_rates, 0.03)
+
+        results = pd.DataFrame({
+            'currentPrice': np.trunc(predicted).astype(np.int64),
+            'confidence': self._calculate_confidence_batch(floors, area, bedrooms, bathrooms, age, known),
+            'marketTrend': np.where(growth > 0.04, 'increasing', np.where(growth > 0.02, 'stable', 'decreasing')),
+            'locationScore': np.where(
+                known, np.clip(np.trunc(70 + (multipliers - 1.5) * 20), 70, 100), 75
+            ).astype(np.int64)
+        })
+        stages.mark('market')
+
+        if self.explanation_mode() == 'contributions':
+            # One pred_contribs call explains the whole chunk
+            impacts = self.explainer().impacts(features).T
+        else:
+            impacts = [
+                _round_impacts(impact) for impact in (
+                    multipliers,
+                    area / 1000,
+                    1 + (bedrooms - 2) * 0.15,
+                    1 + (bathrooms - 1) * 0.1,
+                    np.maximum(0.7, 1 - (age * 0.01)),
+                    1 + (floors - 1) * 0.05
+                )
+            ]
+        for (_, column, _), impact in zip(FACTOR_COLUMNS, impacts):
+            results[column] = impact
+        stages.mark('factors')
+        return results
+
+    def _calculate_confidence_batch(self, floors, area, bedrooms, bathrooms, age, known_location):
+        """Vectorized _calculate_confidence over column arrays"""
+        import numpy as np
+
+        confidence = np.full(len(floors), 85, dtype=np.int64)
+        confidence += 5 * ((floors >= 1) & (floors <= 20))
+        confidence += 5 * ((area >= 500) & (area <= 5000))
+        confidence += 5 * ((bedrooms >= 1) & (bedrooms <= 5))
+        confidence += 5 * ((bathrooms >= 1) & (bathrooms <= 4))
+        confidence += 5 * ((age >= 0) & (age <= 50))
+        confidence += 5 * known_location
+        return np.minimum(100, confidence)
+
+    @staticmethod
+    def batch_to_records(results, top_k=None):
+        """Convert a predict_batch result into the list of dicts predict_price returns.
+
+        With top_k, each record keeps only its top_k strongest factors, as predict_price does.
+        """
+        from explanations import top_factor_order
+
+        impacts = results[[column for _, column, _ in FACTOR_COLUMNS]].to_numpy(dtype=float)
+        order = top_factor_order(impacts, top_k) if top_k else None
+        records = []
+        for position, row in enumerate(results.itertuples(index=False)):
+            row = row._asdict()
+            factors = order[position] if order is not None else range(len(FACTOR_COLUMNS))
+            records.append({
+                'currentPrice': int(row['currentPrice']),
+                'confidence': int(row['confidence']),
+                'marketTrend': row['marketTrend'],
+                'locationScore': int(row['locationScore']),
+                'factors': [
+                    {'name': FACTOR_COLUMNS[factor][0], 'impact': float(impacts[position, factor]),
+                     'description': FACTOR_COLUMNS[factor][2]}
+                    for factor in factors
+                ]
+            })
+        return records
+    
+    def forecast_engine(self, paths=2000, seed=42, volatility=0.03):
+        """Monte Carlo forecast engine over this model's growth rates"""
+        from forecast_engine import ForecastEngine
+        return ForecastEngine(self.growth_rates, paths=paths, seed=seed, volatility=volatility)
+
+    def generate_forecast(self, current_price, location, years=10, paths=2000, seed=42):
+        """Generate price forecast for the next N years: median price plus a p10-p90 band per year"""
+        engine = self.forecast_engine(paths=paths, seed=seed)
+        bands = engine.simulate([current_price], [location], years)
+        return engine.to_records(current_price, bands)
+
+    def forecast_portfolio(self, prices, locations, years=10, paths=2000, seed=42):
+        """p10/p50/p90 price bands as (properties, years) arrays for a whole portfolio"""
+        return self.forecast_engine(paths=paths, seed=seed).simulate(prices, locations, years)
     
     def _calculate_confidence(self, floors, area, bedrooms, bathrooms, age, location):
         """Calculate prediction confidence based on input quality"""
@@ -264,7 +664,72 @@ class RealEstatePredictor:
             'description': 'Property age'
         })
         
+        # Floors factor
+        floor_mult = 1 + (floors - 1) * 0.05
+        factors.append({
+            'name': 'Floors',
+            'impact': round(floor_mult, 2),
+            'description': 'Number of floors'
+        })
+        
         return factors
+
+    def configure_explanations(self, mode='heuristic', top_k=None, baseline='average', exact=False):
+        """Choose how prediction factors are explained.
+
+        mode 'heuristic' (the default) reports the fixed per-factor multipliers and
+        'contributions' the booster's per-feature contributions (needs a model artifact and
+        xgboost, whichever engine predicts). top_k keeps only the strongest
+        factors; baseline is 'average' or 'location' (see ContributionExplainer). exact uses
+        exact TreeSHAP instead of the much faster decision-path contributions.
+        """
+        from explanations import EXPLANATION_BASELINES
+
+        if mode not in EXPLANATION_MODES:
+            raise ValueError(f"Unknown explanation mode: {mode}")
+        if baseline not in EXPLANATION_BASELINES:
+            raise ValueError(f"Unknown explanation baseline: {baseline}")
+        self.explanations = {'mode': mode, 'top_k': int(top_k) if top_k else None, 'baseline': baseline,
+                             'exact': bool(exact)}
+        self._explainer = None
+        if self.cache is not None:
+            self.cache.set_version(self._cache_version())
+
+    def explanation_mode(self):
+        """'contributions' or 'heuristic'; independent of the engine evaluating the model"""
+        return self.explanations['mode']
+
+    def explainer(self):
+        """The ContributionExplainer of the loaded model, created on first use"""
+        from functools import partial
+        from explanations import ContributionExplainer
+
+        if self._explainer is None:
+            if self.artifact is None:
+                raise RuntimeError('Contribution explanations need a model artifact, not a legacy pickle')
+            self._explainer = ContributionExplainer(
+                partial(self.artifact.contributions, approximate=not self.explanations['exact']),
+                self.artifact.feature_columns, FACTOR_FEATURES, self.artifact.feature_means,
+                baseline=self.explanations['baseline']
+            )
+        return self._explainer
+
+    def _cache_version(self):
+        """Cached predictions depend on the model and on how their factors are explained"""
+        if self.model_version is None:
+            return None
+        settings = self.explanations
+        mode = self.explanation_mode()
+        if mode == 'contributions':
+            mode += ':exact' if settings['exact'] else ':approx'
+        version = f"{self.model_version}:{mode}:{settings['baseline']}:{settings['top_k'] or 'all'}"
+        if self.table is not None:
+            # Interpolated table answers differ slightly from the booster's
+            version += f":table{self.table.manifest['created']}:{'interp' if self.table.interpolate else 'exact'}"
+        if self.artifact is not None and self.artifact.has_risk_features:
+            # Risk events added after loading change predictions
+            version += f":risk{self.artifact.risk_index.generation}"
+        return version
     
     def save_model(self, filepath='model.pkl'):
         """Save the trained model to file"""
@@ -278,16 +743,27 @@ class RealEstatePredictor:
             }
             with open(filepath, 'wb') as f:
                 pickle.dump(model_data, f)
-            print(f"Model saved to {filepath}")
+            log(f"Model saved to {filepath}")
     
-    def load_model(self, filepath='model.pkl'):
-        """Load a trained model from file"""
+    def load_model(self, filepath=None, engine='auto', shard_memory_mb=512):
+        """Load a trained model from an artifact or sharded model directory, or a legacy pickle file.
+
+        engine only applies to artifacts: 'xgboost', 'numpy' (flattened trees, no xgboost import)
+        or 'auto' (xgboost when it is installed). shard_memory_mb caps the market shards kept loaded.
+        """
+        filepath = filepath or default_model_path()
         try:
+            if os.path.isdir(filepath):
+                return self._load_artifact(filepath, engine, shard_memory_mb)
+
             with open(filepath, 'rb') as f:
                 model_data = pickle.load(f)
             
             # Load your pre-trained model
             self.model = model_data['model']
+            self.artifact = None
+            self.model_version = None
+            self.table = None
             
             # Load preprocessors if they exist in your model file
             if 'label_encoders' in model_data:
@@ -302,73 +778,485 @@ class RealEstatePredictor:
                 self.growth_rates = model_data['growth_rates']
             
             self.is_trained = True
+            self._explainer = None
+            self._merge_market_tables()
+            if self.cache is not None:
+                self.cache.set_version(None)
             
-            print(f"Pre-trained model loaded from {filepath}")
+            log(f"Pre-trained model loaded from {filepath}")
             return True
         except FileNotFoundError:
-            print(f"Model file {filepath} not found. Please ensure your trained model is in the correct location.")
+            log(f"Model file {filepath} not found. Please ensure your trained model is in the correct location.")
             return False
         except Exception as e:
-            print(f"Error loading model: {e}")
+            log(f"Error loading model: {e}")
             return False
 
+    def enable_geo(self, path=None):
+        """Load the market index (markets.json by default) that resolves coordinates to locations"""
+        from geo_index import GeoIndex, DEFAULT_MARKETS_FILE
+
+        self.geo_index = GeoIndex.from_file(path or DEFAULT_MARKETS_FILE)
+        self._merge_market_tables()
+        return self.geo_index
+
+    def _merge_market_tables(self):
+        """Markets of the geo index fill in multipliers and growth rates the model does not define"""
+        if self.geo_index is None:
+            return
+        multipliers, growth_rates = self.geo_index.market_tables()
+        self.location_multipliers = {**multipliers, **self.location_multipliers}
+        self.growth_rates = {**growth_rates, **self.growth_rates}
+
+    def enable_cache(self, max_entries=10000, ttl=3600, path=None):
+        """Memoize predict_price results; path adds a sqlite tier shared between processes"""
+        from prediction_cache import PredictionCache
+
+        if self.cache is not None:
+            self.cache.close()
+        self.cache = PredictionCache(max_entries=max_entries, ttl=ttl, path=path)
+        self.cache.set_version(self._cache_version())
+        return self.cache
+
+    def enable_table(self, path='auto', interpolate=False, max_rel_error=None):
+        """Answer predictions from a valuation table built by create_model.py precompute.
+
+        path is the table directory, or 'auto' for the valuation_table directory inside the model
+        artifact. The table follows the model: it is (re)loaded with every artifact and dropped
+        when it was built for another model version. By default only properties on grid points
+        are answered from the table, so answers equal the model's. interpolate=True also
+        interpolates between grid points, unless the table's measured maxRelError exceeds
+        max_rel_error (default valuation_table.DEFAULT_MAX_REL_ERROR); such properties are then
+        left to the model. Returns the loaded table or None.
+        """
+        from valuation_table import DEFAULT_MAX_REL_ERROR
+
+        self.table_settings = {'path': path, 'interpolate': bool(interpolate),
+                               'max_rel_error': DEFAULT_MAX_REL_ERROR if max_rel_error is None else max_rel_error}
+        self._load_table()
+        if self.cache is not None:
+            self.cache.set_version(self._cache_version())
+        return self.table
+
+    def _load_table(self):
+        """Map the valuation table of the loaded artifact, if one is configured and matches it"""
+        from valuation_table import ValuationTable, DEFAULT_TABLE_DIR
+
+        self.table = None
+        if self.table_settings is None or self.artifact is None:
+            return
+        if self.artifact.has_risk_features:
+            log("Valuation tables do not cover environmental risk features; using the model")
+            return
+        settings = self.table_settings
+        directory = settings['path']
+        if directory == 'auto':
+            directory = os.path.join(self.artifact.path, DEFAULT_TABLE_DIR)
+        try:
+            self.table = ValuationTable(directory, model_version=self.artifact.version,
+                                        interpolate=settings['interpolate'], max_rel_error=settings['max_rel_error'])
+        except (OSError, ValueError) as e:
+            log(f"Valuation table not used: {e}")
+            return
+        errors = self.table.errors or {}
+        if self.table.interpolation_refused:
+            log(f"Warning: valuation table interpolation error {errors.get('maxRelError', 'unknown')} exceeds the "
+                f"tolerance {settings['max_rel_error']}; properties between grid points are scored by the model")
+        mode = 'interpolated' if self.table.interpolate else 'exact grid points only'
+        log(f"Valuation table loaded from {directory} ({mode}, max error {errors.get('maxAbsError', 'unknown')})")
+
+    def enable_metrics(self, window=2048):
+        """Record per-stage latencies and request counters; disabled predictors skip all timing"""
+        from prediction_metrics import PredictorMetrics
+
+        self.metrics = PredictorMetrics(window=window)
+        return self.metrics
+
+    def _stages(self, operation):
+        """Stage timer for one predict_price / predict_batch call (a no-op while metrics are off)"""
+        if self.metrics is None:
+            return NO_STAGES
+        return self.metrics.stages(operation)
+
+    def warm_up(self):
+        """Load anything the model reads lazily (e.g. the artifact's booster) before the first request"""
+        if not self.is_trained:
+            return False
+        if self.artifact is not None:
+            self.artifact.warm_up()
+        return True
+
+    def _load_artifact(self, directory, engine='auto', shard_memory_mb=512):
+        """Load a versioned model artifact (or sharded model) directory written by create_model.py"""
+        from model_artifact import ModelArtifact
+        from market_shards import ShardedModel, is_sharded
+
+        if is_sharded(directory):
+            self.artifact = ShardedModel(directory, engine=engine, max_memory_mb=shard_memory_mb)
+        else:
+            self.artifact = ModelArtifact(directory, engine=engine)
+        self.model = self.artifact
+        self.model_version = self.artifact.version
+        self.label_encoders = {}
+        self.scaler = None
+        self.location_multipliers = self.artifact.location_multipliers
+        self.growth_rates = self.artifact.growth_rates
+        self.is_trained = True
+        self._explainer = None
+        self._merge_market_tables()
+        self._load_table()
+        if self.cache is not None:
+            self.cache.set_version(self._cache_version())
+
+        log(f"Model artifact {self.model_version} loaded from {directory}")
+        return True
+
+class PhaseTimer:
+    """Wall-clock time per phase (import, load, compute) for the --timing flag"""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.phases = {'startup': time.perf_counter() - _MODULE_START}
+        # The predictor's PredictorMetrics, whose stage latencies the report includes
+        self.metrics = None
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = self.phases.get(name, 0.0) + time.perf_counter() - started
+
+    def report(self, command):
+        """Print the phases as one JSON line on stderr so stdout stays machine-readable"""
+        if not self.enabled:
+            return
+        timing = {f'{name}_ms': round(seconds * 1000, 2) for name, seconds in self.phases.items()}
+        timing['total_ms'] = round((time.perf_counter() - _MODULE_START) * 1000, 2)
+        if self.metrics is not None:
+            timing['stages'] = self.metrics.snapshot()['stages']
+        print(json.dumps({'timing': dict(command=command, **timing)}), file=sys.stderr)
+
+
+def command_modules(command, model_path=None, engine='auto', explain='heuristic'):
+    """Heavy modules a command needs, so they can be imported (and timed) as one phase"""
+    if command in ('forecast', 'forecast-batch'):
+        return ['numpy', 'forecast_engine']
+
+    model_path = model_path or default_model_path()
+    if os.path.isdir(model_path):
+        modules = ['numpy', 'model_artifact']
+        if command != 'load' and (engine != 'numpy' or explain == 'contributions'):
+            modules.append('xgboost')
+    else:
+        # Unpickling a legacy model imports pandas, scikit-learn and xgboost anyway
+        modules = ['numpy', 'pandas', 'sklearn.preprocessing', 'xgboost']
+
+    if command == 'update':
+        modules += ['pandas', 'sklearn.preprocessing', 'xgboost', 'model_update']
+    if command in ('predict-batch', 'score'):
+        modules.append('pandas')
+    if command == 'score':
+        modules.append('bulk_scoring')
+    if command == 'serve':
+        modules.append('prediction_server')
+    return list(dict.fromkeys(modules))
+
+
+def import_modules(modules):
+    """Import modules up front; optional ones (e.g. xgboost for the numpy engine) may be missing"""
+    for module in modules:
+        try:
+            importlib.import_module(module)
+        except ImportError:
+            pass
+
+
+def build_parser():
+    """Build the command line interface"""
+    parser = argparse.ArgumentParser(
+        prog='predict.py',
+        description='EarthSlight real estate price prediction'
+    )
+    commands = parser.add_subparsers(dest='command', metavar='<command>')
+
+    # Options shared by every command
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--timing', action='store_true',
+                        help='Report import, load and compute time, plus per-stage prediction time, on stderr as JSON')
+    engines = ['auto', 'xgboost', 'numpy']
+
+    # Options of the commands that report prediction factors
+    explain = argparse.ArgumentParser(add_help=False)
+    explain.add_argument('--explain', choices=EXPLANATION_MODES, default='heuristic',
+                         help='Factors from the fixed heuristics (default, any engine) or from booster '
+                              'contributions (opt-in, costs a booster call per chunk)')
+    explain.add_argument('--top-factors', type=int, default=None, help='Report only the strongest factors')
+    explain.add_argument('--explain-baseline', choices=['average', 'location'], default='average',
+                         help='Compare factors against an average property or a typical one in the same market')
+    explain.add_argument('--exact-contributions', action='store_true',
+                         help='Exact TreeSHAP factors (much slower) instead of decision-path contributions')
+
+    table = argparse.ArgumentParser(add_help=False)
+    table.add_argument('--table', nargs='?', const='auto', default=None, metavar='DIR',
+                       help='Answer on-grid properties from a precomputed valuation table '
+                            '(default: the valuation_table directory of the model artifact)')
+    table.add_argument('--table-interpolate', action='store_true',
+                       help='Interpolate between grid points instead of asking the model '
+                            '(only if the table\'s measured error is within --table-max-error)')
+    table.add_argument('--table-max-error', type=float, default=None,
+                       help='Largest relative interpolation error (maxRelError of the table) to serve '
+                            '(default: 0.01)')
+
+    load = commands.add_parser('load', parents=[common], help='Load the pre-trained model')
+    load.add_argument('--model', default=None, help='Model artifact directory or legacy .pkl file')
+
+    predict = commands.add_parser('predict', parents=[common, explain, table], help='Make prediction')
+    predict.add_argument('floors', type=int)
+    predict.add_argument('area', type=int)
+    predict.add_argument('bedrooms', type=int)
+    predict.add_argument('bathrooms', type=int)
+    predict.add_argument('age', type=int)
+    predict.add_argument('location', nargs='?', default=None,
+                         help='Market name, or "lat,lng" (or use --lat/--lng)')
+    predict.add_argument('--lat', type=float, default=None, help='Latitude, resolved to the nearest market')
+    predict.add_argument('--lng', type=float, default=None, help='Longitude, resolved to the nearest market')
+    predict.add_argument('--model', default=None, help='Model artifact directory or legacy .pkl file')
+    # One-shot predictions skip the ~1s xgboost import; the numpy trees give identical results
+    predict.add_argument('--engine', choices=engines, default='numpy', help='Artifact evaluator')
+    predict.add_argument('--cache-db', default=None,
+                         help='sqlite file caching predictions across invocations')
+
+    predict_batch = commands.add_parser('predict-batch', parents=[common, explain, table], help='Predict many properties from a JSON file or stdin')
+    predict_batch.add_argument('input', nargs='?', default='-',
+                               help='JSON list of properties or object of columns (default: stdin)')
+    predict_batch.add_argument('--model', default=None, help='Model artifact directory or legacy .pkl file')
+    predict_batch.add_argument('--engine', choices=engines, default='auto', help='Artifact evaluator')
+    predict_batch.add_argument('--chunk-size', type=int, default=100000, help='Rows per booster call')
+    predict_batch.add_argument('--workers', type=int, default=1, help='Worker processes sharing the model')
+    predict_batch.add_argument('--shard-memory-mb', type=float, default=512,
+                               help='Market shards kept loaded for a sharded model')
+
+    score = commands.add_parser('score', parents=[common, explain, table], help='Stream a property file through the model into a results file')
+    score.add_argument('--input', required=True, help='Properties as .csv, .ndjson/.jsonl or .parquet')
+    score.add_argument('--output', required=True, help='Results as .ndjson or .parquet')
+    score.add_argument('--model', default=None, help='Model artifact directory or legacy .pkl file')
+    score.add_argument('--engine', choices=engines, default='auto', help='Artifact evaluator')
+    score.add_argument('--chunk-size', type=int, default=50000, help='Rows read, scored and written at a time')
+    score.add_argument('--pipeline', action='store_true',
+                       help='Overlap reading, scoring and writing on separate threads')
+    score.add_argument('--queue-depth', type=int, default=2, help='Chunks buffered between pipeline stages')
+    score.add_argument('--workers', type=int, default=1, help='Worker processes sharing the model')
+    score.add_argument('--shard-memory-mb', type=float, default=512,
+                       help='Market shards kept loaded for a sharded model')
+
+    update = commands.add_parser('update', parents=[common],
+                                 help='Continue training the model on new transactions and write a new artifact')
+    update.add_argument('--data', required=True, help='New transactions as .csv, .ndjson/.jsonl or .parquet with a price column')
+    update.add_argument('--model', default=None, help='Model artifact directory to update')
+    update.add_argument('--output', default=None,
+                        help='New artifact directory (default: publish <model>.<version> and atomically repoint --model)')
+    update.add_argument('--rounds', type=int, default=100, help='Boosting rounds added')
+    update.add_argument('--learning-rate', type=float, default=0.1)
+    update.add_argument('--validation-size', type=float, default=0.2, help='Share of new rows held out')
+    update.add_argument('--seed', type=int, default=42)
+    update.add_argument('--nthread', type=int, default=None, help='xgboost threads (default: all cores)')
+
+    forecast = commands.add_parser('forecast', parents=[common], help='Generate forecast')
+    forecast.add_argument('price', type=int)
+    forecast.add_argument('location')
+    forecast.add_argument('years', type=int, nargs='?', default=10)
+    forecast.add_argument('--paths', type=int, default=2000, help='Simulated growth paths')
+    forecast.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    forecast_batch = commands.add_parser('forecast-batch', parents=[common],
+                                         help='Forecast a portfolio from a JSON file or stdin')
+    forecast_batch.add_argument('input', nargs='?', default='-',
+                                help='JSON list of {price, location} or object of columns (default: stdin)')
+    forecast_batch.add_argument('--years', type=int, default=10)
+    forecast_batch.add_argument('--paths', type=int, default=2000, help='Simulated growth paths per property')
+    forecast_batch.add_argument('--seed', type=int, default=42, help='Random seed')
+
+    serve = commands.add_parser('serve', parents=[common, explain, table], help='Serve predictions as newline-delimited JSON on stdin/stdout')
+    serve.add_argument('--model', default=None, help='Model artifact directory or legacy .pkl file')
+    serve.add_argument('--engine', choices=engines, default='auto', help='Artifact evaluator')
+    serve.add_argument('--workers', type=int, default=4, help='Maximum concurrent in-flight predictions')
+    serve.add_argument('--shard-memory-mb', type=float, default=512,
+                       help='Market shards kept loaded for a sharded model')
+    serve.add_argument('--batch-size', type=int, default=1,
+                       help='Coalesce up to this many concurrent predictions into one booster call (1 = off)')
+    serve.add_argument('--batch-wait-ms', type=float, default=2.0,
+                       help='Longest a queued prediction waits for its batch to fill')
+    serve.add_argument('--queue-depth', type=int, default=1024,
+                       help='Queued predictions allowed before new ones are rejected')
+    serve.add_argument('--cache-size', type=int, default=10000,
+                       help='Predictions kept in the in-process LRU cache (0 = no cache)')
+    serve.add_argument('--cache-ttl', type=float, default=3600, help='Seconds a cached prediction stays valid')
+    serve.add_argument('--cache-db', default=None,
+                       help='sqlite file shared by every server process as a second cache tier')
+    serve.add_argument('--no-metrics', action='store_true',
+                       help='Skip per-stage timing and counters (the stats op then reports none)')
+
+    return parser
+
+
 def main():
     """Main function for command line usage"""
-    if len(sys.argv) < 2:
-        print("Usage: python predict.py <command> [args]")
-        print("Commands:")
-        print("  load - Load the pre-trained model")
-        print("  predict <floors> <area> <bedrooms> <bathrooms> <age> <location> - Make prediction")
-        print("  forecast <price> <location> [years] - Generate forecast")
+    parser = build_parser()
+    args = parser.parse_args()
+    if args.command is None:
+        parser.print_help()
         return
-    
-    command = sys.argv[1]
+
+    timer = PhaseTimer(args.timing)
+    try:
+        run_command(args, timer)
+    finally:
+        timer.report(args.command)
+
+def load_for_command(predictor, args, timer):
+    """Load the model and anything it loads lazily, as the 'load' phase"""
+    with timer.phase('load'):
+        return (predictor.load_model(args.model, engine=args.engine,
+                                     shard_memory_mb=getattr(args, 'shard_memory_mb', 512)) and
+                predictor.warm_up())
+
+def run_command(args, timer):
+    """Run one parsed command"""
+    model_path = getattr(args, 'model', None)
+    with timer.phase('import'):
+        import_modules(command_modules(args.command, model_path, getattr(args, 'engine', 'auto'),
+                                       getattr(args, 'explain', 'heuristic')))
+
     predictor = RealEstatePredictor()
+    if hasattr(args, 'explain'):
+        predictor.configure_explanations(args.explain, top_k=args.top_factors, baseline=args.explain_baseline,
+                                         exact=args.exact_contributions)
+    cache_size = getattr(args, 'cache_size', 1)
+    if getattr(args, 'cache_db', None) or (args.command == 'serve' and cache_size > 0):
+        predictor.enable_cache(max_entries=max(1, cache_size), ttl=getattr(args, 'cache_ttl', 3600),
+                               path=args.cache_db)
+    if getattr(args, 'table', None):
+        predictor.enable_table(args.table, interpolate=args.table_interpolate, max_rel_error=args.table_max_error)
+    if args.timing or (args.command == 'serve' and not args.no_metrics):
+        timer.metrics = predictor.enable_metrics()
     
-    if command == 'load':
-        success = predictor.load_model()
+    if args.command == 'load':
+        with timer.phase('load'):
+            success = predictor.load_model(model_path)
         if success:
             print("Pre-trained model loaded successfully!")
         else:
-            print("Failed to load pre-trained model. Please ensure model.pkl exists.")
+            log("Failed to load pre-trained model. Please ensure model_artifact/ or model.pkl exists.")
+            sys.exit(1)
     
-    elif command == 'predict':
-        if len(sys.argv) < 8:
-            print("Usage: python predict.py predict <floors> <area> <bedrooms> <bathrooms> <age> <location>")
-            return
-        
+    elif args.command == 'predict':
+        if args.location is None and (args.lat is None or args.lng is None):
+            log("Give a location or both --lat and --lng.")
+            sys.exit(1)
         # Load model first
-        if not predictor.load_model():
-            print("Failed to load model. Cannot make prediction.")
-            return
+        if not load_for_command(predictor, args, timer):
+            log("Failed to load model. Cannot make prediction.")
+            sys.exit(1)
         
-        floors = int(sys.argv[2])
-        area = int(sys.argv[3])
-        bedrooms = int(sys.argv[4])
-        bathrooms = int(sys.argv[5])
-        age = int(sys.argv[6])
-        location = sys.argv[7]
-        
-        result = predictor.predict_price(floors, area, bedrooms, bathrooms, age, location)
-        if result:
-            print(json.dumps(result, indent=2))
+        with timer.phase('compute'):
+            result = predictor.predict_price(args.floors, args.area, args.bedrooms, args.bathrooms, args.age,
+                                             args.location, lat=args.lat, lng=args.lng)
+        if not result:
+            log("Prediction failed. Check model and input data.")
+            sys.exit(1)
+        # One line: callers parse the last line of stdout
+        print(json.dumps(result))
+    
+    elif args.command == 'predict-batch':
+        if not load_for_command(predictor, args, timer):
+            log("Failed to load model. Cannot make prediction.")
+            sys.exit(1)
+
+        if args.input == '-':
+            properties = json.load(sys.stdin)
         else:
-            print("Prediction failed. Check model and input data.")
+            with open(args.input) as f:
+                properties = json.load(f)
+
+        with timer.phase('compute'):
+            if args.workers > 1:
+                results, stats = predictor.predict_batch_parallel(
+                    properties, workers=args.workers, chunk_size=args.chunk_size
+                )
+                print(json.dumps({'parallel': stats}), file=sys.stderr)
+            else:
+                results = predictor.predict_batch(properties, chunk_size=args.chunk_size)
+        if results is None:
+            log("Prediction failed. Check model and input data.")
+            sys.exit(1)
+        print(json.dumps(predictor.batch_to_records(results, top_k=args.top_factors)))
     
-    elif command == 'forecast':
-        if len(sys.argv) < 4:
-            print("Usage: python predict.py forecast <price> <location> [years]")
-            return
-        
-        price = int(sys.argv[2])
-        location = sys.argv[3]
-        years = int(sys.argv[4]) if len(sys.argv) > 4 else 10
-        
-        forecast = predictor.generate_forecast(price, location, years)
-        print(json.dumps(forecast, indent=2))
+    elif args.command == 'score':
+        from bulk_scoring import score_file
+        if not load_for_command(predictor, args, timer):
+            log("Failed to load model. Cannot make prediction.")
+            sys.exit(1)
+
+        with timer.phase('compute'):
+            stats = score_file(
+                predictor, args.input, args.output,
+                chunk_size=args.chunk_size, pipeline=args.pipeline, queue_depth=args.queue_depth,
+                workers=args.workers
+            )
+        print(json.dumps(stats))
     
-    else:
-        print(f"Unknown command: {command}")
+    elif args.command == 'update':
+        with timer.phase('load'):
+            loaded = predictor.load_model(model_path, engine='xgboost')
+        if not loaded:
+            log("Failed to load model. Cannot update.")
+            sys.exit(1)
+        with timer.phase('compute'):
+            report = predictor.update_model(
+                args.data, output_dir=args.output, rounds=args.rounds, learning_rate=args.learning_rate,
+                validation_size=args.validation_size, seed=args.seed, nthread=args.nthread
+            )
+        print(json.dumps(report))
+    
+    elif args.command == 'forecast':
+        with timer.phase('compute'):
+            forecast = predictor.generate_forecast(args.price, args.location, args.years, paths=args.paths,
+                                                   seed=args.seed)
+        print(json.dumps(forecast))
+
+    elif args.command == 'forecast-batch':
+        if args.input == '-':
+            portfolio = json.load(sys.stdin)
+        else:
+            with open(args.input) as f:
+                portfolio = json.load(f)
+        if isinstance(portfolio, list):
+            prices = [item['price'] for item in portfolio]
+            locations = [item['location'] for item in portfolio]
+        else:
+            prices, locations = portfolio['price'], portfolio['location']
+
+        # Written chunk by chunk so the whole book never sits in memory as records
+        with timer.phase('compute'):
+            engine = predictor.forecast_engine(paths=args.paths, seed=args.seed)
+            separator = '['
+            for start, stop, bands in engine.iter_bands(prices, locations, args.years):
+                for row in range(stop - start):
+                    sys.stdout.write(separator + json.dumps(engine.to_records(prices[start + row], bands, row)))
+                    separator = ','
+            print(']' if separator == ',' else '[]')
+
+    elif args.command == 'serve':
+        from prediction_server import serve
+        with timer.phase('serve'):
+            served = serve(predictor, model_path, workers=args.workers, engine=args.engine,
+                           shard_memory_mb=args.shard_memory_mb,
+                           batch_size=args.batch_size, batch_wait_ms=args.batch_wait_ms,
+                           queue_depth=args.queue_depth)
+        if not served:
+            sys.exit(1)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Micro-batching request coalescer
+Collects concurrent single-property predictions and scores them with one predict_batch call
+"""
+
+import time
+import asyncio
+from collections import deque
+
+from prediction_metrics import NO_STAGES
+
+PROPERTY_FIELDS = ('floors', 'area', 'bedrooms', 'bathrooms', 'age', 'location')
+
+# lat/lng of a queued property whose coordinates the model does not use
+NAN = float('nan')
+
+
+class QueueFullError(Exception):
+    """Raised when a request arrives while max_queue_depth requests are already waiting"""
+
+
+def _percentiles(samples):
+    """p50/p95/p99 in milliseconds of a window of durations in seconds"""
+    if not samples:
+        return {'p50': None, 'p95': None, 'p99': None}
+    ordered = sorted(samples)
+
+    def pick(fraction):
+        return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 3)
+
+    return {'p50': pick(0.50), 'p95': pick(0.95), 'p99': pick(0.99)}
+
+
+class PredictionBatcher:
+    """asyncio front end that coalesces predict_price-style requests into batched booster calls.
+
+    A batch is flushed as soon as max_batch_size requests are queued or the oldest queued
+    request has waited max_wait_ms, whichever comes first. Up to max_concurrent_batches batches
+    are scored at once; while all slots are busy, new requests keep filling the next batch.
+    Each caller gets back the same dict predict_price would have returned for its property, and
+    is recorded in the predictor's metrics like a predict_price call: as a 'predict' request
+    with its cache hit or miss, whose 'batched' stage covers the wait for its batch.
+    """
+
+    def __init__(self, predictor, max_batch_size=64, max_wait_ms=2.0, max_queue_depth=1024,
+                 executor=None, max_concurrent_batches=1, window=10000):
+        self.predictor = predictor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000
+        self.max_queue_depth = max(1, int(max_queue_depth))
+        self.executor = executor
+        self.max_concurrent_batches = max(1, int(max_concurrent_batches))
+
+        self._pending = deque()
+        self._has_items = None
+        self._batch_full = None
+        self._slots = None
+        self._flushes = set()
+        self._task = None
+        self._closing = False
+
+        self.requests = 0
+        self.rejected = 0
+        self.batches = 0
+        self.failed_batches = 0
+        self.batched_rows = 0
+        self._queue_times = deque(maxlen=window)
+        self._compute_times = deque(maxlen=window)
+
+    async def start(self):
+        self._has_items = asyncio.Event()
+        self._batch_full = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrent_batches)
+        self._closing = False
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Flush everything still queued, then stop the flush loop"""
+        self._closing = True
+        if self._has_items is not None:
+            self._has_items.set()
+            self._batch_full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+        if self._flushes:
+            await asyncio.gather(*self._flushes, return_exceptions=True)
+
+    async def predict(self, floors, area, bedrooms, bathrooms, age, location, lat=None, lng=None):
+        """Queue one property and wait for its prediction"""
+        if self._task is None or self._closing:
+            raise RuntimeError('Batcher is not running')
+        metrics = self.predictor.metrics
+        stages = NO_STAGES if metrics is None else metrics.stages('predict')
+        row = (int(floors), int(area), int(bedrooms), int(bathrooms), int(age), str(location))
+        # Coordinates only matter to models with environmental risk features
+        point = self.predictor.risk_point(location, lat, lng)
+        stages.mark('resolve')
+        cache = self.predictor.cache
+        if cache is not None:
+            key = cache.key(*row, point)
+            cached = cache.get(key)
+            stages.mark('cache')
+            if cached is not None:
+                stages.note('cacheHits')
+                stages.finish()
+                return cached
+            stages.note('cacheMisses')
+        if len(self._pending) >= self.max_queue_depth:
+            self.rejected += 1
+            stages.finish(error=True)
+            raise QueueFullError(f"Prediction queue is full ({self.max_queue_depth} requests waiting)")
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row + (point or (NAN, NAN)), future, loop.time()))
+        self.requests += 1
+        self._has_items.set()
+        if len(self._pending) >= self.max_batch_size:
+            self._batch_full.set()
+        try:
+            result = await future
+        except Exception:
+            stages.mark('batched')
+            stages.finish(error=True)
+            raise
+        stages.mark('batched')
+        if cache is not None:
+            cache.put(key, result)
+        stages.finish()
+        return result
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self._pending:
+                if self._closing:
+                    return
+                self._has_items.clear()
+                await self._has_items.wait()
+                continue
+
+            # Wait for a full batch or the oldest request's deadline
+            deadline = self._pending[0][2] + self.max_wait
+            while len(self._pending) < self.max_batch_size and not self._closing:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                self._batch_full.clear()
+                try:
+                    await asyncio.wait_for(self._batch_full.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+
+            # Requests arriving while every slot is busy join this batch
+            await self._slots.acquire()
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch_size, len(self._pending)))]
+            flush = loop.create_task(self._flush(batch, loop))
+            self._flushes.add(flush)
+            flush.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch, loop):
+        try:
+            await self._score_batch(batch, loop)
+        finally:
+            self._slots.release()
+
+    async def _score_batch(self, batch, loop):
+        flushed_at = loop.time()
+        for _, _, enqueued_at in batch:
+            self._queue_times.append(flushed_at - enqueued_at)
+
+        columns = {field: [row[index] for row, _, _ in batch]
+                   for index, field in enumerate(PROPERTY_FIELDS + ('lat', 'lng'))}
+        started = time.perf_counter()
+        try:
+            records = await loop.run_in_executor(self.executor, self._score, columns)
+        except Exception as e:
+            self.failed_batches += 1
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finally:
+            self._compute_times.append(time.perf_counter() - started)
+
+        self.batches += 1
+        self.batched_rows += len(batch)
+        for (_, future, _), record in zip(batch, records):
+            if not future.done():
+                future.set_result(record)
+
+    def _score(self, columns):
+        results = self.predictor.predict_batch(columns, chunk_size=self.max_batch_size)
+        if results is None:
+            raise RuntimeError('Prediction failed. Check model and input data.')
+        return self.predictor.batch_to_records(results, top_k=self.predictor.explanations['top_k'])
+
+    def metrics(self):
+        """Counters plus queue-time and compute-time percentiles (ms) over the recent window"""
+        return {
+            'maxBatchSize': self.max_batch_size,
+            'maxWaitMs': self.max_wait * 1000,
+            'maxQueueDepth': self.max_queue_depth,
+            'queueDepth': len(self._pending),
+            'requests': self.requests,
+            'rejected': self.rejected,
+            'batches': self.batches,
+            'failedBatches': self.failed_batches,
+            'meanBatchSize': round(self.batched_rows / self.batches, 2) if self.batches else None,
+            'queueTimeMs': _percentiles(self._queue_times),
+            'computeTimeMs': _percentiles(self._compute_times)
+        }
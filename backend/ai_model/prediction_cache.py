@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Prediction cache
+In-process LRU with a TTL in front of predict_price, optionally backed by a sqlite file shared between processes
+"""
+
+import json
+import math
+import time
+import sqlite3
+import threading
+from collections import OrderedDict
+
+
+def _normalize(value):
+    """2, 2.0 and numpy integers all map to the same key"""
+    if isinstance(value, str):
+        return value
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+
+def cache_key(floors, area, bedrooms, bathrooms, age, location, point=None):
+    """Normalized feature tuple; identical keys always produce identical predictions.
+
+    point is the (lat, lng) of models whose predictions depend on coordinates (risk features).
+    """
+    key = (
+        _normalize(floors), _normalize(area), _normalize(bedrooms), _normalize(bathrooms), _normalize(age),
+        str(location)
+    )
+    if point is None:
+        return key
+    # NaN never equals itself, so coordinates that are missing are keyed as None
+    return key + tuple(round(value, 6) if math.isfinite(value) else None for value in point)
+
+
+class SqliteTier:
+    """Prediction store in a sqlite file (WAL mode) that several worker processes can share"""
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=5, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS predictions ('
+            'version TEXT NOT NULL, key TEXT NOT NULL, expires REAL NOT NULL, value TEXT NOT NULL, '
+            'PRIMARY KEY (version, key))'
+        )
+
+    def get(self, version, key):
+        with self._lock:
+            row = self._db.execute(
+                'SELECT value FROM predictions WHERE version = ? AND key = ? AND expires > ?',
+                (version, key, time.time())
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, version, key, value):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO predictions (version, key, expires, value) VALUES (?, ?, ?, ?)',
+                (version, key, time.time() + self.ttl, value)
+            )
+
+    def purge(self, keep_version=None):
+        """Drop expired rows and, with keep_version, rows of every other model version"""
+        with self._lock:
+            if keep_version is None:
+                deleted = self._db.execute('DELETE FROM predictions WHERE expires <= ?', (time.time(),))
+            else:
+                deleted = self._db.execute(
+                    'DELETE FROM predictions WHERE expires <= ? OR version != ?', (time.time(), keep_version)
+                )
+            return deleted.rowcount
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class PredictionCache:
+    """LRU + TTL cache of predict_price results keyed on the feature tuple and model version.
+
+    Values are stored as JSON, so every hit returns a fresh dict. With path set, misses fall
+    through to a sqlite file shared by every process using the same path; that tier is only
+    used when the model has a version (artifacts), since legacy pickles cannot be told apart.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, path=None):
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = float(ttl)
+        self.version = None
+        self.disk = SqliteTier(path, self.ttl) if path else None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    key = staticmethod(cache_key)
+
+    def set_version(self, version):
+        """Point the cache at a newly loaded model; entries of any other model are dropped"""
+        with self._lock:
+            if version is not None and version == self.version:
+                return
+            self.version = version
+            if self._entries:
+                self._entries.clear()
+                self.invalidations += 1
+        if self.disk is not None:
+            # Other versions' rows are never read again and expire with the TTL
+            self.disk.purge()
+
+    def get(self, key):
+        """Cached result dict for a cache_key(), or None"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, value = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return json.loads(value)
+                del self._entries[key]
+                self.expirations += 1
+            version = self.version
+
+        if self.disk is not None and version is not None:
+            value = self.disk.get(version, json.dumps(key))
+            if value is not None:
+                with self._lock:
+                    self.disk_hits += 1
+                    self._store(key, value, now)
+                return json.loads(value)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, result):
+        value = json.dumps(result, separators=(',', ':'))
+        with self._lock:
+            self._store(key, value, time.monotonic())
+            version = self.version
+        if self.disk is not None and version is not None:
+            self.disk.put(version, json.dumps(key), value)
+
+    def _store(self, key, value, now):
+        self._entries[key] = (now + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'maxEntries': self.max_entries,
+                'ttl': self.ttl,
+                'modelVersion': self.version,
+                'hits': self.hits,
+                'diskHits': self.disk_hits,
+                'misses': self.misses,
+                'hitRate': round((self.hits + self.disk_hits) / lookups, 4) if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'disk': self.disk.path if self.disk else None
+            }
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
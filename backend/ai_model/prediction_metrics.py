@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Prediction metrics
+Per-stage latency histograms and counters for RealEstatePredictor, exported as JSON or in the
+Prometheus text format
+"""
+
+import time
+import threading
+from bisect import bisect_left
+from collections import deque
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4'
+
+# Upper bounds in seconds; one prediction stage ranges from tens of microseconds to seconds
+STAGE_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                 1.0, 2.5, 10.0)
+
+# counter -> (Prometheus metric, help text)
+COUNTERS = {
+    'requests': ('earthslight_predictions_total', 'Single predictions requested'),
+    'batchRequests': ('earthslight_batch_predictions_total', 'predict_batch calls'),
+    'batchRows': ('earthslight_batch_rows_total', 'Rows scored by predict_batch'),
+    'errors': ('earthslight_prediction_errors_total', 'Predictions that raised an error'),
+    'unknownLocations': ('earthslight_unknown_locations_total', 'Properties in a location the model does not know'),
+    'cacheHits': ('earthslight_cache_hits_total', 'Single predictions answered from the cache'),
+    'cacheMisses': ('earthslight_cache_misses_total', 'Single predictions the cache could not answer'),
+    'tableHits': ('earthslight_table_hits_total', 'Properties answered from the valuation table'),
+    'tableMisses': ('earthslight_table_misses_total', 'Properties off the valuation table grid, scored by the model')
+}
+
+
+class LatencyHistogram:
+    """Cumulative bucket counts since start (a Prometheus histogram) plus a rolling window of
+    the most recent samples for percentiles"""
+
+    def __init__(self, buckets=STAGE_BUCKETS, window=2048):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.recent.append(seconds)
+
+    def summary(self):
+        """Count, mean and recent p50/p95/p99 in milliseconds"""
+        ordered = sorted(self.recent)
+
+        def pick(fraction):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(fraction * len(ordered)))] * 1000, 4)
+
+        return {
+            'count': self.count,
+            'meanMs': round(self.sum / self.count * 1000, 4) if self.count else None,
+            'p50Ms': pick(0.50),
+            'p95Ms': pick(0.95),
+            'p99Ms': pick(0.99)
+        }
+
+
+class StageTimer:
+    """Times the consecutive stages of one call: mark(stage) closes the stage that just ran.
+
+    A stage marked several times (e.g. once per chunk) is summed. finish() records the stages,
+    a 'total' and the noted counters in the PredictorMetrics the timer came from.
+    """
+
+    __slots__ = ('metrics', 'operation', 'started', 'last', 'stages', 'counters')
+
+    def __init__(self, metrics, operation):
+        self.metrics = metrics
+        self.operation = operation
+        self.started = self.last = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + now - self.last
+        self.last = now
+
+    def note(self, counter, amount=1):
+        self.counters[counter] = self.counters.get(counter, 0) + amount
+
+    def finish(self, error=False):
+        self.stages['total'] = self.last - self.started if self.stages else time.perf_counter() - self.started
+        if error:
+            self.note('errors')
+        self.metrics.record(self)
+
+
+class _NoStages:
+    """Stand-in StageTimer while metrics are disabled: every call is a no-op"""
+
+    __slots__ = ()
+
+    def mark(self, stage):
+        pass
+
+    def note(self, counter, amount=1):
+        pass
+
+    def finish(self, error=False):
+        pass
+
+
+NO_STAGES = _NoStages()
+
+
+class PredictorMetrics:
+    """Thread-safe counters and per-(operation, stage) latency histograms of one predictor.
+
+    operation is 'predict' for predict_price and 'batch' for predict_batch; each call counts
+    as one request of its operation.
+    """
+
+    def __init__(self, window=2048, buckets=STAGE_BUCKETS):
+        self.window = window
+        self.buckets = buckets
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        self.histograms = {}
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+
+    def stages(self, operation):
+        return StageTimer(self, operation)
+
+    def record(self, timer):
+        with self._lock:
+            self.counters['requests' if timer.operation == 'predict' else 'batchRequests'] += 1
+            for counter, amount in timer.counters.items():
+                self.counters[counter] = self.counters.get(counter, 0) + amount
+            for stage, seconds in timer.stages.items():
+                histogram = self.histograms.get((timer.operation, stage))
+                if histogram is None:
+                    histogram = self.histograms[(timer.operation, stage)] = LatencyHistogram(self.buckets, self.window)
+                histogram.observe(seconds)
+
+    def snapshot(self):
+        """JSON-friendly counters and stage latencies"""
+        with self._lock:
+            stages = {}
+            for (operation, stage), histogram in sorted(self.histograms.items()):
+                stages.setdefault(operation, {})[stage] = histogram.summary()
+            return {'counters': dict(self.counters), 'stages': stages,
+                    'uptime': round(time.time() - self.started_at, 3)}
+
+    def reset(self):
+        with self._lock:
+            self.counters = dict.fromkeys(COUNTERS, 0)
+            self.histograms = {}
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def render_prometheus(sources):
+    """Prometheus text exposition of [(labels, PredictorMetrics), ...], e.g. one per model version"""
+    lines = []
+    snapshots = []
+    for labels, metrics in sources:
+        with metrics._lock:
+            snapshots.append((labels, dict(metrics.counters), {
+                key: (list(histogram.counts), histogram.count, histogram.sum)
+                for key, histogram in metrics.histograms.items()
+            }, metrics.buckets))
+
+    for counter, (metric, help_text) in COUNTERS.items():
+        lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+        for labels, counters, _, _ in snapshots:
+            lines.append(f'{metric}{_labels(labels)} {counters.get(counter, 0)}')
+
+    metric = 'earthslight_stage_duration_seconds'
+    lines += [f'# HELP {metric} Time spent per prediction stage', f'# TYPE {metric} histogram']
+    for labels, _, histograms, buckets in snapshots:
+        for (operation, stage), (counts, count, total) in sorted(histograms.items()):
+            series = dict(labels, operation=operation, stage=stage)
+            cumulative = 0
+            for bound, bucket_count in zip(list(buckets) + ['+Inf'], counts):
+                cumulative += bucket_count
+                lines.append(f'{metric}_bucket{_labels(dict(series, le=bound))} {cumulative}')
+            lines.append(f'{metric}_sum{_labels(series)} {total:.9f}')
+            lines.append(f'{metric}_count{_labels(series)} {count}')
+    return '\n'.join(lines) + '\n'
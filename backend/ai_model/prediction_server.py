@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Long-lived prediction server
+Loads the model once and answers newline-delimited JSON requests on stdin/stdout
+"""
+
+import sys
+import json
+import time
+import signal
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from prediction_batcher import PredictionBatcher, PROPERTY_FIELDS
+from prediction_metrics import PROMETHEUS_CONTENT_TYPE, render_prometheus
+from model_registry import ModelRegistry
+from predict import parse_point
+
+
+class PredictionServer:
+    """Serve predictions from one warm RealEstatePredictor over an NDJSON channel.
+
+    Every request is a single JSON object per line, e.g.
+    {"id": 1, "op": "predict", "floors": 2, "area": 1500, "bedrooms": 3,
+     "bathrooms": 2, "age": 5, "location": "Los Angeles"}
+    and is answered with {"id": 1, "ok": true, "modelVersion": "...", "result": {...}} or
+    {"id": 1, "ok": false, "error": "..."}. Responses may arrive out of order,
+    callers match them by id.
+
+    With batch_size > 1, concurrent predict requests are coalesced by a PredictionBatcher into
+    one booster call per batch (flushed at batch_size requests or after batch_wait_ms).
+
+    Models are served from a ModelRegistry, so new versions can be rolled out without a restart:
+    {"op": "load", "model": "path", "canary": 10} loads in the background and is answered once the
+    model takes traffic; "activate", "canary" and "promote" move traffic between loaded versions
+    and "models" lists them. A request may pin a version with "modelVersion".
+
+    {"op": "risk-events", "events": [...]} adds environmental risk events (GeoJSON features or
+    {lat, lng, severity, area} records) to the models that use risk features.
+
+    {"op": "stats"} returns the per-stage latencies and counters of every loaded version as JSON;
+    with "format": "prometheus" the result is {"contentType": ..., "body": "<text exposition>"}.
+    """
+
+    def __init__(self, predictor, workers=4, stdin=None, stdout=None, batch_size=1, batch_wait_ms=2.0,
+                 queue_depth=1024, model_path=None, shard_memory_mb=512, engine='auto'):
+        self.predictor = predictor
+        self.engine = engine
+        self.registry = ModelRegistry(self._new_predictor, on_retire=self._on_retire,
+                                      load_options={'shard_memory_mb': shard_memory_mb})
+        if predictor.is_trained:
+            self.registry.add(predictor, model_path)
+        self.workers = max(1, int(workers))
+        self.batch_size = max(1, int(batch_size))
+        self.batch_wait_ms = batch_wait_ms
+        self.queue_depth = queue_depth
+        self._batchers = {}
+        self.stdin = stdin or sys.stdin
+        self.stdout = stdout or sys.stdout
+        self.started_at = time.time()
+        self.in_flight = 0
+        self.served = 0
+        self.failed = 0
+        self._loop = None
+        self._lines = None
+        self._tasks = set()
+        self._stopping = False
+        self._executor = None
+
+    def _write(self, message):
+        """Write one response line (always called from the event loop thread)"""
+        self.stdout.write(json.dumps(message, separators=(',', ':')) + '\n')
+        self.stdout.flush()
+
+    def _read_stdin(self):
+        """Blocking reader thread feeding lines into the event loop"""
+        for line in self.stdin:
+            self._loop.call_soon_threadsafe(self._lines.put_nowait, line)
+        self._loop.call_soon_threadsafe(self._lines.put_nowait, None)
+
+    def request_shutdown(self):
+        """Stop accepting requests; in-flight requests are still answered"""
+        if not self._stopping:
+            self._stopping = True
+            self._lines.put_nowait(None)
+
+    def _install_signal_handlers(self):
+        for signame in ('SIGTERM', 'SIGINT'):
+            signum = getattr(signal, signame, None)
+            if signum is None:
+                continue
+            try:
+                self._loop.add_signal_handler(signum, self.request_shutdown)
+            except (NotImplementedError, RuntimeError):
+                # Windows event loops do not support add_signal_handler
+                signal.signal(signum, lambda *_: self._loop.call_soon_threadsafe(self.request_shutdown))
+
+    def _new_predictor(self):
+        """Fresh predictor for a model loaded at runtime, with the same engine (the load op's default), cache,
+        metrics, explanation and table settings
+        """
+        predictor = type(self.predictor)()
+        cache = self.predictor.cache
+        if cache is not None:
+            predictor.enable_cache(max_entries=cache.max_entries, ttl=cache.ttl,
+                                   path=cache.disk.path if cache.disk else None)
+        if self.predictor.metrics is not None:
+            predictor.enable_metrics(window=self.predictor.metrics.window)
+        predictor.configure_explanations(**self.predictor.explanations)
+        predictor.table_settings = self.predictor.table_settings
+        return predictor
+
+    def _on_retire(self, entry):
+        """Called by the registry (from any thread) once a drained version has no requests left"""
+        self._loop.call_soon_threadsafe(self._stop_batcher, entry)
+
+    def _stop_batcher(self, entry):
+        batcher = self._batchers.pop(entry, None)
+        if batcher is not None:
+            task = self._loop.create_task(batcher.stop())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _batcher(self, entry):
+        """The PredictionBatcher of a model version, started on its first request"""
+        batcher = self._batchers.get(entry)
+        if batcher is None:
+            batcher = self._batchers[entry] = PredictionBatcher(
+                entry.predictor, max_batch_size=self.batch_size, max_wait_ms=self.batch_wait_ms,
+                max_queue_depth=self.queue_depth, executor=self._executor,
+                max_concurrent_batches=self.workers
+            )
+            await batcher.start()
+        return batcher
+
+    def health(self):
+        """Readiness / liveness probe payload"""
+        primary = self.registry.primary
+        batcher = self._batchers.get(primary)
+        return {
+            'status': 'draining' if self._stopping else 'ready',
+            'modelLoaded': primary is not None,
+            'modelVersion': primary.version if primary else None,
+            'models': self.registry.status(),
+            'inFlight': self.in_flight,
+            'served': self.served,
+            'failed': self.failed,
+            'workers': self.workers,
+            'batching': batcher.metrics() if batcher else None,
+            'cache': primary.predictor.cache.stats() if primary and primary.predictor.cache else None,
+            'uptime': round(time.time() - self.started_at, 3)
+        }
+
+    def stats(self, format='json'):
+        """Prediction metrics of every loaded version, as JSON or in the Prometheus text format"""
+        entries = [entry for entry in self.registry.entries() if entry.predictor is not None]
+        if format == 'prometheus':
+            sources = [({'model_version': entry.version}, entry.predictor.metrics)
+                       for entry in entries if entry.predictor.metrics is not None]
+            server = [
+                '# HELP earthslight_server_requests_total Requests answered by the server',
+                '# TYPE earthslight_server_requests_total counter',
+                f'earthslight_server_requests_total{{status="ok"}} {self.served}',
+                f'earthslight_server_requests_total{{status="failed"}} {self.failed}',
+                '# HELP earthslight_server_in_flight Requests being processed',
+                '# TYPE earthslight_server_in_flight gauge',
+                f'earthslight_server_in_flight {self.in_flight}'
+            ]
+            return {'contentType': PROMETHEUS_CONTENT_TYPE,
+                    'body': render_prometheus(sources) + '\n'.join(server) + '\n'}
+        if format != 'json':
+            raise ValueError(f"Unknown stats format: {format}")
+        return {
+            'inFlight': self.in_flight,
+            'served': self.served,
+            'failed': self.failed,
+            'models': {
+                entry.version: entry.predictor.metrics.snapshot() if entry.predictor.metrics else None
+                for entry in entries
+            },
+            'uptime': round(time.time() - self.started_at, 3)
+        }
+
+    @staticmethod
+    def _property(request):
+        missing = [field for field in PROPERTY_FIELDS if request.get(field) is None]
+        if missing:
+            raise ValueError(f"Missing fields: {', '.join(missing)}")
+        return (
+            int(request['floors']),
+            int(request['area']),
+            int(request['bedrooms']),
+            int(request['bathrooms']),
+            int(request['age']),
+            str(request['location'])
+        )
+
+    @staticmethod
+    def _predict(predictor, request):
+        result = predictor.predict_price(*PredictionServer._property(request), lat=request.get('lat'),
+                                         lng=request.get('lng'))
+        if result is None:
+            raise RuntimeError('Prediction failed. Check model and input data.')
+        return result
+
+    @staticmethod
+    def _forecast(predictor, request):
+        if request.get('price') is None or request.get('location') is None:
+            raise ValueError('Missing fields: price, location')
+        return predictor.generate_forecast(
+            int(request['price']), str(request['location']), int(request.get('years', 10))
+        )
+
+    async def _serve_model(self, op, request):
+        """Run one predict/forecast on the version the registry picks; returns (version, result)"""
+        entry = self.registry.acquire(request.get('modelVersion'))
+        try:
+            if op == 'predict':
+                # Coordinates (lat/lng or a "lat,lng" location) become a market name up front; they
+                # are kept for models with environmental risk features
+                location, lat, lng = parse_point(request.get('location'), request.get('lat'), request.get('lng'))
+                request = dict(request, location=entry.predictor.resolve_location(location, lat, lng),
+                               lat=lat, lng=lng)
+            if op == 'predict' and self.batch_size > 1:
+                batcher = await self._batcher(entry)
+                result = await batcher.predict(*self._property(request), lat=request['lat'], lng=request['lng'])
+            elif op == 'predict':
+                result = await self._loop.run_in_executor(self._executor, self._predict, entry.predictor, request)
+            else:
+                result = await self._loop.run_in_executor(self._executor, self._forecast, entry.predictor, request)
+            return entry.version, result
+        finally:
+            self.registry.release(entry)
+
+    async def _manage_models(self, op, request):
+        """Model rollout ops: load, activate, canary, promote and models"""
+        if op == 'load':
+            if not request.get('model'):
+                raise ValueError('Missing fields: model')
+            future = self.registry.load(request['model'], engine=request.get('engine', self.engine),
+                                        canary_percent=request.get('canary'))
+            await asyncio.wrap_future(future)
+        elif op == 'activate':
+            self.registry.activate(request.get('version'))
+        elif op == 'canary':
+            self.registry.set_canary(request.get('version'), request.get('percent'))
+        elif op == 'promote':
+            self.registry.promote()
+        return self.registry.status()
+
+    async def _add_risk_events(self, request):
+        """Add environmental risk events to every loaded version whose model uses risk features"""
+        if not request.get('events'):
+            raise ValueError('Missing fields: events')
+        result = {}
+        for entry in self.registry.entries():
+            predictor = entry.predictor
+            if predictor is None or predictor.artifact is None or not predictor.artifact.has_risk_features:
+                continue
+            added = await self._loop.run_in_executor(self._executor, predictor.add_risk_events, request['events'])
+            result[entry.version] = {'added': added, 'events': len(predictor.artifact.risk_index)}
+        if not result:
+            raise RuntimeError('No loaded model has environmental risk features')
+        return result
+
+    async def _handle(self, request):
+        request_id = request.get('id')
+        op = request.get('op', 'predict')
+        self.in_flight += 1
+        try:
+            if op in ('predict', 'forecast'):
+                version, result = await self._serve_model(op, request)
+                response = {'id': request_id, 'ok': True, 'modelVersion': version, 'result': result}
+            elif op in ('load', 'activate', 'canary', 'promote', 'models'):
+                response = {'id': request_id, 'ok': True, 'result': await self._manage_models(op, request)}
+            elif op == 'risk-events':
+                response = {'id': request_id, 'ok': True, 'result': await self._add_risk_events(request)}
+            else:
+                raise ValueError(f"Unknown op: {op}")
+            self.served += 1
+            self._write(response)
+        except Exception as e:
+            self.failed += 1
+            # KeyError would render its message in quotes
+            self._write({'id': request_id, 'ok': False, 'error': e.args[0] if isinstance(e, KeyError) else str(e)})
+        finally:
+            self.in_flight -= 1
+
+    def _dispatch(self, line):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError('Request must be a JSON object')
+        except ValueError as e:
+            self.failed += 1
+            self._write({'id': None, 'ok': False, 'error': f"Invalid request: {e}"})
+            return
+
+        op = request.get('op', 'predict')
+        if op == 'health':
+            self._write({'id': request.get('id'), 'ok': True, 'result': self.health()})
+        elif op == 'stats':
+            try:
+                self._write({'id': request.get('id'), 'ok': True, 'result': self.stats(request.get('format', 'json'))})
+            except ValueError as e:
+                self.failed += 1
+                self._write({'id': request.get('id'), 'ok': False, 'error': str(e)})
+        elif op == 'shutdown':
+            self._write({'id': request.get('id'), 'ok': True, 'result': {'status': 'draining'}})
+            self.request_shutdown()
+        else:
+            task = self._loop.create_task(self._handle(request))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def run(self):
+        """Serve until EOF on stdin, a shutdown request or SIGTERM/SIGINT"""
+        self._loop = asyncio.get_running_loop()
+        self._lines = asyncio.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='predict')
+        self._install_signal_handlers()
+        primary = self.registry.primary
+        if primary is not None and self.batch_size > 1:
+            await self._batcher(primary)
+
+        threading.Thread(target=self._read_stdin, name='stdin-reader', daemon=True).start()
+        self._write({'event': 'ready', 'result': self.health()})
+
+        while not self._stopping:
+            line = await self._lines.get()
+            if line is None:
+                break
+            if line.strip():
+                self._dispatch(line)
+
+        # Drain in-flight requests before exiting
+        self._stopping = True
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        for batcher in list(self._batchers.values()):
+            await batcher.stop()
+        self.registry.close()
+        self._executor.shutdown(wait=True)
+        self._write({'event': 'shutdown', 'result': self.health()})
+
+
+def serve(predictor, model_path=None, workers=4, engine='auto', shard_memory_mb=512, **batching):
+    """Load the model once and run a PredictionServer on stdin/stdout; logs go to stderr.
+
+    batching takes batch_size, batch_wait_ms and queue_depth for the PredictionBatcher.
+    """
+    protocol_out = sys.stdout
+    # Anything else printed (model loading messages etc.) must not corrupt the data channel
+    sys.stdout = sys.stderr
+    try:
+        if not (predictor.load_model(model_path, engine=engine, shard_memory_mb=shard_memory_mb) and
+                predictor.warm_up()):
+            message = {'event': 'error', 'error': f"Failed to load model from {model_path or 'default location'}"}
+            protocol_out.write(json.dumps(message, separators=(',', ':')) + '\n')
+            protocol_out.flush()
+            return False
+        server = PredictionServer(predictor, workers=workers, stdout=protocol_out, model_path=model_path,
+                                  shard_memory_mb=shard_memory_mb, engine=engine, **batching)
+        asyncio.run(server.run())
+    finally:
+        sys.stdout = protocol_out
+    return True
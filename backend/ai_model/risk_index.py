@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Environmental risk proximity
+Grid-indexed spatial join of properties against environmental risk events (deforestation, mining,
+forest fires, ...) that turns nearby events into model features, vectorized for whole batches
+"""
+
+import os
+import json
+import threading
+import numpy as np
+
+from geo_index import unit_vectors, chord_length, great_circle_km
+
+# Model features computed per property, in the order they are appended to the feature columns
+RISK_FEATURES = ['risk_events', 'risk_area_ha', 'risk_exposure', 'risk_nearest_km']
+
+DEFAULT_RISK_RADIUS_KM = 25.0
+
+# Severity labels used by the environment API; numeric severities are taken as they are
+SEVERITY_LEVELS = {'low': 1.0, 'medium': 2.0, 'high': 3.0, 'critical': 4.0}
+
+# Neighbour cell offsets of a 3-D grid whose cells are as wide as the search radius
+_OFFSETS = np.array([(x, y, z) for x in (-1, 0, 1) for y in (-1, 0, 1) for z in (-1, 0, 1)], dtype=np.int64)
+
+
+def _severity(value):
+    if value is None:
+        return 1.0
+    if isinstance(value, str):
+        level = SEVERITY_LEVELS.get(value.strip().lower())
+        return level if level is not None else float(value)
+    return float(value)
+
+
+def _vertices(coordinates):
+    """Flatten GeoJSON coordinates of any nesting depth into [lng, lat] pairs"""
+    if coordinates and isinstance(coordinates[0], (int, float)):
+        return [coordinates[:2]]
+    return [vertex for part in coordinates for vertex in _vertices(part)]
+
+
+def _point(geometry):
+    """(lat, lng) of a GeoJSON geometry: the point itself, or the mean of a shape's vertices"""
+    vertices = np.asarray(_vertices(geometry['coordinates']), dtype=np.float64)
+    return vertices[:, 1].mean(), vertices[:, 0].mean()
+
+
+def parse_risk_events(records):
+    """Column arrays (lat, lng, severity, area) from GeoJSON features or flat {lat, lng, ...} records.
+
+    A FeatureCollection (or a single Feature) is accepted too. area is in hectares and
+    defaults to 0; severity is a number or Low/Medium/High and defaults to 1.
+    """
+    if isinstance(records, dict):
+        records = records['features'] if records.get('type') == 'FeatureCollection' else [records]
+    lat, lng, severity, area = [], [], [], []
+    for record in records:
+        if record.get('type') == 'Feature':
+            properties = record.get('properties') or {}
+            if not record.get('geometry'):
+                continue
+            point = _point(record['geometry'])
+        else:
+            properties = record
+            point = (record['lat'], record['lng'])
+        lat.append(point[0])
+        lng.append(point[1])
+        severity.append(_severity(properties.get('severity')))
+        area.append(float(properties.get('area') or 0.0))
+    return {
+        'lat': np.asarray(lat, dtype=np.float64),
+        'lng': np.asarray(lng, dtype=np.float64),
+        'severity': np.asarray(severity, dtype=np.float64),
+        'area': np.asarray(area, dtype=np.float64)
+    }
+
+
+def read_risk_events(path):
+    """Load risk events from a GeoJSON file or an NDJSON file with one feature or record per line"""
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() in ('.ndjson', '.jsonl'):
+            return parse_risk_events([json.loads(line) for line in f if line.strip()])
+        return parse_risk_events(json.load(f))
+
+
+class _GridLevel:
+    """Immutable events sorted by grid cell, with the cells in CSR form (keys, starts, counts)"""
+
+    def __init__(self, vectors, severity, area, cell, size):
+        keys = _cell_keys(np.floor(vectors / cell).astype(np.int64), size)
+        order = np.argsort(keys, kind='stable')
+        self.vectors = vectors[order]
+        self.severity = severity[order]
+        self.area = area[order]
+        self.keys, self.starts, self.counts = np.unique(keys[order], return_index=True, return_counts=True)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def candidates(self, cells, size):
+        """Event index ranges (starts, counts) of every (query, neighbour cell) pair, query-major"""
+        keys = _cell_keys(cells[:, None, :] + _OFFSETS[None, :, :], size).ravel()
+        positions = np.minimum(np.searchsorted(self.keys, keys), len(self.keys) - 1)
+        found = self.keys[positions] == keys
+        return np.where(found, self.starts[positions], 0), np.where(found, self.counts[positions], 0)
+
+
+def _cell_keys(cells, size):
+    """One int64 per grid cell; cells run from -size to size along every axis"""
+    cells = cells + size
+    width = 2 * size + 1
+    return (cells[..., 0] * width + cells[..., 1]) * width + cells[..., 2]
+
+
+def _ragged_arange(starts, counts):
+    """Concatenation of arange(start, start + count) for every pair, without a Python loop"""
+    total = int(counts.sum())
+    ends = np.cumsum(counts)
+    return np.repeat(starts - ends + counts, counts) + np.arange(total)
+
+
+class RiskIndex:
+    """Uniform grid over unit-sphere event coordinates answering "what happened within radius_km".
+
+    Cells are as wide as the search radius, so every event in range of a property lies in one
+    of the 27 cells around the property's own cell; a join only looks at those, which makes
+    joining a million properties against a million events roughly linear instead of quadratic.
+    Working on the unit sphere means no special cases at the poles or the antimeridian.
+
+    Events can be added at any time with insert(): they land in a small recent level that is
+    re-sorted on every insert, and are merged into the large base level once the recent level
+    outgrows merge_fraction of it, so the amortized cost of an insert stays low. Lookups may
+    run while an insert is in progress; they see the events from before it.
+    """
+
+    def __init__(self, radius_km=DEFAULT_RISK_RADIUS_KM, merge_fraction=0.125, min_merge=4096,
+                 max_pairs=4000000):
+        if radius_km <= 0:
+            raise ValueError('radius_km must be positive')
+        self.radius_km = float(radius_km)
+        self.max_pairs = max_pairs
+        self.merge_fraction = merge_fraction
+        self.min_merge = min_merge
+        self._chord = float(chord_length(self.radius_km))
+        self._cell = self._chord
+        self._size = int(np.ceil(1 / self._cell)) + 2
+        # (base level, recent level), swapped as one tuple so concurrent readers see a consistent pair
+        self._state = (None, None)
+        # Bumped on every insert, so results computed from an older state can be told apart
+        self.generation = 0
+        self._insert_lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path, radius_km=DEFAULT_RISK_RADIUS_KM):
+        index = cls(radius_km)
+        index.insert(**read_risk_events(path))
+        return index
+
+    @classmethod
+    def from_arrays(cls, arrays, radius_km=DEFAULT_RISK_RADIUS_KM):
+        """Rebuild an index saved with to_arrays()"""
+        index = cls(radius_km)
+        index.insert(arrays['risk_lat'], arrays['risk_lng'], arrays['risk_severity'], arrays['risk_area'])
+        return index
+
+    def __len__(self):
+        return sum(len(level) for level in self._levels())
+
+    def _levels(self):
+        return [level for level in self._state if level is not None and len(level)]
+
+    def insert(self, lat, lng, severity=None, area=None):
+        """Add events; severity defaults to 1 and area (hectares) to 0"""
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        severity = np.ones(len(lat)) if severity is None else np.atleast_1d(np.asarray(severity, dtype=np.float64))
+        area = np.zeros(len(lat)) if area is None else np.atleast_1d(np.asarray(area, dtype=np.float64))
+        valid = np.isfinite(lat) & np.isfinite(lng) & (np.abs(lat) <= 90)
+        if not valid.any():
+            return 0
+        vectors, severity, area = unit_vectors(lat[valid], lng[valid]), severity[valid], area[valid]
+        with self._insert_lock:
+            self._add(vectors, severity, area)
+        return int(valid.sum())
+
+    def _add(self, vectors, severity, area):
+        base, recent = self._state
+        if recent is not None:
+            vectors = np.concatenate([recent.vectors, vectors])
+            severity = np.concatenate([recent.severity, severity])
+            area = np.concatenate([recent.area, area])
+        if len(vectors) > max(self.min_merge, self.merge_fraction * (len(base) if base is not None else 0)):
+            if base is not None:
+                vectors = np.concatenate([base.vectors, vectors])
+                severity = np.concatenate([base.severity, severity])
+                area = np.concatenate([base.area, area])
+            self._state = (_GridLevel(vectors, severity, area, self._cell, self._size), None)
+        else:
+            self._state = (base, _GridLevel(vectors, severity, area, self._cell, self._size))
+        self.generation += 1
+
+    def features(self, lat, lng, chunk_size=65536):
+        """Risk features for arrays of property coordinates, as {feature: array}.
+
+        risk_events and risk_area_ha count the events within radius_km and their hectares,
+        risk_exposure sums severity * (1 - distance / radius_km) over them and risk_nearest_km
+        is the distance to the closest one (radius_km when there is none). Properties without
+        valid coordinates get NaN, which the model treats as missing.
+        """
+        lat = np.atleast_1d(np.asarray(lat, dtype=np.float64))
+        lng = np.atleast_1d(np.asarray(lng, dtype=np.float64))
+        rows = len(lat)
+        result = {
+            'risk_events': np.zeros(rows),
+            'risk_area_ha': np.zeros(rows),
+            'risk_exposure': np.zeros(rows),
+            'risk_nearest_km': np.full(rows, self.radius_km)
+        }
+        invalid = ~(np.isfinite(lat) & np.isfinite(lng) & (np.abs(lat) <= 90))
+        levels = self._levels()
+        valid = np.flatnonzero(~invalid)
+        if levels:
+            # Neighbouring properties probe the same cells: visiting them in cell order keeps lookups cache-friendly
+            cells = np.floor(unit_vectors(lat[valid], lng[valid]) / self._cell).astype(np.int64)
+            valid = valid[np.argsort(_cell_keys(cells, self._size), kind='stable')]
+        for start in range(0, len(valid) if levels else 0, chunk_size):
+            self._join(valid[start:start + chunk_size], lat, lng, levels, result)
+        for values in result.values():
+            values[invalid] = np.nan
+        return result
+
+    def _join(self, rows, lat, lng, levels, result):
+        """Accumulate the features of one chunk of property rows into result"""
+        points = unit_vectors(lat[rows], lng[rows])
+        cells = np.floor(points / self._cell).astype(np.int64)
+        # Properties sharing a cell share its neighbour lookups (most do, in a city)
+        _, distinct, inverse = np.unique(_cell_keys(cells, self._size), return_index=True, return_inverse=True)
+        nearest = np.full(len(rows), np.inf)
+        for level in levels:
+            starts, counts = level.candidates(cells[distinct], self._size)
+            starts, counts = starts.reshape(len(distinct), -1)[inverse], counts.reshape(len(distinct), -1)[inverse]
+            # Dense areas can have many candidates per property; bound the pairs held at once
+            cumulative = np.cumsum(counts.sum(axis=1))
+            bounds = np.unique(np.r_[0, np.searchsorted(cumulative, np.arange(1, cumulative[-1] // self.max_pairs + 1)
+                                                         * self.max_pairs), len(rows)])
+            for first, last in zip(bounds[:-1], bounds[1:]):
+                self._join_pairs(level, points[first:last], starts[first:last].ravel(), counts[first:last].ravel(),
+                                 rows[first:last], nearest[first:last], result)
+        found = np.isfinite(nearest)
+        result['risk_nearest_km'][rows[found]] = nearest[found]
+
+    def _join_pairs(self, level, points, starts, counts, rows, nearest, result):
+        """Score every (property, candidate event) pair of some rows; nearest is updated in place"""
+        events = _ragged_arange(starts, counts)
+        if not len(events):
+            return
+        # Pairs come out grouped by property, in property order
+        owners = np.repeat(np.repeat(np.arange(len(rows)), len(_OFFSETS)), counts)
+        chords = np.linalg.norm(level.vectors[events] - points[owners], axis=1)
+        near = chords <= self._chord
+        owners, events = owners[near], events[near]
+        if not len(owners):
+            return
+        distance = great_circle_km(chords[near])
+        result['risk_events'][rows] += np.bincount(owners, minlength=len(rows))
+        result['risk_area_ha'][rows] += np.bincount(owners, weights=level.area[events], minlength=len(rows))
+        proximity = np.maximum(0.0, 1 - distance / self.radius_km)
+        result['risk_exposure'][rows] += np.bincount(owners, weights=level.severity[events] * proximity,
+                                                     minlength=len(rows))
+        groups = np.flatnonzero(np.r_[True, owners[1:] != owners[:-1]])
+        nearest[owners[groups]] = np.minimum(nearest[owners[groups]], np.minimum.reduceat(distance, groups))
+
+    def point_features(self, lat, lng):
+        """features() for one property, as plain floats"""
+        return {name: float(values[0]) for name, values in self.features([lat], [lng]).items()}
+
+    def to_arrays(self):
+        """The events as arrays that from_arrays() (and a model artifact) can store"""
+        levels = self._levels()
+        vectors = np.concatenate([level.vectors for level in levels]) if levels else np.zeros((0, 3))
+        return {
+            'risk_lat': np.degrees(np.arcsin(np.clip(vectors[:, 2], -1, 1))),
+            'risk_lng': np.degrees(np.arctan2(vectors[:, 1], vectors[:, 0])),
+            'risk_severity': np.concatenate([level.severity for level in levels]) if levels else np.zeros(0),
+            'risk_area': np.concatenate([level.area for level in levels]) if levels else np.zeros(0)
+        }
+
+    def describe(self):
+        return {'radiusKm': self.radius_km, 'events': len(self), 'generation': self.generation}
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Out-of-core training
+Streams training data chunk by chunk into xgboost's QuantileDMatrix (or external memory) so the
+dataset never has to fit in RAM
+"""
+
+import os
+import sys
+import time
+import tempfile
+import numpy as np
+import pandas as pd
+
+NUMERIC_COLUMNS = ['floors', 'area', 'bedrooms', 'bathrooms', 'age']
+TRAINING_PARAMS = {
+    'objective': 'reg:squarederror',
+    'tree_method': 'hist',
+    'max_depth': 8,
+    'eta': 0.1,
+    'subsample': 0.8,
+    'colsample_bytree': 0.8,
+    'seed': 42
+}
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB (None where the resource module is missing)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes elsewhere
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class ChunkSource:
+    """Re-iterable source of training chunks: a CSV/NDJSON/Parquet file or the synthetic generator.
+
+    Every pass yields the same chunks in the same order, and each row is assigned to the test
+    set by a seeded draw, so the train/test split is identical across passes.
+    """
+
+    def __init__(self, data_path=None, num_samples=50000, location_multipliers=None, seed=42,
+                 chunk_size=1000000, test_size=0.2):
+        self.data_path = data_path
+        self.num_samples = num_samples
+        self.location_multipliers = location_multipliers
+        self.seed = seed
+        self.chunk_size = max(1, int(chunk_size))
+        self.test_size = test_size
+
+    def chunks(self):
+        if self.data_path:
+            from bulk_scoring import iter_property_chunks
+            source = iter_property_chunks(self.data_path, self.chunk_size)
+        else:
+            from synthetic_data import iter_training_chunks
+            source = iter_training_chunks(self.num_samples, self.location_multipliers, seed=self.seed,
+                                          chunk_size=self.chunk_size, noise_range=(0.85, 1.15),
+                                          price_floor=50000)
+        split = np.random.default_rng(self.seed + 1)
+        for chunk in source:
+            missing = [column for column in NUMERIC_COLUMNS + ['location', 'price'] if column not in chunk.columns]
+            if missing:
+                raise ValueError(f"Training data is missing columns: {', '.join(missing)}")
+            yield chunk, split.random(len(chunk)) < self.test_size
+
+
+class Preprocessor:
+    """Location classes and StandardScaler statistics fitted incrementally over a ChunkSource"""
+
+    def __init__(self):
+        from sklearn.preprocessing import StandardScaler
+        self.numeric_scaler = StandardScaler()
+        self.location_counts = {}
+        self.classes = None
+        self.mean = None
+        self.scale = None
+        self.rows = 0
+        self._codes = None
+
+    def partial_fit(self, chunk):
+        self.numeric_scaler.partial_fit(chunk[NUMERIC_COLUMNS].to_numpy(dtype=np.float64))
+        for location, count in chunk['location'].astype(str).value_counts().items():
+            self.location_counts[location] = self.location_counts.get(location, 0) + int(count)
+        self.rows += len(chunk)
+
+    def finish(self):
+        """Fix the location codes (sorted, like LabelEncoder) and combine the scaler statistics"""
+        from sklearn.preprocessing import StandardScaler
+        if not self.rows:
+            raise ValueError('No training data')
+        self.classes = np.array(sorted(self.location_counts), dtype=str)
+        # The encoded location column is scaled from the per-code counts, no extra pass needed
+        location_scaler = StandardScaler().partial_fit(
+            np.arange(len(self.classes), dtype=np.float64).reshape(-1, 1),
+            sample_weight=np.array([self.location_counts[name] for name in self.classes], dtype=np.float64)
+        )
+        self.mean = np.concatenate([self.numeric_scaler.mean_, location_scaler.mean_])
+        self.scale = np.concatenate([self.numeric_scaler.scale_, location_scaler.scale_])
+        self._codes = pd.Index(self.classes)
+        return self
+
+    def features(self, chunk):
+        """Scaled float32 feature matrix in FEATURE_COLUMNS order"""
+        codes = self._codes.get_indexer(chunk['location'].astype(str))
+        features = np.column_stack([chunk[NUMERIC_COLUMNS].to_numpy(dtype=np.float64), codes])
+        return ((features - self.mean) / self.scale).astype(np.float32)
+
+
+def training_iter(xgb, source, preprocessor, cache_prefix=None, features=None):
+    """xgboost DataIter feeding the scaled training rows of every chunk of a ChunkSource.
+
+    features, if given, is called as features(train_rows, number) instead of
+    preprocessor.features, number counting the chunks fed in this pass (xgboost makes several).
+    """
+
+    class TrainingChunks(xgb.DataIter):
+        def __init__(self):
+            self._chunks = None
+            self._number = 0
+            super().__init__(cache_prefix=cache_prefix)
+
+        def next(self, input_data):
+            if self._chunks is None:
+                self._chunks = source.chunks()
+            for chunk, test in self._chunks:
+                train = chunk[~test]
+                if len(train):
+                    data = features(train, self._number) if features else preprocessor.features(train)
+                    self._number += 1
+                    input_data(data=data, label=train['price'].to_numpy(dtype=np.float32))
+                    return 1
+            return 0
+
+        def reset(self):
+            self._chunks = None
+            self._number = 0
+
+    return TrainingChunks()
+
+
+def _evaluate(booster, source, preprocessor):
+    """Streaming MAE and R² over the held-out rows"""
+    count, abs_error, squared_error, total, total_squared = 0, 0.0, 0.0, 0.0, 0.0
+    for chunk, test in source.chunks():
+        held_out = chunk[test]
+        if not len(held_out):
+            continue
+        actual = held_out['price'].to_numpy(dtype=np.float64)
+        predicted = booster.inplace_predict(preprocessor.features(held_out)).astype(np.float64)
+        count += len(actual)
+        abs_error += np.abs(actual - predicted).sum()
+        squared_error += np.square(actual - predicted).sum()
+        total += actual.sum()
+        total_squared += np.square(actual).sum()
+    if not count:
+        return None, None
+    variance = total_squared - total * total / count
+    return abs_error / count, (1 - squared_error / variance) if variance else None
+
+
+def train_out_of_core(source, nthread=None, num_rounds=200, max_bin=256, external_memory=False,
+                      cache_dir=None, params=None):
+    """Train on a ChunkSource without materializing it; returns (booster, preprocessor, stats).
+
+    The scaler is fitted with partial_fit in a first pass. xgboost then builds its quantized
+    matrix from the chunks (QuantileDMatrix, or an on-disk page cache with external_memory=True)
+    and trains with the hist tree method on nthread threads (default: all cores).
+    """
+    import xgboost as xgb
+
+    stats = {'nthread': nthread or os.cpu_count(), 'externalMemory': external_memory}
+    started = time.perf_counter()
+
+    phase = time.perf_counter()
+    preprocessor = Preprocessor()
+    for chunk, _ in source.chunks():
+        preprocessor.partial_fit(chunk)
+    preprocessor.finish()
+    stats['rows'] = preprocessor.rows
+    stats['preprocessSeconds'] = round(time.perf_counter() - phase, 3)
+    print(f"Fitted scaler on {preprocessor.rows:,} rows ({len(preprocessor.classes)} locations)")
+
+    phase = time.perf_counter()
+    cache = None
+    if external_memory:
+        cache = tempfile.TemporaryDirectory(prefix='xgb-cache-', dir=cache_dir)
+        matrix = xgb.DMatrix(training_iter(xgb, source, preprocessor, os.path.join(cache.name, 'train')),
+                             nthread=nthread)
+    else:
+        matrix = xgb.QuantileDMatrix(training_iter(xgb, source, preprocessor), max_bin=max_bin, nthread=nthread)
+    stats['trainRows'] = matrix.num_row()
+    stats['matrixSeconds'] = round(time.perf_counter() - phase, 3)
+    print(f"Built training matrix: {matrix.num_row():,} rows")
+
+    phase = time.perf_counter()
+    train_params = dict(TRAINING_PARAMS, **(params or {}))
+    train_params['max_bin'] = max_bin
+    if nthread:
+        train_params['nthread'] = nthread
+    booster = xgb.train(train_params, matrix, num_boost_round=num_rounds)
+    stats['trainSeconds'] = round(time.perf_counter() - phase, 3)
+    del matrix
+    if cache is not None:
+        cache.cleanup()
+
+    phase = time.perf_counter()
+    stats['testMae'], stats['testR2'] = _evaluate(booster, source, preprocessor)
+    stats['evaluateSeconds'] = round(time.perf_counter() - phase, 3)
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    stats['rowsPerSecond'] = round(stats['rows'] / stats['seconds'], 1) if stats['seconds'] else None
+    stats['peakRssMb'] = peak_rss_mb()
+    return booster, preprocessor, stats
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Synthetic training data
+Array-based generator for the synthetic real estate dataset used to train the model
+"""
+
+import numpy as np
+import pandas as pd
+
+BASE_PRICE = 150000
+
+
+def synthetic_prices(floors, area, bedrooms, bathrooms, age, location_mult, noise):
+    """Apply the pricing formula to column arrays (same multipliers and order as the original row loop)"""
+    area_mult = area / 1000
+    bedroom_mult = 1 + (bedrooms - 2) * 0.15
+    bathroom_mult = 1 + (bathrooms - 1) * 0.1
+    floor_mult = 1 + (floors - 1) * 0.05
+    age_mult = np.maximum(0.7, 1 - (age * 0.01))
+
+    price = BASE_PRICE * location_mult * area_mult * bedroom_mult * bathroom_mult * floor_mult * age_mult
+    return price * noise
+
+
+def iter_training_chunks(num_samples, location_multipliers, seed=42, chunk_size=1000000,
+                         noise_range=(0.85, 1.15), price_floor=50000):
+    """Yield DataFrames of synthetic properties with a price column, chunk_size rows at a time.
+
+    All draws come from one numpy Generator seeded with `seed`, so the same seed and
+    chunk_size always reproduce the same dataset. Only one chunk is in memory at a time.
+    """
+    rng = np.random.default_rng(seed)
+    locations = np.array(list(location_multipliers.keys()), dtype=object)
+    multipliers = np.array(list(location_multipliers.values()), dtype=float)
+
+    for start in range(0, num_samples, chunk_size):
+        size = min(chunk_size, num_samples - start)
+        floors = rng.integers(1, 51, size)
+        area = rng.integers(100, 10001, size)
+        bedrooms = rng.integers(1, 11, size)
+        bathrooms = rng.integers(1, 11, size)
+        age = rng.integers(0, 101, size)
+        location_index = rng.integers(0, len(locations), size)
+
+        noise = rng.uniform(noise_range[0], noise_range[1], size)
+        price = synthetic_prices(floors, area, bedrooms, bathrooms, age, multipliers[location_index], noise)
+        if price_floor is not None:
+            price = np.maximum(price_floor, price)
+
+        yield pd.DataFrame({
+            'floors': floors,
+            'area': area,
+            'bedrooms': bedrooms,
+            'bathrooms': bathrooms,
+            'age': age,
+            'location': locations[location_index],
+            'price': price.astype(np.int64)
+        })
+
+
+def generate_training_frame(num_samples, location_multipliers, seed=42, chunk_size=1000000,
+                            noise_range=(0.85, 1.15), price_floor=50000):
+    """Generate the whole synthetic dataset as one DataFrame.
+
+    Chunks are copied into preallocated columns as they are generated, so the peak is the frame
+    plus one chunk instead of twice the frame. The frame itself must still fit in memory; larger
+    datasets are for create_model.py train, which streams them (streaming_training.py).
+    """
+    columns, start = None, 0
+    for chunk in iter_training_chunks(num_samples, location_multipliers, seed=seed, chunk_size=chunk_size,
+                                      noise_range=noise_range, price_floor=price_floor):
+        if columns is None:
+            columns = {name: np.empty(num_samples, dtype=chunk[name].dtype) for name in chunk.columns}
+        for name in chunk.columns:
+            columns[name][start:start + len(chunk)] = chunk[name].to_numpy()
+        start += len(chunk)
+    if columns is None:
+        return pd.DataFrame(columns=['floors', 'area', 'bedrooms', 'bathrooms', 'age', 'location', 'price'])
+    # copy=False keeps each column as its own block instead of consolidating them into a copy
+    return pd.DataFrame(columns, copy=False)
+
+
+def synthetic_coordinates(locations, centroid_lat, centroid_lng, radius_km, seed=42):
+    """Scatter properties uniformly over a disc of radius_km around their market's centroid.
+
+    centroid_lat, centroid_lng and radius_km are per-property arrays; returns (lat, lng).
+    """
+    rng = np.random.default_rng(seed)
+    size = len(locations)
+    distance = np.asarray(radius_km, dtype=float) * np.sqrt(rng.uniform(0, 1, size))
+    bearing = rng.uniform(0, 2 * np.pi, size)
+    # Kilometres per degree of latitude; a degree of longitude shrinks with the cosine of the latitude
+    lat = centroid_lat + distance * np.cos(bearing) / 111.32
+    lng = centroid_lng + distance * np.sin(bearing) / (111.32 * np.cos(np.radians(centroid_lat)))
+    return lat, lng
+
+
+def risk_discount(exposure):
+    """Price factor of environmental risk exposure: 3% off per unit of exposure, at most 30%"""
+    return np.maximum(0.7, 1 - 0.03 * np.asarray(exposure, dtype=float))
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Training stage cache
+Content-addressed, disk-budgeted store for the stages of a training run (raw data, encoded
+matrix, train/test split, DMatrix), so runs that only change hyperparameters skip data preparation
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import numpy as np
+
+DEFAULT_CACHE_DIR = '.training_cache'
+DEFAULT_BUDGET_MB = 2048
+
+# Bump when the layout of cached stages changes; old entries then simply stop matching
+CACHE_SCHEMA = 1
+
+STAGE_FILE = 'stage.json'
+DMATRIX_FILE = 'matrix.buffer'
+
+
+def file_digest(path):
+    """sha256 of a file's contents, for keying stages on input files"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_digest(*modules):
+    """sha256 of the source files of modules, so a changed generator or encoder invalidates its stages"""
+    return hashlib.sha256(b''.join(
+        file_digest(module.__file__).encode() for module in modules
+    )).hexdigest()
+
+
+def _mb(size):
+    return size / (1024 * 1024)
+
+
+def _size(path):
+    return sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+
+
+class StageCache:
+    """Stages keyed by a hash of their inputs and parameters, stored one directory per entry.
+
+    Array stages are directories of .npy files loaded memory-mapped; DMatrix stages are xgboost
+    binary buffers. Entries are written under a temporary name and renamed into place, so
+    concurrent runs never see half-written stages. After each store the least recently used
+    entries are evicted until the cache fits budget_mb (entries used by this run are kept).
+    A cache with directory=None computes every stage and stores nothing.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, budget_mb=DEFAULT_BUDGET_MB, log=print):
+        self.directory = directory
+        self.budget_bytes = int(budget_mb * 1024 * 1024)
+        self.log = log
+        self.report = {}
+        self._used = set()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def key(self, stage, inputs):
+        """'<stage>-<digest>' of the stage name and its JSON-serializable inputs"""
+        payload = json.dumps({'schema': CACHE_SCHEMA, 'stage': stage, 'inputs': inputs}, sort_keys=True, default=str)
+        return f"{stage}-{hashlib.sha256(payload.encode()).hexdigest()[:24]}"
+
+    def arrays(self, key, compute):
+        """Dict of named arrays for key: memory-mapped from the cache, or compute() and store"""
+        def load(path):
+            with open(os.path.join(path, STAGE_FILE)) as f:
+                names = json.load(f)['files']
+            return {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r', allow_pickle=False)
+                    for name in names}
+
+        def store(arrays, path):
+            for name, array in arrays.items():
+                np.save(os.path.join(path, f'{name}.npy'), np.asarray(array), allow_pickle=False)
+            return list(arrays)
+
+        return self._stage(key, compute, load, store)
+
+    def dmatrix(self, key, compute):
+        """xgboost DMatrix for key: read from its binary buffer, or compute() and store"""
+        import xgboost as xgb
+
+        def load(path):
+            return xgb.DMatrix(os.path.join(path, DMATRIX_FILE), silent=True)
+
+        def store(matrix, path):
+            matrix.save_binary(os.path.join(path, DMATRIX_FILE), silent=True)
+            return [DMATRIX_FILE]
+
+        return self._stage(key, compute, load, store)
+
+    def _stage(self, key, compute, load, store):
+        stage = key.split('-', 1)[0]
+        started = time.perf_counter()
+        path = os.path.join(self.directory, key) if self.directory else None
+        if path and os.path.exists(os.path.join(path, STAGE_FILE)):
+            try:
+                value = load(path)
+            except (OSError, ValueError) as e:
+                self.log(f"[cache] {stage}: unreadable entry {key} ({e}), recomputing")
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                # The entry's mtime records its last use for eviction
+                os.utime(os.path.join(path, STAGE_FILE))
+                self._used.add(key)
+                size = _size(path)
+                self._record(stage, key, 'hit', time.perf_counter() - started, size)
+                return value
+
+        value = compute()
+        seconds = time.perf_counter() - started
+        if not path:
+            self._record(stage, key, 'off', seconds, 0)
+            return value
+
+        staging = os.path.join(self.directory, f'.tmp-{key}-{os.getpid()}')
+        os.makedirs(staging, exist_ok=True)
+        try:
+            files = store(value, staging)
+            with open(os.path.join(staging, STAGE_FILE), 'w') as f:
+                json.dump({'key': key, 'stage': stage, 'files': files, 'computeSeconds': round(seconds, 3),
+                           'created': time.time()}, f)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        try:
+            os.rename(staging, path)
+        except OSError:
+            # Another run stored the same stage first; its entry is identical
+            shutil.rmtree(staging, ignore_errors=True)
+        self._used.add(key)
+        self._record(stage, key, 'miss', seconds, _size(path) if os.path.isdir(path) else 0)
+        self.evict()
+        return value
+
+    def _record(self, stage, key, status, seconds, size):
+        self.report[stage] = {'status': status, 'key': key, 'seconds': round(seconds, 3), 'bytes': size}
+        if status == 'hit':
+            self.log(f"[cache] {stage}: hit {key} ({_mb(size):,.1f} MB, {seconds:.2f}s)")
+        elif status == 'miss':
+            self.log(f"[cache] {stage}: miss {key}, computed in {seconds:.2f}s and stored ({_mb(size):,.1f} MB)")
+        else:
+            self.log(f"[cache] {stage}: computed in {seconds:.2f}s (cache disabled)")
+
+    def entries(self):
+        """[(key, bytes, last used)] of the complete entries, least recently used first"""
+        if not self.directory:
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            marker = os.path.join(self.directory, name, STAGE_FILE)
+            if not name.startswith('.') and os.path.exists(marker):
+                entries.append((name, _size(os.path.join(self.directory, name)), os.path.getmtime(marker)))
+        return sorted(entries, key=lambda entry: entry[2])
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits its budget; returns the evicted keys"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        evicted = []
+        for key, size, _ in entries:
+            if total <= self.budget_bytes:
+                break
+            if key in self._used:
+                continue
+            shutil.rmtree(os.path.join(self.directory, key), ignore_errors=True)
+            total -= size
+            evicted.append(key)
+        if evicted:
+            self.log(f"[cache] evicted {len(evicted)} entries to stay within {_mb(self.budget_bytes):,.0f} MB")
+        if total > self.budget_bytes:
+            self.log(f"[cache] this run's stages alone take {_mb(total):,.1f} MB, over the "
+                     f"{_mb(self.budget_bytes):,.0f} MB budget")
+        return evicted
+
+    def stats(self):
+        entries = self.entries()
+        return {'directory': self.directory, 'entries': len(entries),
+                'bytes': sum(size for _, size, _ in entries), 'budgetBytes': self.budget_bytes}
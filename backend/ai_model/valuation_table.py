@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+EarthSlight AI Model - Precomputed valuation table
+The model evaluated once over a grid of the bounded integer inputs, one memory-mapped array per
+location, answering predictions by direct indexing or multilinear interpolation
+"""
+
+import os
+import json
+import time
+from datetime import datetime
+import numpy as np
+
+TABLE_FORMAT = 'earthslight-valuation-table'
+TABLE_MANIFEST = 'valuation_table.json'
+DEFAULT_TABLE_DIR = 'valuation_table'
+
+# Interpolation is only served when the table's measured maxRelError is within this tolerance
+DEFAULT_MAX_REL_ERROR = 0.01
+
+# Grid axes in table order: (feature, start, stop, step). Full resolution on the small
+# dimensions, coarser steps on area
+DEFAULT_GRID = (
+    ('floors', 1, 10, 1),
+    ('area', 500, 10000, 250),
+    ('bedrooms', 1, 8, 1),
+    ('bathrooms', 1, 6, 1),
+    ('age', 0, 100, 1),
+)
+
+
+def parse_grid(spec):
+    """DEFAULT_GRID with axes overridden by "area=500:10000:250,floors=1:20" style specs"""
+    axes = {name: (start, stop, step) for name, start, stop, step in DEFAULT_GRID}
+    for part in filter(None, (part.strip() for part in (spec or '').split(','))):
+        name, _, bounds = part.partition('=')
+        if name not in axes:
+            raise ValueError(f"Unknown grid axis: {name} (expected one of {', '.join(axes)})")
+        values = [int(value) for value in bounds.split(':')]
+        if len(values) not in (2, 3) or values[1] < values[0] or (len(values) == 3 and values[2] < 1):
+            raise ValueError(f"Grid axis {name} must be start:stop[:step] with stop >= start and step >= 1")
+        start, stop, step = values[0], values[1], values[2] if len(values) == 3 else 1
+        # The last grid point must be stop, so the table covers the whole range
+        axes[name] = (start, start + -(-(stop - start) // step) * step, step)
+    return tuple((name,) + axes[name] for name, _, _, _ in DEFAULT_GRID)
+
+
+def _axis_values(start, stop, step):
+    return np.arange(start, stop + 1, step, dtype=np.int64)
+
+
+def build_table(artifact, output_dir=DEFAULT_TABLE_DIR, grid=DEFAULT_GRID, error_samples=20000, seed=42,
+                progress=print):
+    """Evaluate artifact over the grid for every location it knows and write the table directory.
+
+    Returns the table manifest, including an error report of interpolated lookups against the
+    live model on error_samples random inputs of the grid's range.
+    """
+    if artifact.has_risk_features:
+        raise ValueError('Models with environmental risk features depend on coordinates and cannot be tabulated')
+    os.makedirs(output_dir, exist_ok=True)
+    names = [name for name, _, _, _ in grid]
+    values = [_axis_values(start, stop, step) for _, start, stop, step in grid]
+    shape = tuple(len(axis) for axis in values)
+    started = time.perf_counter()
+
+    locations = {}
+    for location, code in sorted(artifact.location_codes.items(), key=lambda item: item[1]):
+        table = np.empty(shape, dtype=np.float32)
+        # One slab of the first axis at a time keeps the feature matrix small
+        for position, first in enumerate(values[0]):
+            mesh = np.meshgrid(*values[1:], indexing='ij')
+            columns = {names[0]: np.full(mesh[0].size, first)}
+            columns.update({name: axis.ravel() for name, axis in zip(names[1:], mesh)})
+            features = artifact.build_features(location_encoded=np.full(mesh[0].size, code), **columns)
+            table[position] = np.asarray(artifact.predict(features), dtype=np.float32).reshape(shape[1:])
+        filename = f'table_{code}.npy'
+        np.save(os.path.join(output_dir, filename), table, allow_pickle=False)
+        locations[location] = filename
+        progress(f"Tabulated {location} ({table.size:,} cells)")
+
+    manifest = {
+        'format': TABLE_FORMAT,
+        'modelVersion': artifact.version,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'axes': [{'name': name, 'start': int(start), 'stop': int(stop), 'step': int(step)}
+                 for name, start, stop, step in grid],
+        'locations': locations,
+        'cellsPerLocation': int(np.prod(shape)),
+        'bytes': int(np.prod(shape)) * 4 * len(locations),
+        'seconds': round(time.perf_counter() - started, 3)
+    }
+    with open(os.path.join(output_dir, TABLE_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    table = ValuationTable(output_dir, artifact.version, interpolate=True, max_rel_error=None)
+    manifest['errors'] = table.error_report(artifact, error_samples, seed)
+    with open(os.path.join(output_dir, TABLE_MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class ValuationTable:
+    """Read-only view of a valuation table directory.
+
+    Tables are memory-mapped, so every worker process shares one copy in the page cache.
+    lookup() answers one property in constant time and returns None when it is off the grid
+    (outside an axis' range, not an integer, or in a location the table does not cover), so the
+    caller can fall back to the model. By default inputs between grid points fall back too and
+    every answer is exactly the model's. interpolate=True interpolates between grid points, but
+    only when the manifest's measured maxRelError is within max_rel_error (None: no check);
+    otherwise interpolation_refused is set and the table stays exact.
+    """
+
+    def __init__(self, directory, model_version=None, interpolate=False, max_rel_error=DEFAULT_MAX_REL_ERROR):
+        with open(os.path.join(directory, TABLE_MANIFEST)) as f:
+            self.manifest = json.load(f)
+        if self.manifest.get('format') != TABLE_FORMAT:
+            raise ValueError(f"{directory} is not a {TABLE_FORMAT} directory")
+        if [axis['name'] for axis in self.manifest['axes']] != [name for name, _, _, _ in DEFAULT_GRID]:
+            raise ValueError(f"Valuation table in {directory} has unsupported axes")
+        if model_version is not None and self.manifest['modelVersion'] != model_version:
+            raise ValueError(f"Valuation table in {directory} was built for model "
+                             f"{self.manifest['modelVersion']}, not {model_version}")
+        self.directory = directory
+        self.errors = self.manifest.get('errors')
+        measured = (self.errors or {}).get('maxRelError')
+        self.interpolation_refused = bool(interpolate and max_rel_error is not None and
+                                          (measured is None or measured > max_rel_error))
+        self.interpolate = interpolate and not self.interpolation_refused
+        self.max_rel_error = max_rel_error
+        axes = self.manifest['axes']
+        self.names = [axis['name'] for axis in axes]
+        self.starts = [axis['start'] for axis in axes]
+        self.steps = [axis['step'] for axis in axes]
+        self.sizes = [(axis['stop'] - axis['start']) // axis['step'] + 1 for axis in axes]
+        # Only axes coarser than the integer inputs ever need interpolating
+        self.interpolated = [position for position, step in enumerate(self.steps) if step > 1]
+        # Plain ndarray views of the maps: np.memmap's own indexing is several times slower
+        self.tables = {
+            location: np.load(os.path.join(directory, filename), mmap_mode='r', allow_pickle=False).view(np.ndarray)
+            for location, filename in self.manifest['locations'].items()
+        }
+        self._flat = {location: table.reshape(-1) for location, table in self.tables.items()}
+        # Per axis, every integer input in range -> (flat offset of its cell, fraction towards the
+        # next grid point, flat stride to that point or 0 on a grid point)
+        strides = np.cumprod([1] + self.sizes[:0:-1])[::-1]
+        self._axis_cells = []
+        for start, step, size, stride in zip(self.starts, self.steps, self.sizes, strides):
+            cells = {}
+            for value in range(start, start + (size - 1) * step + 1):
+                cell, remainder = divmod(value - start, step)
+                cells[value] = (int(cell * stride), remainder / step, int(stride) if remainder else 0)
+            self._axis_cells.append(cells)
+
+    def lookup(self, floors, area, bedrooms, bathrooms, age, location):
+        """Tabulated price of one property, or None when it is off the grid"""
+        flat = self._flat.get(location)
+        if flat is None:
+            return None
+        floors_cells, area_cells, bedrooms_cells, bathrooms_cells, age_cells = self._axis_cells
+        try:
+            cells = (floors_cells[floors], area_cells[area], bedrooms_cells[bedrooms],
+                     bathrooms_cells[bathrooms], age_cells[age])
+        except (KeyError, TypeError):
+            return None
+        offset = cells[0][0] + cells[1][0] + cells[2][0] + cells[3][0] + cells[4][0]
+        if not (cells[0][2] or cells[1][2] or cells[2][2] or cells[3][2] or cells[4][2]):
+            return flat.item(offset)
+        if not self.interpolate:
+            return None
+        between = [cell for cell in cells if cell[2]]
+        if len(between) == 1:
+            # The usual case: only area falls between grid points
+            _, fraction, stride = between[0]
+            return (1 - fraction) * flat.item(offset) + fraction * flat.item(offset + stride)
+        # Multilinear interpolation over the axes the input falls between grid points on
+        price = 0.0
+        for corner in range(1 << len(between)):
+            index = offset
+            weight = 1.0
+            for bit, (_, fraction, stride) in enumerate(between):
+                if corner >> bit & 1:
+                    index += stride
+                    weight *= fraction
+                else:
+                    weight *= 1 - fraction
+            price += weight * flat.item(index)
+        return price
+
+    def lookup_batch(self, columns, locations):
+        """Vectorized lookup(): (prices, hit mask); prices are NaN where hit is False.
+
+        columns maps the axis names (floors, area, ...) to equal-length arrays.
+        """
+        locations = np.asarray(locations, dtype=object)
+        prices = np.full(len(locations), np.nan)
+        positions = []
+        weights = []
+        valid = np.ones(len(locations), dtype=bool)
+        for axis, name in enumerate(self.names):
+            offset = np.asarray(columns[name], dtype=np.float64) - self.starts[axis]
+            scaled = offset / self.steps[axis]
+            cell = np.floor(scaled)
+            fraction = scaled - cell
+            valid &= (cell >= 0) & (cell < self.sizes[axis]) & ~((fraction > 0) & (cell == self.sizes[axis] - 1))
+            if self.steps[axis] == 1 or not self.interpolate:
+                valid &= fraction == 0
+            positions.append(np.where(valid, cell, 0).astype(np.int64))
+            weights.append(fraction)
+
+        for location, table in self.tables.items():
+            rows = np.flatnonzero(valid & (locations == location))
+            if not len(rows):
+                continue
+            index = [axis[rows] for axis in positions]
+            total = np.zeros(len(rows))
+            for corner in range(1 << len(self.interpolated)):
+                corner_index = list(index)
+                weight = np.ones(len(rows))
+                for bit, axis in enumerate(self.interpolated):
+                    if corner >> bit & 1:
+                        # Inputs exactly on a grid point carry zero weight here; keep the index in range
+                        corner_index[axis] = np.minimum(index[axis] + 1, self.sizes[axis] - 1)
+                        weight *= weights[axis][rows]
+                    else:
+                        weight *= 1 - weights[axis][rows]
+                total += weight * table[tuple(corner_index)]
+            prices[rows] = total
+        return prices, ~np.isnan(prices)
+
+    def error_report(self, artifact, samples=20000, seed=42):
+        """Lookup error against the live model on random integer inputs within the grid's range"""
+        rng = np.random.default_rng(seed)
+        columns = {
+            name: rng.integers(start, start + (size - 1) * step + 1, samples)
+            for name, start, step, size in zip(self.names, self.starts, self.steps, self.sizes)
+        }
+        names = list(self.tables)
+        locations = np.array(names, dtype=object)[rng.integers(0, len(names), samples)]
+        codes = np.array([artifact.encode_location(location) for location in locations])
+        expected = np.asarray(artifact.predict(artifact.build_features(location_encoded=codes, **columns)),
+                              dtype=np.float64)
+        prices, _ = self.lookup_batch(columns, locations)
+        errors = np.abs(prices - expected)
+        relative = errors / np.maximum(np.abs(expected), 1.0)
+        on_grid = np.all([(columns[name] - start) % step == 0
+                          for name, start, step in zip(self.names, self.starts, self.steps)], axis=0)
+        return {
+            'samples': int(samples),
+            'onGridShare': round(float(on_grid.mean()), 4),
+            'maxAbsError': round(float(errors.max()), 2),
+            'meanAbsError': round(float(errors.mean()), 2),
+            'p99AbsError': round(float(np.percentile(errors, 99)), 2),
+            'maxRelError': round(float(relative.max()), 6),
+            'maxOnGridAbsError': round(float(errors[on_grid].max()), 2) if on_grid.any() else None
+        }
+
+    def stats(self):
+        return {
+            'directory': self.directory,
+            'modelVersion': self.manifest['modelVersion'],
+            'interpolate': self.interpolate,
+            'interpolationRefused': self.interpolation_refused,
+            'maxRelErrorTolerance': self.max_rel_error,
+            'locations': len(self.tables),
+            'axes': self.manifest['axes'],
+            'errors': self.errors
+        }
@@ -5,6 +5,7 @@ const fs = require('fs').promises;
 const aiModelService = {
   modelPath: path.join(__dirname, '../ai_model'),
   modelFile: path.join(__dirname, '../ai_model/model.pkl'),
+  artifactManifest: path.join(__dirname, '../ai_model/model_artifact/manifest.json'),
   isInitialized: false,
   modelLoaded: false,
 
@@ -12,9 +13,9 @@ const aiModelService = {
     try {
       console.log('🔄 Initializing AI Model Service...');
       
-      // Check if pre-trained model file exists
+      // Check if a model artifact or a legacy pre-trained model file exists
       try {
-        await fs.access(this.modelFile);
+        await fs.access(this.artifactManifest).catch(() => fs.access(this.modelFile));
         console.log('✅ Pre-trained AI model file found');
         
         // Test loading the model with timeout
@@ -85,23 +86,29 @@ const aiModelService = {
 
     // If Python model is loaded, use it; otherwise use fallback
     if (this.modelLoaded) {
-      return this.predictPricePython(floors, area, bedrooms, bathrooms, age, location);
+      return this.predictPricePython(floors, area, bedrooms, bathrooms, age, location, coords);
     } else {
       return this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location, coords);
     }
   },
 
-  async predictPricePython(floors, area, bedrooms, bathrooms, age, location) {
+  async predictPricePython(floors, area, bedrooms, bathrooms, age, location, coords = {}) {
     return new Promise((resolve, reject) => {
       const timeout = setTimeout(() => {
         console.log('⚠️  Python prediction timeout, falling back to JavaScript simulation...');
-        this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location)
+        this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location, coords)
           .then(resolve)
           .catch(reject);
       }, 8000); // 8 second timeout
 
       const pythonPath = 'C:/Program Files/Python313/python.exe';
-      const python = spawn(pythonPath, ['predict.py', 'predict', floors, area, bedrooms, bathrooms, age, location], {
+      const args = ['predict.py', 'predict', floors, area, bedrooms, bathrooms, age, location];
+      // The model resolves coordinates to the nearest market when the location is not one it knows
+      const { lat, lng } = coords || {};
+      if ([lat, lng].every(value => value !== null && value !== undefined && value !== '' && Number.isFinite(Number(value)))) {
+        args.push('--lat', String(lat), '--lng', String(lng));
+      }
+      const python = spawn(pythonPath, args, {
         cwd: this.modelPath,
         stdio: ['pipe', 'pipe', 'pipe']
       });
@@ -129,14 +136,14 @@ const aiModelService = {
           } catch (parseError) {
             console.error('Error parsing Python prediction result:', parseError);
             console.log('Python output:', output);
-            this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location)
+            this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location, coords)
               .then(resolve)
               .catch(reject);
           }
         } else {
           console.error('Python prediction failed with code:', code);
           if (error) console.error('Error output:', error);
-          this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location)
+          this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location, coords)
             .then(resolve)
             .catch(reject);
         }
@@ -145,7 +152,7 @@ const aiModelService = {
       python.on('error', (err) => {
         clearTimeout(timeout);
         console.error('Failed to start Python process:', err);
-        this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location)
+        this.predictPriceFallback(floors, area, bedrooms, bathrooms, age, location, coords)
           .then(resolve)
           .catch(reject);
       });
@@ -216,7 +223,8 @@ const aiModelService = {
       { name: 'Area', impact: areaMult.toFixed(2), description: 'Square footage' },
       { name: 'Bedrooms', impact: bedroomMult.toFixed(2), description: 'Number of bedrooms' },
       { name: 'Bathrooms', impact: bathroomMult.toFixed(2), description: 'Number of bathrooms' },
-      { name: 'Age', impact: ageMult.toFixed(2), description: 'Property age' }
+      { name: 'Age', impact: ageMult.toFixed(2), description: 'Property age' },
+      { name: 'Floors', impact: floorMult.toFixed(2), description: 'Number of floors' }
     ];
 
     console.log('⚡ Using JavaScript fallback for prediction');